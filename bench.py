@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import hal
+import pid
+import w1
+import mqtt
+import mqtt_hub
+import filters
+from settings import SettingsStore
+from logger import setup_logging, stop_logging
+
+# Допустиме падіння швидкості відносно базової лінії
+TOLERANCE = 0.2
+
+W1_SLAVE = ['72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n', '72 01 4b 46 7f ff 0e 10 57 t=23125\n']
+
+PID_MESSAGES = [
+    ("home/set/heat_on/kof_p", "1.5"),
+    ("home/set/heat_on/kof_i", "20"),
+    ("home/set/heat_on/dead_zone", "0.5"),
+    ("home/set/heat_on/valve/mode", "on"),
+    ("home/set/heat_on/hand_up", "off"),
+    ("home/set/heat_on/mode/set", "heat"),
+]
+
+GREENHOUSE_MESSAGES = PID_MESSAGES + [
+    ("home/heat_on/current-temperature/get", "41.5"),
+    ("home/set/heat_on/setpoint-time/cikl", "120"),
+]
+
+
+class _FakeHub:
+    # Лише реєстрація обробників, без мережі
+    def register(self, topic_filter, handler, qos=0):
+        pass
+
+
+class _Message:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload.encode('utf-8')
+
+
+def make_sysfs(directory, count):
+    """
+    Фейковий каталог /sys/bus/w1/devices з count датчиками DS18B20.
+    """
+    os.makedirs(os.path.join(directory, 'w1_bus_master1'), exist_ok=True)
+    for i in range(count):
+        device = os.path.join(directory, f"28-{i:012x}")
+        os.makedirs(device, exist_ok=True)
+        with open(os.path.join(device, 'w1_slave'), 'w') as f:
+            f.writelines(W1_SLAVE)
+
+
+def bench_loop_pid(n):
+    clock = hal.VirtualClock()
+    gpio = hal.FakeGPIO()
+    pid.setup_gpio(gpio)
+    settings = dict(pid.DEFAULT_EEPROM, heat_otop=True, valve_mode=True, T_bat=40.0)
+    controller = pid.PIDController(settings, lambda: (-5.0, 0.0), gpio, clock)
+    for _ in range(n):
+        controller.loop_pid()
+        clock.advance(pid.TICK_PERIOD)
+
+
+def bench_pid_dispatch(n, workdir):
+    eeprom = SettingsStore(os.path.join(workdir, 'eeprom.json'), pid.DEFAULT_EEPROM)
+    controller = pid.PIDController(eeprom, lambda: (None, None), hal.FakeGPIO())
+    client = pid.MQTTClient(eeprom, controller, hub=_FakeHub())
+    messages = PID_MESSAGES
+    for i in range(n):
+        topic, message = messages[i % len(messages)]
+        client.on_message(topic, message)
+    eeprom.close()
+
+
+def bench_greenhouse_dispatch(n):
+    controller = mqtt.GreenhouseController()
+    messages = GREENHOUSE_MESSAGES
+    for i in range(n):
+        topic, message = messages[i % len(messages)]
+        controller.handle_message(topic, message)
+
+
+def bench_hub_dispatch(n):
+    # Повний шлях вхідного повідомлення: декодування та пошук обробника у mqtt_hub
+    hub = mqtt_hub.MQTTHub('localhost')
+    controller = mqtt.GreenhouseController()
+    controller.params.register(hub, controller.handle_message)
+    messages = [_Message(topic, payload) for topic, payload in GREENHOUSE_MESSAGES]
+    for i in range(n):
+        hub._on_message(None, None, messages[i % len(messages)])
+
+
+def bench_save_eeprom(n, workdir):
+    eeprom = SettingsStore(os.path.join(workdir, 'eeprom.json'), pid.DEFAULT_EEPROM)
+    for i in range(n):
+        eeprom['kof_p'] = float(i % 10)
+        pid.save_eeprom(eeprom)
+    eeprom.close()
+
+
+def bench_settings_flush(n, workdir):
+    # Фактичний атомарний запис файлу з fsync
+    eeprom = SettingsStore(os.path.join(workdir, 'eeprom.json'), pid.DEFAULT_EEPROM, flush_delay=3600)
+    for i in range(n):
+        eeprom['kof_p'] = float(i)
+        eeprom.flush()
+    eeprom.close()
+
+
+def bench_parse_w1_bytes(n):
+    data = ''.join(W1_SLAVE).encode('ascii')
+    size = len(data)
+    for _ in range(n):
+        w1.parse_w1_slave_bytes(data, size)
+
+
+def bench_read_sensor(n, sysfs):
+    sensor_id = w1.get_registry(sysfs).sensor_ids()[0]
+    for _ in range(n):
+        w1.read_sensor(sensor_id, sysfs)
+
+
+def bench_filter_pipeline(n, count=3):
+    pipeline = filters.default_pipeline()
+    sensor_ids = [f"28-{i:012x}" for i in range(count)]
+    for i in range(n):
+        pipeline.filter({sensor_id: 20.0 + (i % 7) * 0.0625 for sensor_id in sensor_ids})
+
+
+def bench_discovery(n, sysfs):
+    for _ in range(n):
+        registry = w1.DeviceRegistry(sysfs)
+        registry.rescan()
+        registry.resolve('28-0000000000ff')
+
+
+def bench_read_temperatures(n, sysfs, count):
+    sensor_ids = w1.get_registry(sysfs).sensor_ids()[:count]
+    for _ in range(n):
+        w1.read_temperatures(sensor_ids, sysfs, bulk=False)
+
+
+def run_benchmarks(scale=1.0, repeat=3, devices=300):
+    """
+    Прогін усіх бенчмарків.
+
+    :param scale: Множник кількості ітерацій
+    :param repeat: Кількість повторів; береться найкращий результат
+    :param devices: Кількість фейкових датчиків для перевірки пошуку
+    :return: Словник назва -> операцій за секунду
+    """
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    sysfs = os.path.join(workdir, 'w1') + os.sep
+    make_sysfs(sysfs, devices)
+    cases = {
+        'loop_pid': (bench_loop_pid, 20000, ()),
+        'parse_w1_bytes': (bench_parse_w1_bytes, 200000, ()),
+        'read_sensor': (bench_read_sensor, 20000, (sysfs,)),
+        'filter_pipeline_3': (bench_filter_pipeline, 20000, ()),
+        'pid_dispatch': (bench_pid_dispatch, 20000, (workdir,)),
+        'greenhouse_dispatch': (bench_greenhouse_dispatch, 20000, ()),
+        'hub_dispatch': (bench_hub_dispatch, 20000, ()),
+        'save_eeprom': (bench_save_eeprom, 50000, (workdir,)),
+        'settings_flush': (bench_settings_flush, 50, (workdir,)),
+        f'discovery_{devices}': (bench_discovery, 20, (sysfs,)),
+        'read_temperatures_10': (bench_read_temperatures, 20, (sysfs, 10)),
+    }
+    results = {}
+    # Логи обробників вимірюють консоль, а не код
+    logging.disable(logging.INFO)
+    try:
+        for name, (func, iterations, args) in cases.items():
+            n = max(1, int(iterations * scale))
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func(n, *args)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = n / best
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Порівняння з базовою лінією.
+
+    :return: Список назв бенчмарків, що сповільнились більше ніж на tolerance
+    """
+    regressions = []
+    lines = []
+    for name, ops in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f"{name:24s} {ops:14.1f} оп/с  (немає в базовій лінії)")
+            continue
+        change = ops / base - 1.0
+        marker = ''
+        if change < -tolerance:
+            regressions.append(name)
+            marker = '  РЕГРЕСІЯ'
+        lines.append(f"{name:24s} {ops:14.1f} оп/с  {change:+7.1%}{marker}")
+    # Одним записом: обмежувач частоти логів відкидає однакові повідомлення підряд
+    logging.info("Результати:\n" + "\n".join(lines))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки гарячих шляхів контролера")
+    parser.add_argument('--baseline', default='bench_baseline.json', help="Файл базової лінії")
+    parser.add_argument('--save', action='store_true', help="Зберегти результати як нову базову лінію")
+    parser.add_argument('--scale', type=float, default=1.0, help="Множник кількості ітерацій")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Допустиме сповільнення (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scale)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+        table = "\n".join(f"{name:24s} {ops:14.1f} оп/с" for name, ops in sorted(results.items()))
+        logging.info(f"Базову лінію збережено у {args.baseline}:\n{table}")
+        return 0
+    try:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+        logging.warning(f"Базової лінії {args.baseline} немає; запустіть з --save.")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        logging.error(f"Сповільнились: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    setup_logging()
+    try:
+        code = main()
+    finally:
+        stop_logging()
+    sys.exit(code)
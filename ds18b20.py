@@ -1,11 +1,118 @@
 import time
-import os
-import paho.mqtt.client as mqtt
 import threading
 import logging
+import json
+import w1
+from mqtt_hub import get_hub
+from metrics import get_registry
+from filters import default_pipeline
+
+
+def _accepted(result):
+    # MQTTHub.publish повертає None без підключення, paho - MQTTMessageInfo з rc
+    return result is not None and getattr(result, 'rc', 0) == 0
+
+
+class TelemetryPublisher:
+    def __init__(self, client, default_topic=None, topics=None, deadband=0.1, min_interval=1.0,
+                 max_interval=300.0, batch_topic=None, deadbands=None):
+        """
+        Публікація показів багатьох датчиків з мертвою зоною та обмеженням частоти.
+
+        Значення датчика публікується, якщо воно змінилось щонайменше на
+        свою мертву зону (deadbands або deadband за замовчуванням), але не частіше ніж раз на min_interval; якщо змін немає,
+        воно все одно надсилається раз на max_interval як ознака життя.
+        З batch_topic всі покази циклу пакуються в одне JSON-повідомлення.
+        Значення вважається опублікованим, лише якщо клієнт прийняв повідомлення:
+        без підключення до брокера воно буде надіслане знову після відновлення.
+
+        :param client: MQTT клієнт (будь-що з методом publish(topic, payload))
+        :param default_topic: Тема для датчиків, яких немає у topics
+        :param topics: Словник sensor_id -> тема
+        :param deadband: Мінімальна зміна температури для публікації у °C за замовчуванням
+        :param min_interval: Мінімальний інтервал між публікаціями датчика у секундах
+        :param max_interval: Максимальний інтервал між публікаціями датчика у секундах
+        :param batch_topic: Тема для пакетних повідомлень або None
+        :param deadbands: Словник sensor_id -> мертва зона у °C (шумному датчику - більша)
+        """
+        self.client = client
+        self.default_topic = default_topic
+        self.topics = dict(topics or {})
+        self.deadband = deadband
+        self.deadbands = dict(deadbands or {})
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_topic = batch_topic
+        self._last = {}       # sensor_id -> (опубліковане значення, час публікації)
+
+        # Лічильники
+        self.messages = 0
+        self.published = 0
+        self.suppressed = 0
+
+        registry = get_registry()
+        labels = {'topic': batch_topic or default_topic}
+        registry.counter('telemetry_messages', "Надіслані MQTT-повідомлення телеметрії", labels,
+                         fn=lambda: self.messages)
+        registry.counter('telemetry_published', "Опубліковані покази датчиків", labels, fn=lambda: self.published)
+        registry.counter('telemetry_suppressed', "Покази, відкинуті мертвою зоною", labels,
+                         fn=lambda: self.suppressed)
+
+    def is_due(self, sensor_id, value, now):
+        last = self._last.get(sensor_id)
+        if last is None:
+            return True
+        last_value, last_time = last
+        elapsed = now - last_time
+        if elapsed < self.min_interval:
+            return False
+        deadband = self.deadbands.get(sensor_id, self.deadband)
+        return abs(value - last_value) >= deadband or elapsed >= self.max_interval
+
+    def publish(self, readings, now=None):
+        """
+        Публікація показів одного циклу.
+
+        :param readings: Словник sensor_id -> температура
+        :param now: Поточний час time.monotonic()
+        :return: Кількість надісланих MQTT-повідомлень
+        """
+        now = time.monotonic() if now is None else now
+        due = {sensor_id: value for sensor_id, value in readings.items() if self.is_due(sensor_id, value, now)}
+        if not due:
+            self.suppressed += len(readings)
+            return 0
+
+        if self.batch_topic is not None:
+            # Один пакет з усіма показами, щоб отримувач мав повний зріз
+            payload = json.dumps({sensor_id: round(value, 2) for sensor_id, value in readings.items()})
+            sent = 1 if _accepted(self.client.publish(self.batch_topic, payload)) else 0
+            due = readings if sent else {}
+            suppressed = 0
+        else:
+            suppressed = len(readings) - len(due)
+            accepted = {}
+            for sensor_id, value in due.items():
+                topic = self.topics.get(sensor_id, self.default_topic)
+                if _accepted(self.client.publish(topic, str(round(value, 2)))):
+                    accepted[sensor_id] = value
+            due = accepted
+            sent = len(due)
+
+        for sensor_id, value in due.items():
+            self._last[sensor_id] = (value, now)
+        self.suppressed += suppressed
+        self.published += len(due)
+        self.messages += sent
+        return sent
+
+    def stats(self):
+        return {'messages': self.messages, 'published': self.published, 'suppressed': self.suppressed}
+
 
 class TemperatureSensor:
-    def __init__(self, broker, port, topic, user, password, client_id=None, interval=1):
+    def __init__(self, broker, port, topic, user, password, client_id=None, interval=1, sensors=None,
+                 deadband=0.1, max_interval=300, batch_topic=None, deadbands=None):
         """
         Ініціалізація температурного сенсора та MQTT-підключення.
 
@@ -14,68 +121,62 @@ class TemperatureSensor:
         :param topic: Тема для публікації температури
         :param user: Ім'я користувача MQTT
         :param password: Пароль MQTT
-        :param client_id: Ідентифікатор клієнта MQTT
+        :param client_id: Ідентифікатор клієнта MQTT; None - унікальний для процесу
         :param interval: Інтервал зчитування температури у секундах
+        :param sensors: Словник sensor_id -> тема; None - лише перший датчик на шині у тему topic
+        :param deadband: Мінімальна зміна температури для публікації у °C за замовчуванням
+        :param max_interval: Максимальний інтервал між публікаціями без змін у секундах
+        :param batch_topic: Тема для публікації всіх показів одним повідомленням або None
+        :param deadbands: Словник sensor_id -> власна мертва зона у °C
         """
         self.broker = broker
         self.port = port
         self.topic = topic
         self.user = user
         self.password = password
-        self.client_id = client_id if client_id else f"raspi-{os.uname().nodename}"
+        self.client_id = client_id
         self.interval = interval
+        self.sensors = dict(sensors) if sensors else None
         self.smoothed_temperature = None
+        self.smoothed = {}
+        # Відкидання викидів, медіана та згладжування для всіх датчиків разом
+        self.filters = default_pipeline()
         self.running = False
 
         # Налаштування логування
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-        # Ініціалізація MQTT клієнта
-        self.client = mqtt.Client(self.client_id)
-        self.client.username_pw_set(self.user, self.password)
-        self.client.on_connect = self.on_connect
-        self.client.on_disconnect = self.on_disconnect
+        # Спільне MQTT-підключення процесу
+        self.hub = get_hub(broker, port, user, password, client_id)
+        self.client = self.hub.client
+        self.hub.add_listener(on_connect=self.on_connect, on_disconnect=self.on_disconnect)
+
+        self._read_failures = get_registry().counter('sensor_read_failures', "Невдалі зчитування датчиків")
+
+        self.publisher = TelemetryPublisher(self.hub, default_topic=topic, topics=self.sensors,
+                                            deadband=deadband, min_interval=interval,
+                                            max_interval=max_interval, batch_topic=batch_topic,
+                                            deadbands=deadbands)
 
     def connect_mqtt(self):
         """
-        Підключення до MQTT брокера.
+        Підключення до MQTT брокера. Не блокує: підключення та повторні
+        спроби виконуються у фоновому потоці mqtt_hub.
         """
-        try:
-            self.client.connect(self.broker, self.port, 60)
-            self.client.loop_start()
-            logging.info("Підключено до MQTT брокера.")
-        except Exception as e:
-            logging.error(f"Не вдалося підключитися до MQTT брокера: {e}")
-            self.reconnect()
+        self.hub.start()
 
-    def reconnect(self):
-        """
-        Спроба повторного підключення до MQTT брокера у випадку помилки.
-        """
-        while True:
-            try:
-                self.client.reconnect()
-                logging.info("Повторно підключено до MQTT брокера.")
-                break
-            except Exception as e:
-                logging.error(f"Повторне підключення не вдалося: {e}")
-                time.sleep(5)
-
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self):
         """
         Колбек при успішному підключенні до MQTT брокера.
         """
-        if rc == 0:
-            logging.info("Успішно підключено до MQTT брокера.")
-        else:
-            logging.error(f"Не вдалося підключитися до MQTT брокера, код {rc}")
+        logging.info("Успішно підключено до MQTT брокера.")
 
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, rc):
         """
         Колбек при відключенні від MQTT брокера.
         """
-        logging.warning("Відключено від MQTT брокера.")
-        self.reconnect()
+        stats = self.hub.stats()
+        logging.warning(f"Відключено від MQTT брокера (код {rc}), спроб підключення: {stats['attempts']}.")
 
     def read_temperature(self):
         """
@@ -83,61 +184,55 @@ class TemperatureSensor:
 
         :return: Поточна температура або None у випадку помилки
         """
-        base_dir = '/sys/bus/w1/devices/'
-        try:
-            device_folders = [f for f in os.listdir(base_dir) if f.startswith('28')]
-            if not device_folders:
-                logging.error("Не знайдено датчиків температури.")
-                return None
-            device_folder = device_folders[0]
-            device_file = f'{base_dir}{device_folder}/w1_slave'
-
-            with open(device_file, 'r') as f:
-                lines = f.readlines()
-
-            # Перевіряємо, чи є "YES" у першому рядку
-            if lines[0].strip().endswith('YES'):
-                # Зчитуємо температуру з другого рядка
-                equals_pos = lines[1].find('t=')
-                if equals_pos != -1:
-                    temp_string = lines[1][equals_pos + 2:]
-                    temperature = float(temp_string) / 1000.0
-                    return temperature
-            else:
-                logging.warning("Некоректне зчитування температури.")
-        except Exception as e:
-            logging.error(f"Помилка зчитування температури: {e}")
-        return None
-
-    def moving_average_filter(self, new_value, smoothed_value):
-        """
-        Застосування фільтру ковзного середнього для згладжування показників температури.
-
-        :param new_value: Нове значення температури
-        :param smoothed_value: Згладжене значення температури
-        :return: Оновлене згладжене значення температури
-        """
-        return 0.9 * smoothed_value + 0.1 * new_value
+        sensor_ids = w1.get_registry().sensor_ids()
+        if not sensor_ids:
+            logging.error("Не знайдено датчиків температури.")
+            return None
+        temperature = w1.read_sensor(sensor_ids[0])
+        if temperature is None:
+            logging.warning("Некоректне зчитування температури.")
+        return temperature
+
+    def read_temperatures(self):
+        """
+        Зчитування всіх датчиків за одну конвертацію.
+
+        :return: Словник sensor_id -> температура (None у випадку помилки)
+        """
+        if self.sensors is None:
+            return {None: self.read_temperature()}
+        return w1.read_temperatures(self.sensors)
 
     def publish_temperature(self):
         """
         Зчитування, фільтрування та публікація температури у MQTT брокер.
         """
-        raw_temperature = self.read_temperature()
-        if raw_temperature is not None:
-            if self.smoothed_temperature is None:
-                self.smoothed_temperature = raw_temperature
-            else:
-                self.smoothed_temperature = self.moving_average_filter(raw_temperature, self.smoothed_temperature)
+        readings = {}
+        raw = self.read_temperatures()
+        # Усі датчики проходять конвеєр фільтрів однією вибіркою
+        filtered = self.filters.filter(raw)
+        for sensor_id, raw_temperature in raw.items():
+            if raw_temperature is None:
+                self._read_failures.inc()
+                logging.warning(f"Не вдалося зчитати температуру {sensor_id or ''}.")
+                continue
+            smoothed = filtered[sensor_id]
             logging.info(f"Raw Temperature: {raw_temperature}°C")
-            logging.info(f"Smoothed Temperature: {round(self.smoothed_temperature, 2)}°C")
+            if smoothed is None:
+                continue
+            self.smoothed[sensor_id] = smoothed
+            readings[sensor_id] = smoothed
+            logging.info(f"Smoothed Temperature: {round(smoothed, 2)}°C")
+        if self.sensors is None:
+            self.smoothed_temperature = self.smoothed.get(None)
+
+        if readings:
             try:
-                self.client.publish(self.topic, str(round(self.smoothed_temperature, 2)))
+                # Публікуються лише значення, що змінились понад мертву зону
+                self.publisher.publish(readings)
             except Exception as e:
+                # Перепідключенням займається mqtt_hub; зчитування не зупиняється
                 logging.error(f"Не вдалося опублікувати у MQTT брокер: {e}")
-                self.reconnect()
-        else:
-            logging.warning("Не вдалося зчитати температуру.")
         time.sleep(self.interval)
 
     def start_publishing(self):
@@ -153,12 +248,13 @@ class TemperatureSensor:
         Основний цикл зчитування та публікації температури.
         """
         # Ініціалізація першого значення температури
-        initial_temperature = self.read_temperature()
-        if initial_temperature is None:
+        initial = {sensor_id: t for sensor_id, t in self.read_temperatures().items() if t is not None}
+        if not initial:
             logging.error("Не вдалося ініціалізувати сенсор температури.")
             return
-        self.smoothed_temperature = initial_temperature
-        logging.info(f"Початкова температура: {self.smoothed_temperature}°C")
+        self.smoothed.update((k, v) for k, v in self.filters.filter(initial).items() if v is not None)
+        self.smoothed_temperature = self.smoothed.get(None)
+        logging.info(f"Початкова температура: {list(initial.values())}°C")
 
         while self.running:
             self.publish_temperature()
@@ -168,8 +264,7 @@ class TemperatureSensor:
         Зупинка циклу публікації температури.
         """
         self.running = False
-        self.client.loop_stop()
-        self.client.disconnect()
+        self.hub.stop()
         logging.info("Зупинено публікацію температури.")
 
     def run_forever(self):
@@ -193,7 +288,6 @@ if __name__ == "__main__":
         topic="aparts/temp",
         user="mqtt",
         password="qwerty",
-        client_id=f"raspi-{os.uname().nodename}",
         interval=1
     )
     try:
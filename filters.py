@@ -0,0 +1,317 @@
+import threading
+import logging
+import numpy as np
+
+NAN = float('nan')
+
+# Значення, які DS18B20 повертає замість температури: 85 °C - стан після
+# увімкнення живлення (конвертація ще не виконувалась), -127 °C - збій читання
+GLITCH_VALUES = (85.0, -127.0)
+
+
+# З такої кількості датчиків конвеєр рахує масивами numpy; для кількох датчиків
+# накладні витрати numpy на виклик більші за саму роботу, тож там - звичайні float
+VECTOR_MIN = 128
+
+
+def _grow(values, n, fill):
+    # Розширення стану для нових датчиків; старі значення зберігаються
+    values.extend(fill() if callable(fill) else fill for _ in range(n - len(values)))
+
+
+class Stage:
+    """
+    Ланка конвеєра фільтрів.
+
+    Стан - списки довжини n (по значенню на датчик), тож робота на вибірку O(1).
+    step() обробляє одне значення одного датчика звичайними float;
+    __call__ - масив значень усіх датчиків за раз (NaN - немає нового
+    значення: датчик не опитувався або значення відкинуте попередньою ланкою).
+    Обидва шляхи ведуть той самий стан.
+    """
+
+    def __init__(self):
+        self.n = 0
+
+    def resize(self, n):
+        self.n = n
+
+    def step(self, i, x):
+        """
+        :param i: Номер датчика
+        :param x: Значення
+        :return: Значення на виході або None, якщо відкинуто
+        """
+        raise NotImplementedError
+
+    def __call__(self, x):
+        raise NotImplementedError
+
+
+class SpikeFilter(Stage):
+    def __init__(self, low=-55.0, high=125.0, max_step=5.0, glitches=GLITCH_VALUES, max_rejects=5):
+        """
+        Відкидання викидів.
+
+        Відкидаються значення поза робочим діапазоном DS18B20, характерні
+        збійні значення (85 і -127 °C), якщо вони далекі від попереднього
+        значення, та стрибки більше max_step від останнього прийнятого
+        значення. Після max_rejects таких значень поспіль значення
+        приймається - це вже не викид, а справжня зміна температури.
+
+        :param low: Нижня межа діапазону у °C
+        :param high: Верхня межа діапазону у °C
+        :param max_step: Максимальна зміна між двома вибірками у °C
+        :param glitches: Збійні значення датчика
+        :param max_rejects: Кількість відкинутих значень поспіль, після якої значення приймається
+        """
+        super().__init__()
+        self.low = low
+        self.high = high
+        self.max_step = max_step
+        self.glitches = tuple(glitches)
+        self.max_rejects = max_rejects
+        self.last = []
+        self.rejects = []
+
+    def resize(self, n):
+        super().resize(n)
+        _grow(self.last, n, NAN)
+        _grow(self.rejects, n, 0)
+
+    def step(self, i, x):
+        last = self.last[i]
+        # Порівняння з NaN хибне: без попереднього значення стрибка немає
+        suspicious = (last == last or x in self.glitches) and not abs(x - last) <= self.max_step
+        if x < self.low or x > self.high or (suspicious and self.rejects[i] < self.max_rejects):
+            self.rejects[i] += 1
+            return None
+        self.rejects[i] = 0
+        self.last[i] = x
+        return x
+
+    def __call__(self, x):
+        last = np.array(self.last)
+        rejects = np.array(self.rejects, dtype=int)
+        valid = ~np.isnan(x)
+        with np.errstate(invalid='ignore'):
+            near = np.abs(x - last) <= self.max_step
+            out_of_range = (x < self.low) | (x > self.high)
+            known = ~np.isnan(last)
+            # Кілька порівнянь дешевші за np.isin для двох значень
+            for value in self.glitches:
+                known |= x == value
+        suspicious = known & ~near
+        bad = valid & (out_of_range | (suspicious & (rejects < self.max_rejects)))
+        accepted = valid & ~bad
+        self.rejects = np.where(bad, rejects + 1, np.where(accepted, 0, rejects)).tolist()
+        self.last = np.where(accepted, x, last).tolist()
+        return np.where(accepted, x, NAN)
+
+
+class MedianFilter(Stage):
+    def __init__(self, size=3):
+        """
+        Медіана останніх size значень кожного датчика.
+
+        :param size: Довжина вікна (непарна: 3 або 5)
+        """
+        super().__init__()
+        self.size = size
+        self.window = []
+        self.pos = []
+
+    def resize(self, n):
+        super().resize(n)
+        _grow(self.window, n, lambda: [NAN] * self.size)
+        _grow(self.pos, n, 0)
+
+    def step(self, i, x):
+        window = self.window[i]
+        window[self.pos[i]] = x
+        self.pos[i] = (self.pos[i] + 1) % self.size
+        # Поки вікно не заповнене, медіана береться з наявних значень
+        values = sorted(v for v in window if v == v)
+        count = len(values)
+        return (values[(count - 1) // 2] + values[count // 2]) * 0.5
+
+    def __call__(self, x):
+        columns = np.flatnonzero(~np.isnan(x))
+        out = np.full(self.n, NAN)
+        if columns.size:
+            window = np.array(self.window)
+            pos = np.array(self.pos, dtype=int)
+            window[columns, pos[columns]] = x[columns]
+            pos[columns] = (pos[columns] + 1) % self.size
+            self.window = window.tolist()
+            self.pos = pos.tolist()
+            # np.sort ставить NaN у кінець, тож поки вікно не заповнене,
+            # медіана береться з перших count значень (без повільного nanmedian)
+            window = np.sort(window[columns], axis=1)
+            count = self.size - np.isnan(window).sum(axis=1)
+            lower = np.take_along_axis(window, ((count - 1) // 2)[:, None], axis=1)[:, 0]
+            upper = np.take_along_axis(window, (count // 2)[:, None], axis=1)[:, 0]
+            out[columns] = (lower + upper) * 0.5
+        return out
+
+
+class EMAFilter(Stage):
+    def __init__(self, alpha=0.1):
+        """
+        Експоненційне згладжування: y = y + alpha * (x - y).
+        Починається з першого значення, а не з нуля.
+
+        :param alpha: Вага нового значення (0.1 - як попередній moving_average_filter)
+        """
+        super().__init__()
+        self.alpha = alpha
+        self.state = []
+
+    def resize(self, n):
+        super().resize(n)
+        _grow(self.state, n, NAN)
+
+    def step(self, i, x):
+        state = self.state[i]
+        state = x if state != state else state + self.alpha * (x - state)
+        self.state[i] = state
+        return state
+
+    def __call__(self, x):
+        current = np.array(self.state)
+        valid = ~np.isnan(x)
+        state = np.where(np.isnan(current), x, current + self.alpha * (x - current))
+        state = np.where(valid, state, current)
+        self.state = state.tolist()
+        return np.where(valid, state, NAN)
+
+
+class KalmanFilter(Stage):
+    def __init__(self, process_noise=1e-3, measurement_noise=0.01):
+        """
+        Скалярний фільтр Калмана з моделлю випадкового блукання для кожного датчика.
+
+        :param process_noise: Дисперсія зміни температури між вибірками (°C²)
+        :param measurement_noise: Дисперсія шуму вимірювання (°C²); для 12 біт ~0.0625²
+        """
+        super().__init__()
+        self.q = process_noise
+        self.r = measurement_noise
+        self.state = []
+        self.variance = []
+
+    def resize(self, n):
+        super().resize(n)
+        _grow(self.state, n, NAN)
+        _grow(self.variance, n, NAN)
+
+    def step(self, i, x):
+        state = self.state[i]
+        if state != state:
+            self.state[i] = x
+            self.variance[i] = self.r
+            return x
+        variance = self.variance[i] + self.q
+        gain = variance / (variance + self.r)
+        state += gain * (x - state)
+        self.state[i] = state
+        self.variance[i] = (1.0 - gain) * variance
+        return state
+
+    def __call__(self, x):
+        current = np.array(self.state)
+        current_variance = np.array(self.variance)
+        valid = ~np.isnan(x)
+        fresh = valid & np.isnan(current)
+        variance = current_variance + self.q
+        gain = variance / (variance + self.r)
+        state = current + gain * (x - current)
+        state = np.where(fresh, x, np.where(valid, state, current))
+        self.state = state.tolist()
+        self.variance = np.where(fresh, self.r, np.where(valid, (1.0 - gain) * variance,
+                                                          current_variance)).tolist()
+        return np.where(valid, state, NAN)
+
+
+class FilterPipeline:
+    def __init__(self, stages, vector_min=VECTOR_MIN):
+        """
+        Конвеєр фільтрів над усіма датчиками одночасно.
+
+        Значення проходять ланки по черзі; відкинуте значення далі не
+        передається, тож викид не потрапляє ні в згладжування, ні у вихід.
+        Для кількох датчиків кожне значення проходить ланки звичайними float
+        (Stage.step), з vector_min датчиків - однією операцією numpy на ланку.
+
+        :param stages: Список ланок (SpikeFilter, MedianFilter, EMAFilter, KalmanFilter)
+        :param vector_min: Кількість датчиків у вибірці, з якої рахувати масивами
+        """
+        self.stages = list(stages)
+        self.vector_min = vector_min
+        self.columns = {}
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def resize(self, n):
+        if n > self.n:
+            for stage in self.stages:
+                stage.resize(n)
+            self.n = n
+
+    def update(self, values):
+        """
+        Обробка однієї вибірки всіх датчиків масивами numpy.
+
+        :param values: Масив значень по датчиках; NaN - немає значення
+        :return: Масив відфільтрованих значень; NaN - значення немає або відкинуте
+        """
+        x = np.asarray(values, dtype=float)
+        self.resize(x.shape[0])
+        for stage in self.stages:
+            x = stage(x)
+        return x
+
+    def _step(self, i, value):
+        for stage in self.stages:
+            value = stage.step(i, value)
+            if value is None:
+                return None
+        return value
+
+    def filter(self, readings):
+        """
+        Обробка показів за ID датчиків; нові датчики отримують власний стовпець стану.
+
+        :param readings: Словник sensor_id -> температура або None
+        :return: Словник sensor_id -> відфільтроване значення або None (немає чи відкинуте)
+        """
+        with self._lock:
+            columns = self.columns
+            for key in readings:
+                if key not in columns:
+                    columns[key] = len(columns)
+            self.resize(len(columns))
+            if len(readings) >= self.vector_min:
+                values = np.full(self.n, NAN)
+                for key, value in readings.items():
+                    if value is not None:
+                        values[columns[key]] = value
+                filtered = self.update(values)
+                result = {}
+                for key in readings:
+                    output = filtered[columns[key]]
+                    result[key] = None if output != output else float(output)  # NaN - немає значення
+            else:
+                result = {key: None if value is None or value != value else self._step(columns[key], float(value))
+                          for key, value in readings.items()}
+        for key, value in readings.items():
+            if result[key] is None and value is not None:
+                logging.warning(f"Датчик {key}: значення {value}°C відкинуто фільтром.")
+        return result
+
+
+def default_pipeline(alpha=0.1, median=3, max_step=5.0):
+    """
+    Стандартний конвеєр: відкидання викидів, медіана і експоненційне згладжування.
+    """
+    return FilterPipeline([SpikeFilter(max_step=max_step), MedianFilter(median), EMAFilter(alpha)])
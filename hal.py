@@ -0,0 +1,172 @@
+import time
+import logging
+
+
+class FakeGPIO:
+    """
+    Програмна заміна модуля RPi.GPIO з тим самим інтерфейсом.
+    Зберігає стан кожного піна і кількість записів, нічого не робить з залізом.
+    """
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.writes = 0
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, initial=None):
+        self.pins[pin] = initial if initial is not None else self.LOW
+
+    def output(self, pin, value):
+        # Як і RPi.GPIO, приймає один пін або список пінів зі списком значень
+        self.writes += 1
+        if isinstance(pin, (list, tuple)):
+            values = value if isinstance(value, (list, tuple)) else [value] * len(pin)
+            for p, v in zip(pin, values):
+                self.pins[p] = v
+        else:
+            self.pins[pin] = value
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+def get_gpio(backend=None):
+    """
+    Вибір бекенда GPIO.
+
+    :param backend: 'rpi' - справжній RPi.GPIO, 'fake' - FakeGPIO,
+                    None - RPi.GPIO, якщо він доступний, інакше FakeGPIO
+    :return: Об'єкт з інтерфейсом модуля RPi.GPIO
+    """
+    if backend == 'fake':
+        return FakeGPIO()
+    try:
+        import RPi.GPIO as GPIO
+        return GPIO
+    except (ImportError, RuntimeError):
+        if backend == 'rpi':
+            raise
+        logging.warning("RPi.GPIO недоступний, використовується FakeGPIO.")
+        return FakeGPIO()
+
+
+class OutputBank:
+    def __init__(self, gpio):
+        """
+        Вихідні піни з тіньовим регістром стану.
+
+        set() лише запам'ятовує бажаний стан; commit() записує в GPIO тільки ті піни,
+        що справді змінились, одним викликом output() на всі зміни такту.
+        Кількість перемикань кожного піна рахується (знос реле).
+
+        :param gpio: Бекенд з інтерфейсом RPi.GPIO
+        """
+        self.gpio = gpio
+        self.shadow = {}      # Стан, записаний у GPIO (None - невідомий)
+        self.pending = {}     # Зміни, що чекають commit()
+        self.toggles = {}     # Кількість перемикань кожного піна
+        self.commits = 0      # Кількість фактичних викликів GPIO.output
+
+    def setup(self, pin, initial=None):
+        """
+        Налаштування піна як виходу.
+
+        :param pin: Номер піна
+        :param initial: Початковий стан; None - стан невідомий, перший запис відбудеться завжди
+        """
+        if initial is None:
+            self.gpio.setup(pin, self.gpio.OUT)
+        else:
+            self.gpio.setup(pin, self.gpio.OUT, initial=initial)
+        self.shadow[pin] = initial
+        self.toggles.setdefault(pin, 0)
+
+    def set(self, pin, value):
+        if self.shadow.get(pin) == value:
+            self.pending.pop(pin, None)
+        else:
+            self.pending[pin] = value
+
+    def commit(self):
+        """
+        Запис усіх змінених пінів у GPIO.
+
+        :return: Кількість змінених пінів
+        """
+        if not self.pending:
+            return 0
+        pins = list(self.pending)
+        values = [self.pending[pin] for pin in pins]
+        if len(pins) == 1:
+            self.gpio.output(pins[0], values[0])
+        else:
+            self.gpio.output(pins, values)
+        self.commits += 1
+        for pin, value in zip(pins, values):
+            if self.shadow.get(pin) is not None:
+                self.toggles[pin] = self.toggles.get(pin, 0) + 1
+            self.shadow[pin] = value
+        self.pending.clear()
+        return len(pins)
+
+    def write(self, pin, value):
+        """
+        Негайна зміна одного піна (set() + commit()).
+        """
+        self.set(pin, value)
+        self.commit()
+
+    def state(self, pin):
+        return self.pending.get(pin, self.shadow.get(pin))
+
+    def stats(self):
+        """
+        :return: Словник з кількістю записів у GPIO та перемикань по пінах
+        """
+        return {'commits': self.commits, 'toggles': dict(self.toggles)}
+
+
+class MonotonicClock:
+    """
+    Реальний час: time.monotonic() та time.sleep().
+    """
+
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Віртуальний час для симуляції: sleep() миттєво зсуває годинник вперед.
+    """
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.time += seconds
+
+    def advance(self, seconds):
+        self.time += seconds
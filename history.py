@@ -0,0 +1,235 @@
+import math
+import threading
+from array import array
+
+NAN = float('nan')
+
+# Стан ПІД-регулятора, що записується в історію на кожному такті.
+# UP_TIME і DOWN_TIME - лічильники сумарного часу увімкнення реле клапана у секундах:
+# різниця сусідніх записів - час роботи клапана за проміжок, max - min за хвилину чи годину
+# - хід за цей період (миттєвий стан імпульсу 100 мс при записі раз на секунду губиться)
+PID_FIELDS = ('T_OUT', 'T_SET', 'PRESENT_VALUE', 'E_1', 'SUM_D_T', 'UP_TIME', 'DOWN_TIME', 'NASOS')
+
+
+class RingBuffer:
+    def __init__(self, capacity, width):
+        """
+        Кільцевий буфер рядків фіксованої ширини на масивах array('d').
+
+        Пам'ять виділяється один раз: capacity * (width + 1) * 8 байт.
+        Мітки часу мають зростати, тому пошук діапазону - двійковий.
+
+        :param capacity: Кількість рядків
+        :param width: Кількість значень у рядку
+        """
+        self.capacity = capacity
+        self.width = width
+        self.times = array('d', [0.0]) * capacity
+        self.values = array('d', [0.0]) * (capacity * width)
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, row):
+        if self.count < self.capacity:
+            slot = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            # Буфер заповнений - перезаписуємо найстаріший рядок
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[slot] = timestamp
+        offset = slot * self.width
+        values = self.values
+        for i, value in enumerate(row):
+            values[offset + i] = value
+
+    def _time(self, i):
+        return self.times[(self.start + i) % self.capacity]
+
+    def _bisect(self, timestamp):
+        # Перший логічний індекс з міткою часу >= timestamp
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, t0=None, t1=None, column=None):
+        """
+        Рядки з міткою часу t0 <= t <= t1.
+
+        :param column: Номер значення у рядку або None - весь рядок
+        :return: Список (t, значення) або (t, [значення])
+        """
+        first = 0 if t0 is None else self._bisect(t0)
+        last = self.count if t1 is None else self._bisect(math.nextafter(t1, math.inf))
+        result = []
+        for i in range(first, last):
+            slot = (self.start + i) % self.capacity
+            offset = slot * self.width
+            if column is None:
+                result.append((self.times[slot], self.values[offset:offset + self.width].tolist()))
+            else:
+                result.append((self.times[slot], self.values[offset + column]))
+        return result
+
+    def last(self):
+        if not self.count:
+            return None
+        slot = (self.start + self.count - 1) % self.capacity
+        offset = slot * self.width
+        return self.times[slot], self.values[offset:offset + self.width].tolist()
+
+
+class _Aggregate:
+    """
+    Накопичувач min/сума/max по кожному полю для одного інтервалу.
+    NaN (немає значення) пропускаються.
+    """
+
+    def __init__(self, n):
+        self.n = n
+        self.reset()
+
+    def reset(self):
+        self.low = [math.inf] * self.n
+        self.high = [-math.inf] * self.n
+        self.total = [0.0] * self.n
+        self.counts = [0] * self.n
+
+    def add(self, row):
+        for i, value in enumerate(row):
+            if value != value:  # NaN
+                continue
+            if value < self.low[i]:
+                self.low[i] = value
+            if value > self.high[i]:
+                self.high[i] = value
+            self.total[i] += value
+            self.counts[i] += 1
+
+    def merge(self, other):
+        for i in range(self.n):
+            if other.counts[i]:
+                self.low[i] = min(self.low[i], other.low[i])
+                self.high[i] = max(self.high[i], other.high[i])
+                self.total[i] += other.total[i]
+                self.counts[i] += other.counts[i]
+
+    def row(self):
+        # Рядок для буфера: min, mean, max по кожному полю підряд
+        row = []
+        for i in range(self.n):
+            if self.counts[i]:
+                row += (self.low[i], self.total[i] / self.counts[i], self.high[i])
+            else:
+                row += (NAN, NAN, NAN)
+        return row
+
+
+class History:
+    def __init__(self, fields, raw_period=1.0, raw_size=3600, minute_size=1440, hour_size=720, sink=None):
+        """
+        Історія значень з трьома рівнями деталізації та фіксованою пам'яттю.
+
+        raw   - останнє значення кожні raw_period секунд (за замовчуванням 1 год);
+        minute - min/mean/max за хвилину (24 год);
+        hour  - min/mean/max за годину (30 діб).
+        record() виконується за O(1) і підходить для виклику з кожного такту;
+        запити діапазону - двійковий пошук у кільцевому буфері.
+
+        :param fields: Назви полів
+        :param raw_period: Період сирих записів у секундах
+        :param raw_size: Кількість сирих записів
+        :param minute_size: Кількість хвилинних записів
+        :param hour_size: Кількість годинних записів
+        :param sink: Функція sink(timestamp, row), що отримує кожен сирий запис (наприклад, для tsdb)
+        """
+        self.fields = tuple(fields)
+        self.index = {name: i for i, name in enumerate(self.fields)}
+        n = len(self.fields)
+        self.raw_period = raw_period
+        self.raw = RingBuffer(raw_size, n)
+        self.minute = RingBuffer(minute_size, 3 * n)
+        self.hour = RingBuffer(hour_size, 3 * n)
+        self._minute_acc = _Aggregate(n)
+        self._hour_acc = _Aggregate(n)
+        self._next_raw = None
+        self._minute_slot = None
+        self._hour_slot = None
+        self.sink = sink
+        self._lock = threading.Lock()
+
+    def record(self, timestamp, values):
+        """
+        Запис одного набору значень.
+
+        :param timestamp: Час у секундах (монотонний або віртуальний)
+        :param values: Значення у порядку fields; None - немає значення
+        """
+        row = [NAN if v is None else float(v) for v in values]
+        minute_slot = int(timestamp // 60)
+        with self._lock:
+            if self._minute_slot is None:
+                self._minute_slot = minute_slot
+                self._hour_slot = minute_slot // 60
+            elif minute_slot != self._minute_slot:
+                self._close_minute()
+                self._minute_slot = minute_slot
+            self._minute_acc.add(row)
+
+            if self._next_raw is None or timestamp >= self._next_raw:
+                self.raw.append(timestamp, row)
+                self._next_raw = (timestamp // self.raw_period + 1) * self.raw_period
+                if self.sink is not None:
+                    self.sink(timestamp, row)
+
+    def _close_minute(self):
+        acc = self._minute_acc
+        self.minute.append(self._minute_slot * 60.0, acc.row())
+        hour_slot = self._minute_slot // 60
+        if hour_slot != self._hour_slot:
+            self.hour.append(self._hour_slot * 3600.0, self._hour_acc.row())
+            self._hour_acc.reset()
+            self._hour_slot = hour_slot
+        # Годинний рівень збирається з хвилинних накопичувачів, без повторного проходу по записах
+        self._hour_acc.merge(acc)
+        acc.reset()
+
+    def query(self, field, t0=None, t1=None, tier='raw'):
+        """
+        Значення одного поля за проміжок часу.
+
+        :param field: Назва поля
+        :param tier: 'raw', 'minute' або 'hour'
+        :return: Для raw - список (t, значення); для minute/hour - список (t, min, mean, max)
+        """
+        i = self.index[field]
+        with self._lock:
+            if tier == 'raw':
+                return self.raw.range(t0, t1, i)
+            buffer = self.minute if tier == 'minute' else self.hour
+            return [(t, *row[3 * i:3 * i + 3]) for t, row in buffer.range(t0, t1)]
+
+    def latest(self):
+        """
+        :return: Словник поле -> останнє сире значення або None
+        """
+        with self._lock:
+            last = self.raw.last()
+        if last is None:
+            return None
+        return dict(zip(self.fields, last[1]))
+
+    def memory(self):
+        """
+        :return: Обсяг пам'яті буферів у байтах (незмінний після створення)
+        """
+        return sum(b.times.itemsize * len(b.times) + b.values.itemsize * len(b.values)
+                   for b in (self.raw, self.minute, self.hour))
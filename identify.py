@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import logging
+import numpy as np
+import tsdb
+from simulation import ThermalPlant
+from logger import setup_logging, stop_logging
+
+
+def valve_position(up, down, valve_travel, initial=0.0):
+    """
+    Відновлення положення клапана з історії роботи реле.
+
+    :param up: Час роботи реле відкриття у кожному інтервалі, секунди
+    :param down: Час роботи реле закриття у кожному інтервалі, секунди
+    :param valve_travel: Час повного ходу клапана у секундах
+    :param initial: Положення на початку запису (0 - закритий, 1 - відкритий)
+    :return: Масив положень на початку кожного інтервалу
+    """
+    moves = (np.asarray(up, dtype=float) - np.asarray(down, dtype=float)) / valve_travel
+    position = np.empty(len(moves))
+    current = initial
+    # Кінцеві упори роблять накопичення нелінійним, тому звичайний цикл
+    for k, move in enumerate(moves):
+        position[k] = current
+        current = min(1.0, max(0.0, current + move))
+    return position
+
+
+class FOPDTModel(ThermalPlant):
+    def __init__(self, coef, tau, dead_time, valve_travel, position=0.0, t_bat=30.0, rmse=None):
+        """
+        Ідентифікована модель контуру: ланка першого порядку із запізненням.
+
+        Усталена температура батарей лінійна за положенням клапана, температурою
+        на вулиці та їх добутком:
+            target = c0 + c_pos * pos + c_out * t_out + c_cross * pos * t_out
+        Клас сумісний з simulation.ThermalPlant, тому підходить і для
+        simulation.run_simulation, і для tuning.BatchThermalPlant.from_plant.
+
+        :param coef: Кортеж (c0, c_pos, c_out, c_cross)
+        :param tau: Стала часу у секундах
+        :param dead_time: Транспортне запізнення у секундах
+        :param valve_travel: Час повного ходу клапана у секундах
+        :param rmse: Середньоквадратична похибка на навчальних даних у °C
+        """
+        self.coef = tuple(float(c) for c in coef)
+        c0, c_pos, c_out, c_cross = self.coef
+        super().__init__(boiler_temp=c0 + c_pos, tau=tau, valve_travel=valve_travel,
+                         position=position, t_bat=t_bat, dead_time=dead_time)
+        self.rmse = rmse
+
+    def target(self, position, pump, t_out):
+        if not pump:
+            return t_out
+        c0, c_pos, c_out, c_cross = self.coef
+        return c0 + c_pos * position + c_out * t_out + c_cross * position * t_out
+
+    def to_dict(self):
+        return {
+            'coef': list(self.coef),
+            'tau': self.tau,
+            'dead_time': self.dead_time,
+            'valve_travel': self.valve_travel,
+            'rmse': self.rmse,
+        }
+
+    @classmethod
+    def from_dict(cls, data, position=0.0, t_bat=30.0):
+        return cls(data['coef'], data['tau'], data['dead_time'], data['valve_travel'],
+                   position=position, t_bat=t_bat, rmse=data.get('rmse'))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    @classmethod
+    def load(cls, path, position=0.0, t_bat=30.0):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f), position, t_bat)
+
+
+def fit_fopdt(t_out, t_bat, up, down, dt, valve_travel, max_dead_time=600.0, initial_position=0.0):
+    """
+    Підбір FOPDTModel за записаною історією методом найменших квадратів.
+
+    Для кожного кандидата запізнення d будується ARX-регресія
+        T_bat[k+1] = a*T_bat[k] + b0 + b1*pos[k-d] + b2*T_OUT[k-d] + b3*pos[k-d]*T_OUT[k-d]
+    і всі вони розв'язуються одним пакетним розв'язком нормальних рівнянь;
+    обирається запізнення з найменшою похибкою.
+
+    :param t_out: Температура на вулиці (T_OUT) з кроком dt
+    :param t_bat: Температура батарей (T_bat) з кроком dt
+    :param up: Час роботи реле відкриття у кожному інтервалі, секунди
+    :param down: Час роботи реле закриття у кожному інтервалі, секунди
+    :param dt: Крок запису у секундах
+    :param valve_travel: Час повного ходу клапана у секундах (per_off)
+    :param max_dead_time: Найбільше запізнення, що перевіряється, у секундах
+    :param initial_position: Положення клапана на початку запису
+    :return: FOPDTModel
+    """
+    t_out = np.asarray(t_out, dtype=float)
+    y = np.asarray(t_bat, dtype=float)
+    pos = valve_position(up, down, valve_travel, initial_position)
+    n = len(y)
+    max_d = min(int(max_dead_time / dt), n // 2)
+    if n - max_d < 10:
+        raise ValueError("Замало даних для ідентифікації моделі")
+
+    # Спільний діапазон рядків для всіх кандидатів запізнення: k = max_d .. n-2
+    k = np.arange(max_d, n - 1)
+    target = y[k + 1]
+    delays = np.arange(max_d + 1)
+    theta = np.empty((len(delays), 5))
+    sse = np.empty(len(delays))
+    # Кандидати обробляються пакетами, щоб пам'ять не росла з довжиною запису
+    batch = max(1, 4_000_000 // (5 * len(k)))
+    for start in range(0, len(delays), batch):
+        d = delays[start:start + batch]
+        lagged = k[None, :] - d[:, None]                   # (D, M)
+        p = pos[lagged]
+        o = t_out[lagged]
+        X = np.stack([np.broadcast_to(y[k], p.shape), np.ones_like(p), p, o, p * o], axis=-1)   # (D, M, 5)
+        XtX = np.einsum('dmi,dmj->dij', X, X)
+        Xty = np.einsum('dmi,m->di', X, target)
+        # Невелика регуляризація на випадок сталого положення клапана у записі
+        XtX += np.eye(5) * 1e-9 * np.trace(XtX, axis1=1, axis2=2)[:, None, None]
+        th = np.linalg.solve(XtX, Xty[..., None])[..., 0]   # (D, 5)
+        residuals = target[None, :] - np.einsum('dmi,di->dm', X, th)
+        theta[start:start + batch] = th
+        sse[start:start + batch] = np.einsum('dm,dm->d', residuals, residuals)
+
+    best = int(np.argmin(sse))
+    a, b0, b1, b2, b3 = theta[best]
+    if not 0.0 < a < 1.0:
+        raise ValueError(f"Нестійка модель (a={a:.4f}): замало збудження у записі")
+    gain = 1.0 - a
+    model = FOPDTModel(
+        coef=(b0 / gain, b1 / gain, b2 / gain, b3 / gain),
+        tau=float(-dt / np.log(a)),
+        dead_time=best * dt,
+        valve_travel=valve_travel,
+        position=float(pos[-1]),
+        t_bat=float(y[-1]),
+        rmse=float(np.sqrt(sse[best] / len(k))),
+    )
+    logging.info(f"Модель: tau={model.tau:.0f} с, запізнення={model.dead_time:.0f} с, RMSE={model.rmse:.3f}°C")
+    return model
+
+
+def load_history(path):
+    """
+    Завантаження історії з CSV з колонками t, T_OUT, T_bat, up, down.
+
+    :return: Словник колонка -> масив
+    """
+    data = np.genfromtxt(path, delimiter=',', names=True)
+    return {name: data[name] for name in data.dtype.names}
+
+
+def counter_deltas(values):
+    """
+    Приріст лічильника між сусідніми записами (UP_TIME, DOWN_TIME історії регулятора).
+
+    Лічильник починається з нуля при кожному запуску регулятора: спад
+    означає перезапуск, і приростом вважається нове значення. NaN (сегменти,
+    записані до появи поля) - нуль.
+
+    :return: Масив тієї ж довжини; перший елемент - 0
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    deltas = np.zeros(len(values))
+    if len(values) > 1:
+        step = np.diff(values)
+        deltas[1:] = np.where(step < 0, values[1:], step)
+    return deltas
+
+
+def resample_history(times, t_out, t_bat, up_time, down_time, dt):
+    """
+    Переведення записаної історії регулятора (history.History або tsdb з полями
+    history.PID_FIELDS) у рівномірні ряди з кроком dt для fit_fopdt.
+
+    Час роботи реле за інтервал - сума приростів накопичених UP_TIME/DOWN_TIME,
+    температури - останнє значення інтервалу. Інтервали без записів (регулятор
+    не працював) заповнюються попередньою температурою без руху клапана.
+
+    :param times: Мітки часу записів у секундах
+    :param t_out: Температура на вулиці (T_OUT)
+    :param t_bat: Температура батарей (PRESENT_VALUE)
+    :param up_time: Накопичений час роботи реле відкриття (UP_TIME)
+    :param down_time: Накопичений час роботи реле закриття (DOWN_TIME)
+    :param dt: Крок ряду у секундах
+    :return: Словник t, T_OUT, T_bat, up, down -> масив
+    """
+    times = np.asarray(times, dtype=float)
+    if not len(times):
+        raise ValueError("Історія порожня")
+    slots = ((times - times[0]) // dt).astype(int)
+    n = slots[-1] + 1
+    up = np.bincount(slots, weights=counter_deltas(up_time), minlength=n)
+    down = np.bincount(slots, weights=counter_deltas(down_time), minlength=n)
+    series = {'t': times[0] + np.arange(n) * dt, 'up': up, 'down': down}
+    filled = np.zeros(n, dtype=bool)
+    filled[slots] = True
+    # Індекс останнього запису кожного інтервалу; порожні - попередній заповнений
+    last = np.full(n, -1)
+    last[slots] = np.arange(len(slots))
+    last = np.maximum.accumulate(np.where(filled, last, -1))
+    for name, values in (('T_OUT', t_out), ('T_bat', t_bat)):
+        series[name] = np.asarray(values, dtype=float)[last]
+    return series
+
+
+def load_store(directory, dt, t0=None, t1=None):
+    """
+    Завантаження історії регулятора з каталогу tsdb (pid.TSDB_DIR) у вигляді load_history.
+
+    :param directory: Каталог сегментів
+    :param dt: Крок ряду у секундах
+    :param t0: Початок у секундах епохи або None
+    :param t1: Кінець у секундах епохи або None
+    :return: Словник колонка -> масив
+    """
+    rows = tsdb.read_rows(directory, ('T_OUT', 'PRESENT_VALUE', 'UP_TIME', 'DOWN_TIME'), t0, t1)
+    if not rows:
+        raise ValueError(f"У {directory} немає записів")
+    times = [t for t, row in rows]
+    t_out, t_bat, up_time, down_time = (np.array(column) for column in zip(*(row for t, row in rows)))
+    return resample_history(times, t_out, t_bat, up_time, down_time, dt)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    # Використання: python identify.py history.csv|tsdb dt valve_travel model.json
+    # Каталог - історія, записана регулятором (pid.TSDB_DIR); CSV - колонки t, T_OUT, T_bat, up, down
+    if os.path.isdir(sys.argv[1]):
+        history = load_store(sys.argv[1], float(sys.argv[2]))
+    else:
+        history = load_history(sys.argv[1])
+    fitted = fit_fopdt(history['T_OUT'], history['T_bat'], history['up'], history['down'],
+                       float(sys.argv[2]), float(sys.argv[3]))
+    fitted.save(sys.argv[4])
+    stop_logging()
@@ -1,18 +1,158 @@
+import os
+import gzip
+import time
+import queue
+import shutil
 import logging
+import logging.handlers
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+
 
 def setup_logger():
     logger = logging.getLogger("TemperatureLogger")
     logger.setLevel(logging.INFO)
-    
+
+    # Повторний виклик не додає ще один хендлер
+    if logger.handlers:
+        return logger
+
     # Консольний логер
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    
+
     # Форматування логів
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    formatter = logging.Formatter(LOG_FORMAT)
     console_handler.setFormatter(formatter)
-    
+
     # Додаємо консольний хендлер
     logger.addHandler(console_handler)
-    
+
     return logger
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler, що стискає ротовані файли у gzip (file.log.1.gz, ...).
+    """
+
+    def __init__(self, filename, max_bytes=1024 * 1024, backup_count=5, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate=1.0, burst=5):
+        """
+        Обмеження частоти однакових повідомлень (за шаблоном повідомлення).
+
+        Кожен шаблон має "відро" на burst записів, що поповнюється зі швидкістю
+        rate записів за секунду. Кількість відкинутих записів додається до
+        наступного пропущеного повідомлення.
+
+        :param rate: Кількість повідомлень за секунду в усталеному режимі
+        :param burst: Кількість повідомлень, дозволених підряд
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        tokens, last, dropped = self._buckets.get(key, (self.burst, now, 0))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1.0:
+            self._buckets[key] = (tokens, now, dropped + 1)
+            return False
+        if dropped:
+            record.msg = f"{record.msg} (пропущено схожих повідомлень: {dropped})"
+        self._buckets[key] = (tokens - 1.0, now, 0)
+        return True
+
+
+class TransitionLogger:
+    def __init__(self, logger=None):
+        """
+        Логування стану виконавчих пристроїв лише при його зміні.
+
+        :param logger: Логер; за замовчуванням кореневий
+        """
+        self.logger = logger or logging.getLogger()
+        self._states = {}
+
+    def log(self, key, state, message, level=logging.INFO):
+        """
+        :param key: Назва пристрою (наприклад, 'nasos')
+        :param state: Поточний стан
+        :param message: Повідомлення, яке пишеться лише при зміні стану
+        :return: True, якщо стан змінився
+        """
+        if self._states.get(key, object()) == state:
+            return False
+        self._states[key] = state
+        self.logger.log(level, message)
+        return True
+
+
+def setup_logging(log_file=None, level=logging.INFO, max_bytes=1024 * 1024, backup_count=5, rate=1.0, burst=5):
+    """
+    Неблокуюче логування для всього процесу.
+
+    Кореневий логер отримує лише QueueHandler: запис у чергу не чекає на
+    диск чи консоль. Окремий потік QueueListener пише у консоль і, за
+    потреби, у файл з ротацією за розміром та стисненням. Повторний виклик
+    нічого не додає.
+
+    :param log_file: Шлях до файлу логу або None - лише консоль
+    :param level: Рівень логування
+    :param max_bytes: Розмір файлу, після якого відбувається ротація
+    :param backup_count: Кількість збережених стиснених файлів
+    :param rate: Кількість однакових повідомлень за секунду (див. RateLimitFilter)
+    :param burst: Кількість однакових повідомлень, дозволених підряд
+    :return: QueueListener
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(CompressingRotatingFileHandler(log_file, max_bytes, backup_count))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate, burst))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """
+    Зупинка потоку логування з записом усіх повідомлень з черги.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -3,6 +3,7 @@ import os
 from sensor import TemperatureSensor
 # from mqtt_client import MQTTClient
 from logger import setup_logger
+from filters import default_pipeline
 
 # Налаштування MQTT
 # MQTT_BROKER = "greenhouse.net.ua"
@@ -19,8 +20,8 @@ t_boy = TemperatureSensor('28-0921c00ef1b1')
 t_kol = TemperatureSensor('28-0921c0107bb4')
 
 
-def moving_average_filter(new_value, smoothed_value):
-    return 0.9 * smoothed_value + 0.1 * new_value
+# Відкидання викидів, медіана та згладжування (0.9/0.1, як раніше)
+pipeline = default_pipeline()
 
 
 def main():
@@ -36,13 +37,13 @@ def main():
             logger.error("No sensors found.")
             return
 
-        smoothed_temperature = initial_temperature
+        pipeline.filter({t_bat.sensor_id: initial_temperature})
 
         while True:
             raw_temperature = t_bat.read_temperature()
+            smoothed_temperature = pipeline.filter({t_bat.sensor_id: raw_temperature})[t_bat.sensor_id]
 
-            if raw_temperature is not None:
-                smoothed_temperature = moving_average_filter(raw_temperature, smoothed_temperature)
+            if smoothed_temperature is not None:
                 logger.info(f"Raw Temperature: {raw_temperature}")
                 logger.info(f"Smoothed Temperature: {round(smoothed_temperature, 2)}")
 
@@ -0,0 +1,218 @@
+import json
+import bisect
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Межі гістограм за замовчуванням: від 50 мкс до 2.5 с
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, fn=None):
+        """
+        Лічильник, що лише зростає. fn - функція без аргументів, з якої
+        значення береться під час читання (для лічильників, що вже є у компонентах).
+        """
+        self.value = 0
+        self.fn = fn
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def samples(self, name, labels):
+        yield name + '_total' + _label_text(labels), self.get()
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        value = self.get()
+        if value is not None:
+            yield name + _label_text(labels), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Гістограма з фіксованими межами. observe() - двійковий пошук і два
+        додавання, тож підходить для кожного такту.
+        """
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get(self):
+        return {'count': self.count, 'sum': self.sum}
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield name + '_bucket' + _label_text(labels + (('le', repr(bound)),)), cumulative
+        yield name + '_bucket' + _label_text(labels + (('le', '+Inf'),)), self.count
+        yield name + '_sum' + _label_text(labels), self.sum
+        yield name + '_count' + _label_text(labels), self.count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Реєстр метрик процесу: лічильники, показники та гістограми затримок.
+
+        Метрика створюється один раз (повторний виклик повертає ту саму), а
+        компоненти тримають посилання на неї, тому запис - звичайне додавання
+        без пошуку за назвою.
+        """
+        self._metrics = {}    # назва -> (тип, довідка, {мітки: метрика})
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, factory):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            entry = self._metrics.get(name)
+            if entry is None:
+                entry = self._metrics[name] = (cls.kind, help_text, {})
+            elif entry[0] != cls.kind:
+                raise ValueError(f"Метрика {name} вже зареєстрована як {entry[0]}")
+            metric = entry[2].get(key)
+            if metric is None:
+                metric = entry[2][key] = factory()
+            return metric
+
+    def counter(self, name, help_text='', labels=None, fn=None):
+        metric = self._get(Counter, name, help_text, labels, lambda: Counter(fn))
+        if fn is not None:
+            # Новий екземпляр компонента (наприклад, у симуляції) підміняє джерело значення
+            metric.fn = fn
+        return metric
+
+    def gauge(self, name, help_text='', labels=None, fn=None):
+        metric = self._get(Gauge, name, help_text, labels, lambda: Gauge(fn))
+        if fn is not None:
+            metric.fn = fn
+        return metric
+
+    def histogram(self, name, help_text='', labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, lambda: Histogram(buckets))
+
+    def unregister(self, name, labels=None):
+        """
+        Видалення метрики з мітками labels (наприклад, коли компонент прибрано).
+        Остання мітка забирає й саму назву.
+        """
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            entry = self._metrics.get(name)
+            if entry is None:
+                return
+            entry[2].pop(key, None)
+            if not entry[2]:
+                del self._metrics[name]
+
+    def render(self):
+        """
+        :return: Усі метрики у текстовому форматі Prometheus
+        """
+        lines = []
+        with self._lock:
+            entries = [(name, kind, help_text, list(metrics.items()))
+                       for name, (kind, help_text, metrics) in sorted(self._metrics.items())]
+        for name, kind, help_text, metrics in entries:
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                try:
+                    for sample, value in metric.samples(name, labels):
+                        lines.append(f"{sample} {float(value)!r}")
+                except Exception as e:
+                    logging.debug(f"Метрику {name} не вдалося прочитати: {e}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        :return: Словник назва{мітки} -> значення (для публікації у MQTT)
+        """
+        with self._lock:
+            entries = [(name, list(metrics.items())) for name, (kind, help_text, metrics) in self._metrics.items()]
+        result = {}
+        for name, metrics in entries:
+            for labels, metric in metrics:
+                try:
+                    result[name + _label_text(labels)] = metric.get()
+                except Exception:
+                    continue
+        return result
+
+    def publish(self, hub, topic):
+        """
+        Публікація знімка метрик одним JSON-повідомленням.
+        """
+        return hub.publish(topic, json.dumps(self.snapshot()))
+
+
+REGISTRY = MetricsRegistry()
+
+
+def get_registry():
+    """
+    Спільний реєстр метрик процесу.
+    """
+    return REGISTRY
+
+
+def start_http_server(port=9108, host='127.0.0.1', registry=None):
+    """
+    HTTP-ендпойнт /metrics у форматі Prometheus у фоновому потоці.
+    За замовчуванням слухає лише localhost.
+
+    :return: ThreadingHTTPServer (зупинка - server.shutdown())
+    """
+    registry = registry if registry is not None else REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Запити скрейпера не засмічують лог
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logging.info(f"Метрики доступні на http://{host}:{port}/metrics")
+    return server
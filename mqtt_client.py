@@ -1,4 +1,4 @@
-import paho.mqtt.client as mqtt
+from mqtt_hub import get_hub
 
 class MQTTClient:
     def __init__(self, broker, topic, username, password, client_id):
@@ -7,20 +7,20 @@ class MQTTClient:
         self.username = username
         self.password = password
         self.client_id = client_id
-        self.client = self._connect()
+        self.hub = self._connect()
 
     def _connect(self):
-        client = mqtt.Client(self.client_id)
-        client.username_pw_set(self.username, self.password)
-        client.connect(self.broker, 1883, 60)
-        return client
+        # Спільне підключення процесу замість окремого mqtt.Client
+        hub = get_hub(self.broker, 1883, self.username, self.password, self.client_id)
+        hub.start()
+        return hub
 
     def publish(self, message):
         try:
-            self.client.publish(self.topic, message)
+            self.hub.publish(self.topic, message)
         except Exception as e:
+            # Повторне підключення виконує фоновий потік mqtt_hub
             print(f"MQTT publish failed: {e}")
-            self.client.reconnect()
 
     def disconnect(self):
-        self.client.disconnect()
+        self.hub.stop()
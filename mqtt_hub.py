@@ -0,0 +1,318 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import logging
+import paho.mqtt.client as mqtt
+from metrics import get_registry
+
+# Стани підключення
+DISCONNECTED = 'disconnected'
+CONNECTING = 'connecting'
+CONNECTED = 'connected'
+STOPPED = 'stopped'
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+class MQTTHub:
+    def __init__(self, broker, port=1883, user=None, password=None, client_id=None, keepalive=60,
+                 min_backoff=1.0, max_backoff=120.0):
+        """
+        Одне MQTT-підключення на процес для всіх компонентів.
+
+        Компоненти реєструють свої теми та обробники через register(), а
+        публікують через publish(). Усі підписки відправляються одним пакетом
+        SUBSCRIBE при кожному підключенні.
+
+        Мережею керує власний фоновий потік-автомат станів: після обриву він
+        повторює підключення з експоненційною затримкою (з min_backoff до
+        max_backoff) і випадковим розкидом, не блокуючи ні колбеки, ні
+        компоненти. Поки зв'язку немає, publish() не чекає і лише рахує
+        відкинуті повідомлення.
+
+        :param broker: Адреса MQTT брокера
+        :param port: Порт MQTT брокера
+        :param user: Ім'я користувача MQTT
+        :param password: Пароль MQTT
+        :param client_id: Ідентифікатор клієнта; за замовчуванням унікальний для процесу
+        :param keepalive: Інтервал keepalive у секундах
+        :param min_backoff: Початкова затримка повторного підключення у секундах
+        :param max_backoff: Максимальна затримка повторного підключення у секундах
+        """
+        self.broker = broker
+        self.port = port
+        self.user = user
+        self.password = password
+        # PID процесу в ідентифікаторі: кілька програм на одній Pi не витісняють одна одну
+        self.client_id = client_id if client_id else f"raspi-{os.uname().nodename}-{os.getpid()}"
+        self.keepalive = keepalive
+
+        self._lock = threading.Lock()
+        self._exact = {}          # тема -> [обробники]
+        self._wildcards = []      # [(фільтр з + або #, обробник)]
+        self._qos = {}            # фільтр -> qos
+        self._connect_listeners = []
+        self._disconnect_listeners = []
+        self._users = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # Стан автомата підключення та лічильники
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.state = DISCONNECTED
+        self.attempts = 0         # Усього спроб підключення
+        self.failures = 0         # Невдалих спроб поспіль
+        self.last_error = None
+        self.dropped = 0          # Повідомлень, відкинутих без підключення
+
+        # Метрики підключення; значення беруться з атрибутів під час читання
+        registry = get_registry()
+        registry.gauge('mqtt_connected', "1 - підключено до брокера", fn=lambda: int(self.connected))
+        registry.counter('mqtt_connect_attempts', "Спроби підключення", fn=lambda: self.attempts)
+        registry.counter('mqtt_dropped', "Повідомлення, відкинуті без підключення", fn=lambda: self.dropped)
+        self._received = registry.counter('mqtt_messages_received', "Отримані повідомлення")
+        self._handler_errors = registry.counter('mqtt_handler_errors', "Помилки обробників повідомлень")
+        self._unhandled = registry.counter('mqtt_messages_unhandled', "Повідомлення без обробника")
+        self._published = registry.counter('mqtt_messages_published', "Опубліковані повідомлення")
+
+        self.client = mqtt.Client(self.client_id)
+        if user is not None:
+            self.client.username_pw_set(user, password)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+
+    def register(self, topic_filter, handler, qos=0):
+        """
+        Реєстрація обробника теми.
+
+        :param topic_filter: Тема або фільтр з + / #
+        :param handler: Функція handler(topic, message), message - рядок
+        :param qos: QoS підписки
+        """
+        with self._lock:
+            if '+' in topic_filter or '#' in topic_filter:
+                self._wildcards.append((topic_filter, handler))
+            else:
+                self._exact.setdefault(topic_filter, []).append(handler)
+            is_new = topic_filter not in self._qos
+            self._qos[topic_filter] = max(qos, self._qos.get(topic_filter, 0))
+        if is_new and self.connected:
+            self.client.subscribe(topic_filter, qos)
+
+    def add_listener(self, on_connect=None, on_disconnect=None):
+        """
+        Підписка компонента на події підключення/відключення.
+
+        :param on_connect: Функція без аргументів, викликається після підключення
+        :param on_disconnect: Функція rc, викликається після відключення
+        """
+        if on_connect is not None:
+            self._connect_listeners.append(on_connect)
+        if on_disconnect is not None:
+            self._disconnect_listeners.append(on_disconnect)
+
+    @property
+    def connected(self):
+        return self.state == CONNECTED
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        if not self.connected:
+            # Не чекаємо на мережу: компоненти працюють далі з повною швидкістю
+            self.dropped += 1
+            return None
+        self._published.inc()
+        return self.client.publish(topic, payload, qos, retain)
+
+    def start(self):
+        """
+        Запуск фонового потоку підключення (лише при першому виклику).
+        Повертається одразу; підключення встановлюється у фоні.
+        """
+        with self._lock:
+            self._users += 1
+            if self._users > 1:
+                return
+            self._stop_event.clear()
+            self.client.connect_async(self.broker, self.port, self.keepalive)
+            self._thread = threading.Thread(target=self._run, name='mqtt-hub', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Відключення, коли його більше не використовує жоден компонент.
+        """
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            if self._users or self._thread is None:
+                return
+            thread, self._thread = self._thread, None
+        self._stop_event.set()
+        thread.join()
+        if self.connected:
+            self.client.disconnect()
+        self.state = STOPPED
+
+    def backoff(self):
+        """
+        Затримка перед наступною спробою: експоненційна з обмеженням і
+        випадковим розкидом, щоб пристрої не підключались усі одночасно.
+        """
+        delay = min(self.max_backoff, self.min_backoff * 2 ** max(0, self.failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.state in (DISCONNECTED, STOPPED):
+                self.state = CONNECTING
+                self.attempts += 1
+                try:
+                    self.client.reconnect()
+                except Exception as e:
+                    self._connection_failed(e)
+                    continue
+                connect_started = time.monotonic()
+
+            rc = self.client.loop(timeout=1.0)
+            if rc != mqtt.MQTT_ERR_SUCCESS:
+                self._connection_failed(mqtt.error_string(rc))
+            elif self.state == CONNECTING and time.monotonic() - connect_started > self.keepalive:
+                # Брокер прийняв TCP, але не відповів CONNACK
+                self._connection_failed("немає відповіді CONNACK")
+
+    def _connection_failed(self, error):
+        # Очікування переривається одразу при stop()
+        self._stop_event.wait(self._mark_failed(error))
+
+    def _mark_failed(self, error):
+        """
+        :return: Затримка до наступної спроби у секундах
+        """
+        self.state = DISCONNECTED
+        self.failures += 1
+        self.last_error = str(error)
+        delay = self.backoff()
+        logging.warning(f"MQTT недоступний ({error}), спроба {self.failures}, наступна через {delay:.1f} с.")
+        return delay
+
+    async def run_async(self):
+        """
+        Варіант start() для asyncio: той самий автомат підключення, але без
+        власного потоку. Сокет читається і пишеться колбеками add_reader /
+        add_writer циклу подій, тож обробники повідомлень виконуються у
+        потоці циклу. Працює до скасування задачі.
+        """
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+
+        def in_loop(func, *args):
+            # paho викликає колбеки сокета і з виконавця (під час reconnect)
+            if threading.get_ident() == loop_thread:
+                func(*args)
+            else:
+                loop.call_soon_threadsafe(func, *args)
+
+        client = self.client
+        client.on_socket_open = lambda c, u, sock: in_loop(loop.add_reader, sock, client.loop_read)
+        client.on_socket_close = lambda c, u, sock: in_loop(loop.remove_reader, sock)
+        client.on_socket_register_write = lambda c, u, sock: in_loop(loop.add_writer, sock, client.loop_write)
+        client.on_socket_unregister_write = lambda c, u, sock: in_loop(loop.remove_writer, sock)
+        client.connect_async(self.broker, self.port, self.keepalive)
+        try:
+            while True:
+                self.state = CONNECTING
+                self.attempts += 1
+                try:
+                    # DNS та TCP-підключення можуть блокувати - у виконавці
+                    await loop.run_in_executor(None, client.reconnect)
+                except Exception as e:
+                    await asyncio.sleep(self._mark_failed(e))
+                    continue
+                # Keepalive та таймаути; якщо paho закрив сокет - підключення втрачено
+                while client.loop_misc() == mqtt.MQTT_ERR_SUCCESS and client.socket() is not None:
+                    await asyncio.sleep(1.0)
+                await asyncio.sleep(self._mark_failed("з'єднання втрачено"))
+        finally:
+            client.on_socket_open = client.on_socket_close = None
+            client.on_socket_register_write = client.on_socket_unregister_write = None
+            sock = client.socket()
+            if sock is not None:
+                loop.remove_reader(sock)
+                loop.remove_writer(sock)
+            # Без колбеків paho надсилає DISCONNECT одразу, не чекаючи циклу подій
+            if self.connected:
+                client.disconnect()
+            self.state = STOPPED
+
+    def stats(self):
+        """
+        :return: Словник зі станом підключення та лічильниками
+        """
+        return {
+            'state': self.state,
+            'attempts': self.attempts,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'dropped': self.dropped,
+        }
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logging.error(f"Не вдалося підключитися до MQTT брокера, код повернення {rc}")
+            # Брокер відмовив (наприклад, невірний пароль) - автомат повторить спробу пізніше
+            client.disconnect()
+            return
+        self.state = CONNECTED
+        self.failures = 0
+        logging.info("Підключено до MQTT брокера!")
+        with self._lock:
+            subscriptions = list(self._qos.items())
+        if subscriptions:
+            # Усі теми одним пакетом SUBSCRIBE
+            client.subscribe(subscriptions)
+            logging.info(f"Підписано на теми: {len(subscriptions)}")
+        for listener in self._connect_listeners:
+            listener()
+
+    def _on_disconnect(self, client, userdata, rc):
+        if self.state == CONNECTED:
+            self.state = DISCONNECTED
+        logging.warning("Відключено від MQTT брокера.")
+        for listener in self._disconnect_listeners:
+            listener(rc)
+
+    def _on_message(self, client, userdata, msg):
+        topic = msg.topic
+        message = msg.payload.decode('utf-8').strip()
+        logging.debug(f"Отримано повідомлення на тему {topic}: {message}")
+        self._received.inc()
+        handlers = self._exact.get(topic, [])
+        if self._wildcards:
+            handlers = handlers + [h for f, h in self._wildcards if mqtt.topic_matches_sub(f, topic)]
+        if not handlers:
+            self._unhandled.inc()
+            logging.warning(f"Немає обробника для теми: {topic}. Повідомлення: {message}")
+        for handler in handlers:
+            try:
+                handler(topic, message)
+            except Exception as e:
+                self._handler_errors.inc()
+                logging.error(f"Помилка обробки повідомлення на тему {topic}: {e}")
+
+
+def get_hub(broker="greenhouse.net.ua", port=1883, user=None, password=None, client_id=None):
+    """
+    Спільне MQTT-підключення процесу. Створюється при першому виклику з його
+    параметрами; наступні виклики повертають той самий об'єкт.
+    """
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = MQTTHub(broker, port, user, password, client_id)
+        elif (broker, port, user) != (_hub.broker, _hub.port, _hub.user):
+            logging.warning(f"MQTT вже підключено до {_hub.broker} як {_hub.user}; параметри {broker}/{user} проігноровано.")
+        return _hub
@@ -0,0 +1,138 @@
+import math
+import logging
+
+EEPROM = 'eeprom'
+ATTR = 'attr'
+
+
+class Param:
+    __slots__ = ('topic', 'key', 'parse', 'low', 'high', 'choices', 'store', 'label', 'effect')
+
+    def __init__(self, topic, key=None, parse=float, low=None, high=None, choices=None, store=EEPROM,
+                 label=None, effect=None):
+        """
+        Опис одного параметра, що задається через MQTT.
+
+        :param topic: Тема MQTT
+        :param key: Ключ у EEPROM або назва атрибута (для числових параметрів)
+        :param parse: Перетворення повідомлення у значення (float, int)
+        :param low: Нижня межа значення або None
+        :param high: Верхня межа значення або None
+        :param choices: Словник повідомлення -> {ключ: значення} для режимів (on/off, heat/off, ...)
+        :param store: EEPROM - словник налаштувань, ATTR - атрибути цільового об'єкта
+        :param label: Назва параметра для логів
+        :param effect: Функція effect(target, updates), що викликається після зміни
+        """
+        self.topic = topic
+        self.key = key
+        self.parse = parse
+        self.low = low
+        self.high = high
+        self.choices = choices
+        self.store = store
+        self.label = label or key or topic
+        self.effect = effect
+
+    def updates(self, message):
+        """
+        Розбір повідомлення.
+
+        :return: Словник {ключ: значення} або None, якщо повідомлення недійсне
+        """
+        if self.choices is not None:
+            return self.choices.get(message)
+        try:
+            value = self.parse(message)
+        except ValueError:
+            logging.error(f"Недійсне значення {self.label}: {message}")
+            return None
+        if not math.isfinite(value):
+            # nan проходить будь-яке порівняння з межами, а nan/inf у JSON - нестандартні
+            logging.error(f"Недійсне значення {self.label}: {message}")
+            return None
+        clamped = value
+        if self.low is not None and clamped < self.low:
+            clamped = self.low
+        if self.high is not None and clamped > self.high:
+            clamped = self.high
+        if clamped != value:
+            logging.warning(f"{self.label}: значення {value} обмежено до {clamped}")
+        return {self.key: clamped}
+
+
+class ParamTable:
+    def __init__(self, params, prefix='home/set/'):
+        """
+        Таблиця параметрів: одна підписка з шаблоном замість окремої теми і
+        окремого методу-обробника на кожен параметр.
+
+        :param params: Список Param
+        :param prefix: Спільний префікс тем, на який оформлюється підписка prefix#
+        """
+        self.params = {param.topic: param for param in params}
+        self.prefix = prefix
+
+    def __iter__(self):
+        return iter(self.params)
+
+    def __contains__(self, topic):
+        return topic in self.params
+
+    def subscriptions(self):
+        """
+        :return: Список фільтрів тем: prefix# та теми поза префіксом
+        """
+        filters = [topic for topic in self.params if not topic.startswith(self.prefix)]
+        if len(filters) < len(self.params):
+            filters.insert(0, f"{self.prefix}#")
+        return filters
+
+    def bind(self, eeprom, target, on_change=None):
+        """
+        Побудова обробника повідомлень для конкретних налаштувань та об'єкта.
+
+        Для кожної теми заздалегідь готується функція запису у потрібне
+        сховище, тож обробка повідомлення - один пошук у словнику.
+
+        :param eeprom: Словник налаштувань
+        :param target: Об'єкт для параметрів зі store=ATTR
+        :param on_change: Функція без аргументів, що викликається після будь-якої зміни
+        :return: Функція handler(topic, message)
+        """
+        def to_eeprom(updates):
+            for key, value in updates.items():
+                eeprom[key] = value
+
+        def to_attrs(updates):
+            for key, value in updates.items():
+                setattr(target, key, value)
+
+        writers = {topic: (param, to_eeprom if param.store == EEPROM else to_attrs)
+                   for topic, param in self.params.items()}
+
+        def handler(topic, message):
+            entry = writers.get(topic)
+            if entry is None:
+                # Під шаблон prefix# потрапляють і чужі теми
+                logging.debug(f"Немає параметра для теми: {topic}. Повідомлення: {message}")
+                return
+            param, write = entry
+            updates = param.updates(message)
+            if updates is None:
+                return
+            write(updates)
+            if param.effect is not None:
+                param.effect(target, updates)
+            shown = message if param.choices is not None else updates[param.key]
+            logging.info(f"{param.label} встановлено: {shown}")
+            if on_change is not None:
+                on_change()
+
+        return handler
+
+    def register(self, hub, handler):
+        """
+        Реєстрація обробника в mqtt_hub: усі фільтри підуть одним пакетом SUBSCRIBE.
+        """
+        for topic_filter in self.subscriptions():
+            hub.register(topic_filter, handler)
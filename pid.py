@@ -1,84 +1,153 @@
-import RPi.GPIO as GPIO
-import paho.mqtt.client as mqtt
-import json
 import threading
 import time
+import asyncio
 import logging
 # from w1thermsensor import W1ThermSensor
-from ds18b20 import TemperatureSensor
-# Налаштування логування
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Налаштування GPIO
-GPIO.setmode(GPIO.BCM)
+from ds18b20 import TelemetryPublisher
+from sampler import TemperatureSampler
+from sensor import apply_resolutions
+from filters import default_pipeline
+import w1
+from settings import SettingsStore
+from scheduler import TickScheduler
+import hal
+from logger import setup_logging, stop_logging, TransitionLogger
+from mqtt_hub import get_hub
+from runtime import AsyncRuntime
+from params import Param, ParamTable, ATTR
+from history import History, PID_FIELDS
+from tsdb import TimeSeriesStore
+from metrics import get_registry, start_http_server
 
 # Визначення пінів (замініть на ваші актуальні пін-коди)
 PIN_HIGH = 17       # Пін для клапана HIGH
 PIN_LOW = 27        # Пін для клапана LOW
 NASOS_OTOP = 22     # Пін для насоса
 
-GPIO.setup(PIN_HIGH, GPIO.OUT)
-GPIO.setup(PIN_LOW, GPIO.OUT)
-GPIO.setup(NASOS_OTOP, GPIO.OUT)
+def setup_gpio(gpio):
+    # Налаштування GPIO (бекенд передається ззовні: RPi.GPIO або hal.FakeGPIO)
+    gpio.setmode(gpio.BCM)
+    gpio.setup(PIN_HIGH, gpio.OUT)
+    gpio.setup(PIN_LOW, gpio.OUT)
+    gpio.setup(NASOS_OTOP, gpio.OUT)
+
+# Період такту ПІД-циклу та імпульсу керування клапаном (секунди)
+TICK_PERIOD = 0.05
+PULSE_PERIOD = 0.1
 
 # Імітація EEPROM за допомогою JSON файлу
 EEPROM_FILE = 'eeprom.json'
 
+# Каталоги довготривалої історії стану регулятора і температур датчиків
+TSDB_DIR = 'tsdb'
+TSDB_SENSORS_DIR = 'tsdb_sensors'
+
+# Метрики: HTTP-ендпойнт Prometheus на localhost і, за потреби, тема MQTT (наприклад 'home/boiler/metrics')
+METRICS_PORT = 9108
+METRICS_TOPIC = None
+
+# Телеметрія датчиків: усі покази одним JSON-повідомленням з мертвою зоною
+TELEMETRY_TOPIC = 'home/heat_on/temperatures'
+
+DEFAULT_EEPROM = {
+    'nasos_on': False,
+    'heat_otop': False,
+    'valve_mode': False,
+    'temp_min_out': 10.0,
+    'temp_max_heat': 60.0,
+    'temp_max_out': 80.0,
+    'temp_off_otop': 55.0,
+    'per_on': 10.0,
+    'per_off': 100.0,
+    'kof_p': 1.0,
+    'kof_i': 1.0,
+    'kof_d': 1.0,
+    'dead_zone': 0.5,
+    'T_bat': 0.0  # Поточна температура (можливо, потрібно оновити)
+}
+
 def load_eeprom():
-    try:
-        with open(EEPROM_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Початкові значення, якщо файл не існує
-        return {
-            'nasos_on': False,
-            'heat_otop': False,
-            'valve_mode': False,
-            'temp_min_out': 10.0,
-            'temp_max_heat': 60.0,
-            'temp_max_out': 80.0,
-            'temp_off_otop': 55.0,
-            'per_on': 10.0,
-            'per_off': 100.0,
-            'kof_p': 1.0,
-            'kof_i': 1.0,
-            'kof_d': 1.0,
-            'dead_zone': 0.5,
-            'T_bat': 0.0  # Поточна температура (можливо, потрібно оновити)
-        }
+    # Сховище саме відстежує зміни і записує файл атомарно у фоні
+    return SettingsStore(EEPROM_FILE, DEFAULT_EEPROM)
 
 def save_eeprom(eeprom):
-    with open(EEPROM_FILE, 'w') as f:
-        json.dump(eeprom, f)
+    # Лише запит: файл буде перезаписано один раз після того, як зміни вщухнуть
+    eeprom.save()
+
+class PIDSettings:
+    """
+    Незмінний знімок параметрів ПІД-регулятора.
+
+    Створюється з EEPROM один раз при зміні параметра: захист від ділення
+    на нуль і обмеження виконуються тут, а не на кожному такті. Контролер
+    замінює знімок цілком присвоєнням посилання, тому цикл ніколи не бачить
+    частково застосованого оновлення.
+    """
+    __slots__ = ('T_X1', 'T_Y1', 'T_X2', 'T_Y2', 'SLOPE', 'ON_OFF', 'AUTO_HAND',
+                 'CYCLE', 'VALVE', 'K_P', 'K_I', 'K_D', 'DEAD_ZONE')
+
+    def __init__(self, eeprom):
+        set_ = object.__setattr__
+        x1, y1 = eeprom['temp_min_out'], eeprom['temp_max_heat']
+        x2, y2 = eeprom['temp_max_out'], eeprom['temp_off_otop']
+        set_(self, 'T_X1', x1)
+        set_(self, 'T_Y1', y1)
+        set_(self, 'T_X2', x2)
+        set_(self, 'T_Y2', y2)
+        # Нахил опалювальної кривої між точками (T_X1, T_Y1) та (T_X2, T_Y2)
+        set_(self, 'SLOPE', (y1 - y2) / (x1 - x2) if x1 != x2 else 0.0)
+        set_(self, 'ON_OFF', eeprom['heat_otop'])
+        set_(self, 'AUTO_HAND', eeprom['valve_mode'])
+
+        # Захист від ділення на нуль
+        k_i = eeprom['kof_i']
+        if k_i == 0.0:
+            k_i = 9999.0
+        cycle = eeprom['per_on']
+        if cycle == 0.0:
+            cycle = 1.0
+
+        # Обмеження параметрів
+        set_(self, 'K_P', max(min(eeprom['kof_p'], 99.0), -99.0))
+        set_(self, 'K_I', max(min(k_i, 9999.0), 1.0))
+        set_(self, 'K_D', max(min(eeprom['kof_d'], 9999.0), 0.0))
+        set_(self, 'CYCLE', max(min(cycle, 25.0), 1.0))
+        set_(self, 'VALVE', max(min(eeprom['per_off'], 250.0), 15.0))
+        set_(self, 'DEAD_ZONE', eeprom['dead_zone'])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PIDSettings незмінний; створіть новий знімок")
 
 class PIDController(threading.Thread):
-    def __init__(self, eeprom, get_temperature_func):
+    def __init__(self, eeprom, get_temperature_func, gpio, clock=None, history=None):
+        # get_temperature_func повертає (температура, вік значення у секундах)
+        # gpio - бекенд з інтерфейсом RPi.GPIO, clock - hal.MonotonicClock або hal.VirtualClock
+        # history - history.History з полями history.PID_FIELDS або None
         super().__init__()
         self.eeprom = eeprom
         self.get_temperature = get_temperature_func
+        self.gpio = gpio
+        # Виходи пишуться в GPIO лише при зміні стану, один раз за такт
+        self.outputs = hal.OutputBank(gpio)
+        # Стан насоса логується лише при перемиканні, а не на кожному такті
+        self.transitions = TransitionLogger()
+        self.clock = clock if clock is not None else hal.MonotonicClock()
+        self.history = history
         self.running = True
 
+        # Знімок параметрів; замінюється цілком через update_settings()
+        self.settings = PIDSettings(self.eeprom)
+
         # Змінні для ПІД-регулювання
         self.T_OUT = 0.0
-        self.T_X1 = self.eeprom['temp_min_out']
-        self.T_Y1 = self.eeprom['temp_max_heat']
-        self.T_X2 = self.eeprom['temp_max_out']
-        self.T_Y2 = self.eeprom['temp_off_otop']
+        self.T_OUT_AGE = None
         self.T_SET = 0.0
 
-        self.ON_OFF = self.eeprom['heat_otop']
-        self.AUTO_HAND = self.eeprom['valve_mode']
         self.HAND_UP = False
         self.HAND_DOWN = False
         self.SET_VALUE = 0.0
         self.PRESENT_VALUE = 0.0
         self.PULSE_100MS = False
-        self.CYCLE = self.eeprom['per_on']
-        self.VALVE = self.eeprom['per_off']
-        self.K_P = self.eeprom['kof_p']
-        self.K_I = self.eeprom['kof_i']
-        self.K_D = self.eeprom['kof_d']
-        self.DEAD_ZONE = self.eeprom['dead_zone']
 
         # Розбіжності
         self.E_1 = 0.0
@@ -91,167 +160,203 @@ class PIDController(threading.Thread):
         self.TIMER_PID_DOWN = 0.0
         self.PID_PULSE = False
 
-        # Тригери та генератори
-        self._trgrt1 = False
-        self._trgrt1I = False
-        self._trgrt2 = False
-        self._trgrt2I = False
-        self._gtv1 = False
-        self._gtv2 = False
-        self._gen1I = False
-        self._gen1O = False
-        self.timer = time.time()
+        # Імпульс 100 мс формується з фактично минулого часу монотонного годинника
+        self.PULSE_DT = 0.0           # Тривалість поточного імпульсу у секундах
+        self._pulse_elapsed = 0.0     # Час, накопичений з останнього імпульсу
+        self._last_tick = None
+        self.scheduler = TickScheduler(TICK_PERIOD, clock=self.clock.now, sleep=self.clock.sleep)
+        self.TICK_LATENESS = 0.0      # Запізнення останнього такту відносно дедлайну
+
+        # Сумарний час увімкнення реле клапана у секундах (лічильники): імпульс 100 мс коротший
+        # за період запису історії, тож в історію йде накопичений час, а не миттєвий стан
+        self.UP_TIME = 0.0
+        self.DOWN_TIME = 0.0
+        self._up_on = False
+        self._down_on = False
+
+        # Метрики: гістограма тривалості такту, решта читається з атрибутів під час запиту
+        registry = get_registry()
+        self._loop_seconds = registry.histogram('pid_loop_seconds', "Тривалість loop_pid")
+        registry.gauge('pid_t_out_celsius', "Температура T_OUT", fn=lambda: self.T_OUT)
+        registry.gauge('pid_t_out_age_seconds', "Вік значення T_OUT", fn=lambda: self.T_OUT_AGE)
+        registry.gauge('pid_t_set_celsius', "Уставка T_SET", fn=lambda: self.T_SET)
+        registry.gauge('pid_sum_d_t', "Накопичений хід клапана SUM_D_T", fn=lambda: self.SUM_D_T)
+        registry.gauge('pid_tick_lateness_seconds', "Запізнення останнього такту", fn=lambda: self.TICK_LATENESS)
+        registry.gauge('pid_tick_lateness_max_seconds', "Найбільше запізнення такту",
+                       fn=lambda: self.scheduler.max_lateness)
+        registry.counter('pid_ticks', "Виконані такти", fn=lambda: self.scheduler.ticks)
+        registry.counter('pid_ticks_skipped', "Пропущені такти", fn=lambda: self.scheduler.skipped)
+        registry.counter('gpio_commits', "Записи у GPIO", fn=lambda: self.outputs.commits)
+        registry.counter('pid_valve_up_seconds', "Сумарний час увімкнення реле UP", fn=lambda: self.UP_TIME)
+        registry.counter('pid_valve_down_seconds', "Сумарний час увімкнення реле DOWN", fn=lambda: self.DOWN_TIME)
 
     def run(self):
         while self.running:
+            self.TICK_LATENESS = self.scheduler.wait()
             self.loop_pid()
-            time.sleep(0.05)  # 50 мс
 
     def stop(self):
         self.running = False
 
+    def update_settings(self):
+        """
+        Перечитування параметрів з EEPROM після зміни (викликається з MQTT).
+        Новий знімок перевіряється повністю і лише потім підміняє старий.
+        """
+        self.settings = PIDSettings(self.eeprom)
+
     def loop_pid(self):
-        # Управління тригером 1
-        if self._trgrt1I:
-            self._trgrt1 = False
+        started = time.perf_counter()
+
+        # Генератор імпульсу 100 мс: накопичуємо фактично минулий час, тому
+        # перевантаження циклу не зменшує реальний хід клапана
+        now = self.clock.now()
+        if self._last_tick is not None:
+            elapsed = now - self._last_tick
+            self._pulse_elapsed += elapsed
+            # Реле клапана, увімкнене попереднім тактом, працювало весь проміжок до цього такту
+            if self._up_on:
+                self.UP_TIME += elapsed
+            if self._down_on:
+                self.DOWN_TIME += elapsed
+        self._last_tick = now
+        # Допуск у пів такту, щоб похибка таймера сну не пропускала імпульс
+        pulse = self._pulse_elapsed >= PULSE_PERIOD - TICK_PERIOD / 2
+        if pulse:
+            self.PULSE_DT = self._pulse_elapsed
+            self._pulse_elapsed = 0.0
+
+        # Розрахунок цільової температури (значення з кешу опитувача, без очікування шини)
+        temperature, self.T_OUT_AGE = self.get_temperature()
+        self.T_OUT = temperature if temperature is not None else 0.0  # 0.0, доки немає жодного зчитування
+
+        # Один знімок на весь такт: параметри не змінюються посеред розрахунку
+        st = self.settings
+
+        if self.T_OUT <= st.T_X1:
+            self.T_SET = st.T_Y1
+        elif st.T_X1 < self.T_OUT < st.T_X2:
+            self.T_SET = (self.T_OUT - st.T_X1) * st.SLOPE + st.T_Y1
         else:
-            self._trgrt1 = True
-            self._trgrt1I = True
-        self._gtv1 = self._trgrt1
-
-        # Генератор
-        if not self._gen1I:
-            self._gen1I = True
-            self._gen1O = True
-            self.timer = time.time()
-
-        # Таймер генератора
-        if self._gen1I and (time.time() - self.timer) > 0.05:
-            self.timer = time.time()
-            self._gen1O = not self._gen1O
-
-        # Управління тригером 2
-        if self._gen1O:
-            if self._trgrt2I:
-                self._trgrt2 = False
-            else:
-                self._trgrt2 = True
-                self._trgrt2I = True
-        else:
-            self._trgrt2 = False
-            self._trgrt2I = False
-        self._gtv2 = self._trgrt2
-
-        # Розрахунок цільової температури
-        self.T_OUT = self.get_temperature()
-        self.T_X1 = self.eeprom['temp_min_out']
-        self.T_Y1 = self.eeprom['temp_max_heat']
-        self.T_X2 = self.eeprom['temp_max_out']
-        self.T_Y2 = self.eeprom['temp_off_otop']
-
-        if self.T_OUT <= self.T_X1:
-            self.T_SET = self.T_Y1
-        elif self.T_X1 < self.T_OUT < self.T_X2:
-            if self.T_X1 == self.T_X2:
-                self.T_X1 += 0.1
-            self.T_SET = (self.T_OUT - self.T_X1) * (self.T_Y1 - self.T_Y2) / (self.T_X1 - self.T_X2) + self.T_Y1
-        else:
-            self.T_SET = self.T_Y2
+            self.T_SET = st.T_Y2
 
         self.SET_VALUE = self.T_SET
         self.PRESENT_VALUE = self.eeprom.get('T_bat', 0.0)  # Отримання поточної температури
-        self.PULSE_100MS = self._gtv2
-        self.CYCLE = self.eeprom['per_on']
-        self.VALVE = self.eeprom['per_off']
-        self.K_P = self.eeprom['kof_p']
-        self.K_I = self.eeprom['kof_i']
-        self.K_D = self.eeprom['kof_d']
-        self.DEAD_ZONE = self.eeprom['dead_zone']
+        self.PULSE_100MS = pulse
 
         # Розрахунок помилки
         self.E_1 = self.SET_VALUE - self.PRESENT_VALUE
 
-        # Захист від ділення на нуль
-        if self.K_I == 0.0:
-            self.K_I = 9999.0
-        if self.CYCLE == 0.0:
-            self.CYCLE = 1.0
-
-        # Обмеження параметрів
-        self.K_P = max(min(self.K_P, 99.0), -99.0)
-        self.K_I = max(min(self.K_I, 9999.0), 1.0)
-        self.K_D = max(min(self.K_D, 9999.0), 0.0)
-        self.CYCLE = max(min(self.CYCLE, 25.0), 1.0)
-        self.VALVE = max(min(self.VALVE, 250.0), 15.0)
-
         # Розрахунок ПІД
         if self.PULSE_100MS and self.TIMER_PID == 0.0 and not self.PID_PULSE:
             self.PID_PULSE = True
-            self.D_T = self.K_P * (self.E_1 - self.E_2 + self.CYCLE * self.E_2 / self.K_I + self.K_D * (self.E_1 - 2 * self.E_2 + self.E_3) / self.CYCLE) * self.VALVE / 100.0
+            self.D_T = st.K_P * (self.E_1 - self.E_2 + st.CYCLE * self.E_2 / st.K_I + st.K_D * (self.E_1 - 2 * self.E_2 + self.E_3) / st.CYCLE) * st.VALVE / 100.0
             self.E_3 = self.E_2
             self.E_2 = self.E_1
-            self.SUM_D_T = max(min(self.SUM_D_T + self.D_T, self.VALVE), -self.VALVE)
+            self.SUM_D_T = max(min(self.SUM_D_T + self.D_T, st.VALVE), -st.VALVE)
 
-            if -self.DEAD_ZONE < self.E_1 < self.DEAD_ZONE:
+            if -st.DEAD_ZONE < self.E_1 < st.DEAD_ZONE:
                 self.D_T = 0.0
                 self.SUM_D_T = 0.0
 
         # Оновлення таймера
         if self.PULSE_100MS:
-            self.TIMER_PID += 0.1
+            self.TIMER_PID += self.PULSE_DT
 
         # ПІД контроль
-        if self.ON_OFF and self.AUTO_HAND and self.TIMER_PID >= self.CYCLE:
+        if st.ON_OFF and st.AUTO_HAND and self.TIMER_PID >= st.CYCLE:
             self.PID_PULSE = False
             self.TIMER_PID = 0.0
             self.SUM_D_T = 0.0
-        elif not self.AUTO_HAND:
+        elif not st.AUTO_HAND:
             self.PID_PULSE = False
             self.TIMER_PID = 0.0
             self.SUM_D_T = 0.0
 
         # Управління клапанами
-        UP = (((self.SUM_D_T >= self.TIMER_PID and self.SUM_D_T >= 0.5) or self.D_T >= self.CYCLE - 0.5 or self.TIMER_PID_UP >= self.VALVE) and self.AUTO_HAND) or (self.HAND_UP and not self.AUTO_HAND)
-        UP = UP and self.ON_OFF and not False  # DOWN ще не визначено
+        UP = (((self.SUM_D_T >= self.TIMER_PID and self.SUM_D_T >= 0.5) or self.D_T >= st.CYCLE - 0.5 or self.TIMER_PID_UP >= st.VALVE) and st.AUTO_HAND) or (self.HAND_UP and not st.AUTO_HAND)
+        UP = UP and st.ON_OFF and not False  # DOWN ще не визначено
 
         if self.PULSE_100MS and UP:
-            self.TIMER_PID_UP += 0.1
-            self.TIMER_PID_UP = min(self.TIMER_PID_UP, self.VALVE)
-            GPIO.output(PIN_HIGH, GPIO.LOW)
+            self.TIMER_PID_UP += self.PULSE_DT
+            self.TIMER_PID_UP = min(self.TIMER_PID_UP, st.VALVE)
+            self.outputs.set(PIN_HIGH, self.gpio.LOW)
         else:
-            GPIO.output(PIN_HIGH, GPIO.HIGH)
+            self.outputs.set(PIN_HIGH, self.gpio.HIGH)
 
-        DOWN = (((self.SUM_D_T <= -self.TIMER_PID and self.SUM_D_T <= -0.5) or self.D_T <= -self.CYCLE + 0.5 or self.TIMER_PID_DOWN >= self.VALVE) and self.AUTO_HAND) or (self.HAND_DOWN and not self.AUTO_HAND)
-        DOWN = DOWN and self.ON_OFF and not UP
+        DOWN = (((self.SUM_D_T <= -self.TIMER_PID and self.SUM_D_T <= -0.5) or self.D_T <= -st.CYCLE + 0.5 or self.TIMER_PID_DOWN >= st.VALVE) and st.AUTO_HAND) or (self.HAND_DOWN and not st.AUTO_HAND)
+        DOWN = DOWN and st.ON_OFF and not UP
 
         if self.PULSE_100MS and DOWN:
-            self.TIMER_PID_DOWN += 0.1
-            self.TIMER_PID_DOWN = min(self.TIMER_PID_DOWN, self.VALVE)
-            GPIO.output(PIN_LOW, GPIO.LOW)
+            self.TIMER_PID_DOWN += self.PULSE_DT
+            self.TIMER_PID_DOWN = min(self.TIMER_PID_DOWN, st.VALVE)
+            self.outputs.set(PIN_LOW, self.gpio.LOW)
         else:
-            GPIO.output(PIN_LOW, GPIO.HIGH)
+            self.outputs.set(PIN_LOW, self.gpio.HIGH)
 
         # Управління насосом
-        if self.eeprom['heat_otop']:
+        if st.ON_OFF:
             self.turnNasosOn()
         else:
             self.turnNasosOff()
 
-        # Збереження стану в EEPROM
-        save_eeprom(self.eeprom)
+        # Запис у GPIO лише тих виходів, що змінились за такт
+        self.outputs.commit()
+        self._up_on = self.PULSE_100MS and UP
+        self._down_on = self.PULSE_100MS and DOWN
+
+        if self.history is not None:
+            self.history.record(now, (self.T_OUT, self.T_SET, self.PRESENT_VALUE, self.E_1, self.SUM_D_T,
+                                      self.UP_TIME, self.DOWN_TIME, st.ON_OFF))
+
+        self._loop_seconds.observe(time.perf_counter() - started)
 
     def turnNasosOn(self):
-        GPIO.output(NASOS_OTOP, GPIO.HIGH)
+        self.outputs.set(NASOS_OTOP, self.gpio.HIGH)
         self.eeprom['nasos_on'] = True
-        logging.info("Насос увімкнено.")
+        self.transitions.log('nasos', True, "Насос увімкнено.")
 
     def turnNasosOff(self):
-        GPIO.output(NASOS_OTOP, GPIO.LOW)
+        self.outputs.set(NASOS_OTOP, self.gpio.LOW)
         self.eeprom['nasos_on'] = False
-        logging.info("Насос вимкнено.")
+        self.transitions.log('nasos', False, "Насос вимкнено.")
+
+# Параметри, що задаються через MQTT: тема, ключ, тип, межі
+PID_PARAMS = ParamTable([
+    Param("home/set/boy_on/mode/set", label="Режим бойлера",
+          choices={"heat": {'boy_state': True}, "off": {'boy_state': False}}),
+    Param("home/set/boy_on/current-temperature/set", 'temp_u', low=-55.0, high=125.0, label="Уставка бойлера"),
+    Param("home/set/heat_on/mode/set", label="Режим опалення",
+          choices={"heat": {'heat_otop': True, 'summer': False},
+                   "off": {'heat_otop': False},
+                   "heat_cool": {'summer': True, 'heat_otop': False}}),
+    Param("home/set/boy_on/gis-temperature/get", 'gis_boy', low=-55.0, high=125.0, label="Температура GIS"),
+    Param("home/set/heat_on/setpoint-time/cikl", 'per_off', low=15.0, high=250.0, label="Час циклу опалення"),
+    Param("home/set/heat_on/setpoint-time/impuls", 'per_on', low=1.0, high=25.0, label="Час імпульсу опалення"),
+    Param("home/set/heat_on/boiler-temperature/off", 'temp_off_otop', low=-55.0, high=125.0,
+          label="Температура вимкнення опалення"),
+    Param("home/set/heat_on/temp_min_out", 'temp_min_out', low=-55.0, high=125.0,
+          label="Мінімальна температура на виході"),
+    Param("home/set/heat_on/temp_max_out", 'temp_max_out', low=-55.0, high=125.0,
+          label="Максимальна температура на виході"),
+    Param("home/set/heat_on/temp_max_heat", 'temp_max_heat', low=-55.0, high=125.0,
+          label="Максимальна температура опалення"),
+    Param("home/set/heat_on/kof_p", 'kof_p', low=-99.0, high=99.0, label="KOF_P"),
+    # 0 - інтегральна складова вимкнена (див. loop_pid), тому нижня межа 0, а не 1
+    Param("home/set/heat_on/kof_i", 'kof_i', low=0.0, high=9999.0, label="KOF_I"),
+    Param("home/set/heat_on/kof_d", 'kof_d', low=0.0, high=9999.0, label="KOF_D"),
+    Param("home/set/heat_on/dead_zone", 'dead_zone', low=0.0, label="Dead Zone"),
+    Param("home/set/heat_on/temp_out", 'temp_out', low=-55.0, high=125.0, label="Температура на виході"),
+    Param("home/set/heat_on/valve/mode", label="Режим клапана",
+          choices={"on": {'valve_mode': True}, "off": {'valve_mode': False}}),
+    Param("home/set/heat_on/hand_up", store=ATTR, label="Ручний підйом",
+          choices={"on": {'HAND_UP': True}, "off": {'HAND_UP': False}}),
+    Param("home/set/heat_on/hand_down", store=ATTR, label="Ручне опускання",
+          choices={"on": {'HAND_DOWN': True}, "off": {'HAND_DOWN': False}}),
+])
 
 class MQTTClient:
-    def __init__(self, eeprom, pid_controller):
+    def __init__(self, eeprom, pid_controller, hub=None):
         self.eeprom = eeprom
         self.pid = pid_controller
 
@@ -260,293 +365,90 @@ class MQTTClient:
         self.MQTT_PORT = 1883
         self.MQTT_USER = "mqtt_boyler"
         self.MQTT_PASSWORD = "qwerty"
-        self.CLIENT_ID = f"raspi-{os.uname().nodename}"
-
-        # Ініціалізація MQTT клієнта
-        self.client = mqtt.Client(self.CLIENT_ID)
-        self.client.username_pw_set(self.MQTT_USER, self.MQTT_PASSWORD)
-
-        # Прив'язка колбеків
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-
-        # Підписані теми
-        self.topic_handlers = {
-            "home/set/boy_on/mode/set": self.handle_boy_mode_set,
-            "home/set/boy_on/current-temperature/set": self.handle_boy_temp_set,
-            "home/set/heat_on/mode/set": self.handle_heat_mode_set,
-            "home/set/boy_on/gis-temperature/get": self.handle_gis_temperature,
-            "home/set/heat_on/setpoint-time/cikl": self.handle_heat_cycle_time,
-            "home/set/heat_on/setpoint-time/impuls": self.handle_heat_impulse_time,
-            "home/set/heat_on/boiler-temperature/off": self.handle_heat_temp_off,
-            "home/set/heat_on/temp_min_out": self.handle_temp_min_out,
-            "home/set/heat_on/temp_max_out": self.handle_temp_max_out,
-            "home/set/heat_on/temp_max_heat": self.handle_temp_max_heat,
-            "home/set/heat_on/kof_p": self.handle_kof_p,
-            "home/set/heat_on/kof_i": self.handle_kof_i,
-            "home/set/heat_on/kof_d": self.handle_kof_d,
-            "home/set/heat_on/dead_zone": self.handle_dead_zone,
-            "home/set/heat_on/temp_out": self.handle_temp_out,
-            "home/set/heat_on/valve/mode": self.handle_valve_mode,
-            "home/set/heat_on/hand_up": self.handle_hand_up,
-            "home/set/heat_on/hand_down": self.handle_hand_down,
-        }
-
-    def on_connect(self, client, userdata, flags, rc):
-        if rc == 0:
-            logging.info("Підключено до MQTT брокера!")
-            # Підписка на всі відповідні теми
-            for topic in self.topic_handlers.keys():
-                client.subscribe(topic)
-                logging.info(f"Підписано на тему: {topic}")
-        else:
-            logging.error(f"Не вдалося підключитися до MQTT брокера, код повернення {rc}")
 
-    def on_message(self, client, userdata, msg):
-        topic = msg.topic
-        message = msg.payload.decode('utf-8').strip()
-        logging.debug(f"Отримано повідомлення на тему {topic}: {message}")
+        # Спільне підключення процесу (одна TCP-сесія для всіх компонентів)
+        self.hub = hub if hub is not None else get_hub(self.MQTT_BROKER, self.MQTT_PORT,
+                                                       self.MQTT_USER, self.MQTT_PASSWORD)
 
-        handler = self.topic_handlers.get(topic)
-        if handler:
-            handler(message)
-        else:
-            logging.warning(f"Немає обробника для теми: {topic}. Повідомлення: {message}")
-
-    def handle_boy_mode_set(self, message):
-        if message == "heat":
-            self.eeprom['boy_state'] = True
-            logging.info("Режим бойлера встановлено: Heat")
-        elif message == "off":
-            self.eeprom['boy_state'] = False
-            logging.info("Режим бойлера встановлено: Off")
-        save_eeprom(self.eeprom)
+        # Параметри з таблиці: одна підписка home/set/# і готовий обробник на кожну тему
+        self.params = PID_PARAMS
+        self.on_message = self.params.bind(self.eeprom, self.pid, on_change=self.on_change)
+        self.params.register(self.hub, self.on_message)
 
-    def handle_boy_temp_set(self, message):
-        try:
-            temp_boy = float(message)
-            self.eeprom['temp_u'] = temp_boy
-            logging.info(f"Уставка бойлера встановлено: {self.eeprom['temp_u']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення температури бойлера: {message}")
-
-    def handle_heat_mode_set(self, message):
-        if message == "heat":
-            self.eeprom['heat_otop'] = True
-            self.eeprom['summer'] = False
-            logging.info("Режим опалення встановлено: Heat")
-        elif message == "off":
-            self.eeprom['heat_otop'] = False
-            logging.info("Режим опалення встановлено: Off")
-        elif message == "heat_cool":
-            self.eeprom['summer'] = True
-            self.eeprom['heat_otop'] = False
-            logging.info("Режим опалення встановлено: Heat/Cool")
-        save_eeprom(self.eeprom)
-
-    def handle_gis_temperature(self, message):
-        try:
-            temp_gis = float(message)
-            self.eeprom['gis_boy'] = temp_gis
-            logging.info(f"Температура GIS встановлено: {self.eeprom['gis_boy']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення температури GIS: {message}")
-
-    def handle_heat_cycle_time(self, message):
-        try:
-            time_cikl = float(message)
-            self.eeprom['per_off'] = time_cikl
-            logging.info(f"Час циклу опалення встановлено: {self.eeprom['per_off']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення часу циклу: {message}")
-
-    def handle_heat_impulse_time(self, message):
-        try:
-            time_imp = float(message)
-            self.eeprom['per_on'] = time_imp
-            logging.info(f"Час імпульсу опалення встановлено: {self.eeprom['per_on']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення часу імпульсу: {message}")
-
-    def handle_heat_temp_off(self, message):
-        try:
-            temp_off = float(message)
-            self.eeprom['temp_off_otop'] = temp_off
-            logging.info(f"Температура вимкнення опалення встановлено: {self.eeprom['temp_off_otop']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення температури вимкнення опалення: {message}")
-
-    def handle_temp_min_out(self, message):
-        try:
-            temp_min_out = float(message)
-            self.eeprom['temp_min_out'] = temp_min_out
-            logging.info(f"Мінімальна температура на виході встановлено: {self.eeprom['temp_min_out']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення мінімальної температури на виході: {message}")
-
-    def handle_temp_max_out(self, message):
-        try:
-            temp_max_out = float(message)
-            self.eeprom['temp_max_out'] = temp_max_out
-            logging.info(f"Максимальна температура на виході встановлено: {self.eeprom['temp_max_out']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення максимальної температури на виході: {message}")
-
-    def handle_temp_max_heat(self, message):
-        try:
-            temp_max_heat = float(message)
-            self.eeprom['temp_max_heat'] = temp_max_heat
-            logging.info(f"Максимальна температура опалення встановлено: {self.eeprom['temp_max_heat']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення максимальної температури опалення: {message}")
-
-    def handle_kof_p(self, message):
-        try:
-            kof_p = float(message)
-            self.eeprom['kof_p'] = kof_p
-            logging.info(f"KOF_P встановлено: {self.eeprom['kof_p']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення KOF_P: {message}")
-
-    def handle_kof_i(self, message):
-        try:
-            kof_i = float(message)
-            self.eeprom['kof_i'] = kof_i
-            logging.info(f"KOF_I встановлено: {self.eeprom['kof_i']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення KOF_I: {message}")
-
-    def handle_kof_d(self, message):
-        try:
-            kof_d = float(message)
-            self.eeprom['kof_d'] = kof_d
-            logging.info(f"KOF_D встановлено: {self.eeprom['kof_d']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення KOF_D: {message}")
-
-    def handle_dead_zone(self, message):
-        try:
-            dead_zone = float(message)
-            self.eeprom['dead_zone'] = dead_zone
-            logging.info(f"Dead Zone встановлено: {self.eeprom['dead_zone']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення Dead Zone: {message}")
-
-    def handle_temp_out(self, message):
-        try:
-            temp_out = float(message)
-            self.eeprom['temp_out'] = temp_out
-            logging.info(f"Температура на виході встановлено: {self.eeprom['temp_out']}")
-            save_eeprom(self.eeprom)
-        except ValueError:
-            logging.error(f"Недійсне значення температури на виході: {message}")
-
-    def handle_valve_mode(self, message):
-        if message == "on":
-            self.eeprom['valve_mode'] = True
-            logging.info("Режим клапана встановлено: On")
-        elif message == "off":
-            self.eeprom['valve_mode'] = False
-            logging.info("Режим клапана встановлено: Off")
-        save_eeprom(self.eeprom)
-
-    def handle_hand_up(self, message):
-        if message == "on":
-            self.pid.HAND_UP = True
-            logging.info("Ручний підйом увімкнено.")
-        elif message == "off":
-            self.pid.HAND_UP = False
-            logging.info("Ручний підйом вимкнено.")
-        save_eeprom(self.eeprom)
-
-    def handle_hand_down(self, message):
-        if message == "on":
-            self.pid.HAND_DOWN = True
-            logging.info("Ручне опускання увімкнено.")
-        elif message == "off":
-            self.pid.HAND_DOWN = False
-            logging.info("Ручне опускання вимкнено.")
+    def on_change(self):
+        # Новий знімок параметрів для ПІД-циклу та відкладений запис у файл
+        self.pid.update_settings()
         save_eeprom(self.eeprom)
 
     def start(self):
-        try:
-            self.client.connect(self.MQTT_BROKER, self.MQTT_PORT, 60)
-        except Exception as e:
-            logging.error(f"Не вдалося підключитися до MQTT брокера: {e}")
-            return
-
-        # Запуск MQTT клієнта у фоновому режимі
-        self.client.loop_start()
+        # Запуск спільного MQTT клієнта у фоновому режимі
+        self.hub.start()
 
     def stop(self):
-        self.client.loop_stop()
-        self.client.disconnect()
-
-def read_temperature():
-    base_dir = '/sys/bus/w1/devices/'
-    device_folder = [f for f in os.listdir(base_dir) if f.startswith('28')][0]
-    device_file = f'{base_dir}{device_folder}/w1_slave'
-
-    try:
-        with open(device_file, 'r') as f:
-            lines = f.readlines()
-
-        # Перевіряємо, чи є "YES" у першому рядку, що свідчить про коректне зчитування
-        if lines[0].strip()[-3:] == 'YES':
-            # Зчитуємо температуру з другого рядка
-            equals_pos = lines[1].find('t=')
-            if equals_pos != -1:
-                temp_string = lines[1][equals_pos + 2:]
-                temperature = float(temp_string) / 1000.0
-                return temperature
-    except Exception as e:
-        logging.error(f"Помилка зчитування температури: {e}")
-    return None
-
-def moving_average_filter(new_value, smoothed_value):
-    return 0.9 * smoothed_value + 0.1 * new_value
-
-def get_current_temperature():
-    temperature = read_temperature()
-    if temperature is not None:
-        logging.info(f"Поточна температура: {temperature}°C")
-    else:
-        logging.warning("Не вдалося зчитати температуру.")
-    return temperature if temperature is not None else 0.0  # Повертаємо 0.0, якщо зчитування не вдалося
+        self.hub.stop()
 
 def main():
+    # Логування через чергу: запис на диск не блокує ПІД-цикл
+    setup_logging('pid.log')
+
     # Завантаження стану з EEPROM
     eeprom = load_eeprom()
 
-    # Ініціалізація ПІД-регулятора
-    pid_controller = PIDController(eeprom, get_current_temperature)
-    pid_controller.start()
-
-    # Ініціалізація MQTT клієнта
+    gpio = hal.get_gpio('rpi')
+    setup_gpio(gpio)
+
+    # Роздільна здатність датчиків з EEPROM (після вимкнення живлення датчики повертаються до 12 біт)
+    apply_resolutions(eeprom)
+
+    # Опитувач датчиків: ПІД-цикл читає лише його кеш; період кожного - за його роздільною здатністю
+    # Викиди (85 °C після увімкнення, -127 °C) відкидаються до ПІД-регулятора та телеметрії
+    # Історія температур - по стовпцю на кожен датчик, знайдений під час запуску
+    sensor_ids = w1.get_registry().sensor_ids()
+    sensor_store = None
+    sensor_history = None
+    if sensor_ids:
+        sensor_store = TimeSeriesStore(TSDB_SENSORS_DIR, sensor_ids, monotonic=True)
+        sensor_history = History(sensor_ids, sink=sensor_store.append)
+    sampler = TemperatureSampler(interval=1.0, history=sensor_history, pipeline=default_pipeline())
+
+    # Довготривала історія на SD-карті: посекундні записи пишуться великими блоками
+    # Мітки монотонні: у час епохи вони переводяться під час запису блоку, тож крок годинника
+    # після синхронізації NTP (у Pi немає RTC) не псує історію до кінця роботи процесу
+    store = TimeSeriesStore(TSDB_DIR, PID_FIELDS, monotonic=True)
+    history = History(PID_FIELDS, sink=store.append)
+
+    # Ініціалізація ПІД-регулятора з історією стану у пам'яті (фіксований обсяг)
+    pid_controller = PIDController(eeprom, sampler.latest, gpio, history=history)
+
+    # Ініціалізація MQTT клієнта (обробники реєструються у спільному підключенні)
     mqtt_client = MQTTClient(eeprom, pid_controller)
-    mqtt_client.start()
 
+    # Телеметрія з кешу опитувача (sampler.readings()) через спільне MQTT-підключення
+    publisher = TelemetryPublisher(mqtt_client.hub, batch_topic=TELEMETRY_TOPIC)
+
+    # Такт ПІД, опитування датчиків, телеметрія і MQTT - задачі одного циклу asyncio
+    runtime = AsyncRuntime(pid_controller, sampler, mqtt_client.hub, publisher, metrics_topic=METRICS_TOPIC)
+
+    metrics_server = None
     try:
-        while True:
-            time.sleep(1)  # Основний цикл може виконувати інші завдання
+        # Метрики для Prometheus лише на localhost; зайнятий порт не зупиняє регулятор
+        try:
+            metrics_server = start_http_server(METRICS_PORT)
+        except OSError as e:
+            logging.error(f"Не вдалося запустити HTTP-ендпойнт метрик на порту {METRICS_PORT}: {e}")
+
+        asyncio.run(runtime.run())
     except KeyboardInterrupt:
         logging.info("Вимикається...")
     finally:
-        pid_controller.stop()
-        mqtt_client.stop()
-        GPIO.cleanup()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        store.close()
+        if sensor_store is not None:
+            sensor_store.close()
+        eeprom.close()
+        gpio.cleanup()
+        stop_logging()
 
 if __name__ == "__main__":
     main()
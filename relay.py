@@ -1,57 +1,201 @@
-import RPi.GPIO as GPIO
-import time
-import multiprocessing
+import heapq
+import threading
+import logging
+from hal import OutputBank, MonotonicClock, get_gpio
+from metrics import get_registry
 
-# Налаштування GPIO
-GPIO.setmode(GPIO.BCM)  # Використовуємо нумерацію GPIO (BCM)
-GPIO.setwarnings(False)
 
 class Flasher:
+    __slots__ = ('pin', 'on_time', 'off_time', 'state', 'deadline', 'switches',
+                 'last_drift', 'max_drift', 'total_drift', 'active')
+
     def __init__(self, pin, on_time, off_time):
+        """
+        Реле, що по черзі вмикається на on_time і вимикається на off_time секунд.
+
+        Лише опис і стан - часом керує RelayScheduler, тож кожне реле
+        займає один невеликий об'єкт, а не окремий процес.
+
+        :param pin: Номер піна
+        :param on_time: Час увімкненого стану у секундах
+        :param off_time: Час вимкненого стану у секундах
+        """
         self.pin = pin
         self.on_time = on_time
         self.off_time = off_time
-        
-        # Налаштовуємо пін як вихідний
-        GPIO.setup(self.pin, GPIO.OUT)
-        GPIO.output(self.pin, GPIO.LOW)  # Спочатку вимикаємо реле
-
-    # Метод для запуску роботи реле
-    def flash(self):
-        while True:
-            GPIO.output(self.pin, GPIO.HIGH)  # Увімкнути реле
-            print(f"Реле на піні {self.pin} увімкнено на {self.on_time} секунд.")
-            time.sleep(self.on_time)  # Затримка увімкненого стану
-            
-            GPIO.output(self.pin, GPIO.LOW)   # Вимкнути реле
-            print(f"Реле на піні {self.pin} вимкнено на {self.off_time} секунд.")
-            time.sleep(self.off_time)  # Затримка вимкненого стану
+        self.state = False
+        self.deadline = None
+        self.active = True
+
+        # Дрейф: наскільки пізніше від запланованого моменту реле перемкнулось
+        self.switches = 0
+        self.last_drift = 0.0
+        self.max_drift = 0.0
+        self.total_drift = 0.0
+
+    def stats(self):
+        return {
+            'switches': self.switches,
+            'last_drift': self.last_drift,
+            'max_drift': self.max_drift,
+            'mean_drift': self.total_drift / self.switches if self.switches else 0.0,
+        }
+
+
+class RelayScheduler:
+    def __init__(self, gpio, clock=None):
+        """
+        Керування будь-якою кількістю реле з одного потоку.
+
+        Дедлайни перемикань усіх реле лежать у купі на монотонному годиннику:
+        потік спить до найближчого дедлайну, перемикає всі реле, чий час
+        настав, і записує їх в GPIO одним викликом. Наступний дедлайн
+        відраховується від запланованого, а не від фактичного моменту, тож
+        запізнення не накопичуються; дрейф кожного реле рахується окремо.
+
+        :param gpio: Бекенд з інтерфейсом RPi.GPIO
+        :param clock: Годинник з методом now() (hal.MonotonicClock або hal.VirtualClock)
+        """
+        self.gpio = gpio
+        self.outputs = OutputBank(gpio)
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.flashers = {}
+        self._heap = []     # (дедлайн, порядковий номер, Flasher)
+        self._seq = 0
+        # Повторний вхід: add() викликає remove() під тим самим блокуванням
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._drift = get_registry().histogram('relay_drift_seconds', "Запізнення перемикання реле від дедлайну")
+
+    def _push(self, flasher):
+        self._seq += 1
+        heapq.heappush(self._heap, (flasher.deadline, self._seq, flasher))
+
+    def add(self, pin, on_time, off_time):
+        """
+        Додавання реле; перше увімкнення - одразу.
+
+        :return: Flasher
+        :raises ValueError: on_time або off_time не додатні (нульовий період зациклив би run_pending)
+        """
+        if not (on_time > 0 and off_time > 0):
+            raise ValueError(f"Реле на піні {pin}: on_time і off_time мають бути додатними ({on_time}, {off_time})")
+        flasher = Flasher(pin, on_time, off_time)
+        with self._lock:
+            self.remove(pin)
+            self.outputs.setup(pin, self.gpio.LOW)
+            flasher.deadline = self.clock.now()
+            self.flashers[pin] = flasher
+            self._push(flasher)
+        get_registry().gauge('relay_max_drift_seconds', "Найбільше запізнення перемикання реле",
+                             labels={'pin': pin}, fn=lambda: flasher.max_drift)
+        self._wakeup.set()
+        return flasher
+
+    def remove(self, pin):
+        """
+        Вимкнення і видалення реле. Запис у купі лишається і відкидається, коли настане.
+        """
+        with self._lock:
+            flasher = self.flashers.pop(pin, None)
+            if flasher is not None:
+                flasher.active = False
+                self.outputs.write(pin, self.gpio.LOW)
+                # Показник тримає Flasher у замиканні - прибираємо разом з реле
+                get_registry().unregister('relay_max_drift_seconds', labels={'pin': pin})
+
+    def run_pending(self):
+        """
+        Перемикання всіх реле, чий дедлайн настав.
+
+        :return: Час у секундах до наступного дедлайну або None, якщо реле немає
+        """
+        with self._lock:
+            now = self.clock.now()
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                deadline, _, flasher = heapq.heappop(heap)
+                if not flasher.active:
+                    continue
+                drift = now - deadline
+                flasher.state = not flasher.state
+                self.outputs.set(flasher.pin, self.gpio.HIGH if flasher.state else self.gpio.LOW)
+                flasher.switches += 1
+                flasher.last_drift = drift
+                flasher.total_drift += drift
+                if drift > flasher.max_drift:
+                    flasher.max_drift = drift
+                self._drift.observe(drift)
+
+                period = flasher.on_time if flasher.state else flasher.off_time
+                flasher.deadline = deadline + period
+                if flasher.deadline <= now:
+                    # Відставання більше за період - не наздоганяємо пропущені перемикання
+                    flasher.deadline = now + period
+                self._push(flasher)
+                logging.debug(f"Реле на піні {flasher.pin} {'увімкнено' if flasher.state else 'вимкнено'}, "
+                              f"запізнення {drift * 1000:.1f} мс.")
+            # Усі перемикання цього моменту - одним записом у GPIO
+            self.outputs.commit()
+            if not heap:
+                return None
+            return max(0.0, heap[0][0] - self.clock.now())
+
+    def run(self):
+        """
+        Цикл керування реле у поточному потоці до виклику stop().
+        """
+        self._running = True
+        while self._running:
+            delay = self.run_pending()
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='relays', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Зупинка потоку і вимкнення всіх реле.
+        """
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for pin in list(self.flashers):
+            self.remove(pin)
+
+    def stats(self):
+        """
+        :return: Словник пін -> статистика перемикань і дрейфу
+        """
+        with self._lock:
+            return {pin: flasher.stats() for pin, flasher in self.flashers.items()}
 
 
 if __name__ == "__main__":
-    # Створюємо об'єкти Flasher для кожного реле
-    relay1 = Flasher(pin=17, on_time=1, off_time=1)  # Реле на GPIO 17
-    relay2 = Flasher(pin=27, on_time=1, off_time=2)  # Реле на GPIO 27
-    relay3 = Flasher(pin=22, on_time=1, off_time=3)  # Реле на GPIO 22
-
-    # Створюємо процеси для кожного реле
-    processes = [
-        multiprocessing.Process(target=relay1.flash),
-        multiprocessing.Process(target=relay2.flash),
-        multiprocessing.Process(target=relay3.flash)
-    ]
-    
-    # Запускаємо процеси
-    for process in processes:
-        process.start()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    GPIO = get_gpio('rpi')
+    GPIO.setmode(GPIO.BCM)  # Використовуємо нумерацію GPIO (BCM)
+    GPIO.setwarnings(False)
+
+    # Усі реле - в одному потоці з однією купою дедлайнів
+    scheduler = RelayScheduler(GPIO)
+    scheduler.add(pin=17, on_time=1, off_time=1)  # Реле на GPIO 17
+    scheduler.add(pin=27, on_time=1, off_time=2)  # Реле на GPIO 27
+    scheduler.add(pin=22, on_time=1, off_time=3)  # Реле на GPIO 22
 
     try:
-        # Очікуємо завершення процесів
-        for process in processes:
-            process.join()
+        scheduler.run()
     except KeyboardInterrupt:
-        # Очищуємо GPIO у випадку завершення програми
         print("Завершення програми...")
-        for process in processes:
-            process.terminate()
+    finally:
+        for pin, stats in scheduler.stats().items():
+            logging.info(f"Реле на піні {pin}: перемикань {stats['switches']}, "
+                         f"дрейф середній {stats['mean_drift'] * 1000:.2f} мс, макс. {stats['max_drift'] * 1000:.2f} мс")
+        scheduler.stop()
         GPIO.cleanup()  # Очищення GPIO після завершення
@@ -1,72 +1,227 @@
 #!/usr/bin/python
-import RPi.GPIO as GPIO
-import time
+import sys
 import logging
+from collections import namedtuple, deque
+from hal import OutputBank, FakeGPIO, MonotonicClock, VirtualClock, get_gpio
+from logger import setup_logging, stop_logging
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("relay_control.log"),
-        logging.StreamHandler()
-    ]
-)
-
-# Настройка режима нумерации GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
 # Инициализируем список пинов
 pinList = [13, 19, 26, 17, 27, 22]
 
 # Время ожидания между операциями в основном цикле (в секундах)
 SleepTimeL = 1
 
-def initialize_pins(pins):
-    """Настраивает GPIO-пины как выходы с начальным состоянием HIGH."""
+# Сколько последних событий хранить для отчёта (при бесконечном повторе)
+REPORT_SIZE = 1000
+
+# Шаг последовательности: пин, состояние (GPIO.HIGH/LOW) и смещение от начала цикла в секундах
+Step = namedtuple('Step', 'pin state offset')
+
+
+def parallel(pins, state, offset):
+    """Шаги, которые выполняются одновременно: все пины переключаются одной записью в GPIO."""
+    return [Step(pin, state, offset) for pin in pins]
+
+
+class Sequence:
+    def __init__(self, steps, period=None, loops=1):
+        """
+        Скомпилированная последовательность переключений реле.
+
+        Шаги сортируются по времени один раз; шаги с одинаковым смещением
+        объединяются в одно событие. Воспроизведение - только проход по
+        готовому списку, без сна внутри шагов.
+
+        :param steps: Список Step
+        :param period: Длительность одного цикла; None - смещение последнего шага
+        :param loops: Количество повторов цикла; None - бесконечно
+        """
+        events = {}
+        for step in steps:
+            if step.offset < 0:
+                raise ValueError(f"Отрицательное смещение шага: {step}")
+            # Более поздний шаг для того же пина в тот же момент заменяет предыдущий
+            events.setdefault(step.offset, {})[step.pin] = step.state
+        self.offsets = sorted(events)
+        self.events = [tuple(events[offset].items()) for offset in self.offsets]
+        self.pins = sorted({step.pin for step in steps})
+        self.period = period if period is not None else (self.offsets[-1] if self.offsets else 0.0)
+        if loops != 1 and self.period <= 0:
+            raise ValueError("Для повторов нужен положительный период цикла")
+        if self.offsets and self.offsets[-1] > self.period:
+            raise ValueError(f"Шаг со смещением {self.offsets[-1]} выходит за период {self.period}")
+        self.loops = loops
+
+    def __len__(self):
+        return len(self.events)
+
+    def duration(self):
+        """
+        :return: Общая длительность в секундах или None для бесконечного повтора
+        """
+        if self.loops is None:
+            return None
+        return self.period * (self.loops - 1) + (self.offsets[-1] if self.offsets else 0.0)
+
+
+class SequenceRunner:
+    def __init__(self, outputs, sequence, clock=None):
+        """
+        Неблокирующее воспроизведение последовательности.
+
+        poll() выполняет все события, время которых наступило, и сразу
+        возвращает время до следующего; ждать можно где угодно (time.sleep,
+        asyncio, общий цикл). Запланированное время считается от начала
+        воспроизведения, поэтому задержки не накапливаются.
+
+        :param outputs: hal.OutputBank с уже настроенными пинами
+        :param sequence: Sequence
+        :param clock: Часы с методами now() и sleep() (hal.MonotonicClock или hal.VirtualClock)
+        """
+        self.outputs = outputs
+        self.sequence = sequence
+        self.clock = clock if clock is not None else MonotonicClock()
+        self.start_time = None
+        self.loop = 0
+        self.index = 0
+        self.log = deque(maxlen=REPORT_SIZE)    # (запланированное время, фактическое время, переключения)
+
+    def start(self):
+        self.start_time = self.clock.now()
+        self.loop = 0
+        self.index = 0
+        self.log.clear()
+
+    @property
+    def finished(self):
+        seq = self.sequence
+        return not seq.events or (seq.loops is not None and self.loop >= seq.loops)
+
+    def _planned(self):
+        return self.start_time + self.loop * self.sequence.period + self.sequence.offsets[self.index]
+
+    def poll(self):
+        """
+        Выполнение наступивших событий.
+
+        :return: Секунды до следующего события или None, если последовательность закончилась
+        """
+        if self.start_time is None:
+            self.start()
+        seq = self.sequence
+        now = self.clock.now()
+        while not self.finished:
+            planned = self._planned()
+            if planned > now:
+                return planned - now
+            behind = int((now - planned) // seq.period) if seq.period > 0 else 0
+            if behind:
+                # Отставание больше цикла (например, после паузы) - пропущенные циклы не наверстываем
+                self.loop += behind
+                continue
+            for pin, state in seq.events[self.index]:
+                self.outputs.set(pin, state)
+            # Все шаги одного момента - одной записью в GPIO
+            self.outputs.commit()
+            self.log.append((planned - self.start_time, now - self.start_time, seq.events[self.index]))
+            logging.debug(f"Цикл {self.loop + 1}, событие {self.index + 1}: {seq.events[self.index]}")
+            self.index += 1
+            if self.index == len(seq.events):
+                self.index = 0
+                self.loop += 1
+        return None
+
+    def run(self):
+        """
+        Воспроизведение до конца последовательности в текущем потоке.
+        """
+        while True:
+            delay = self.poll()
+            if delay is None:
+                return
+            self.clock.sleep(delay)
+
+    def report(self):
+        """
+        :return: Текст с таблицей событий: запланированное и фактическое время, переключения
+        """
+        lines = [f"{'план, с':>10} {'факт, с':>10} {'дрейф, мс':>10}  переключения"]
+        for planned, actual, changes in self.log:
+            states = ', '.join(f"{pin}={state}" for pin, state in changes)
+            lines.append(f"{planned:10.3f} {actual:10.3f} {(actual - planned) * 1000:10.2f}  {states}")
+        stats = self.outputs.stats()
+        lines.append(f"Событий: {len(self.log)}, записей в GPIO: {stats['commits']}, "
+                     f"переключений по пинам: {stats['toggles']}")
+        return '\n'.join(lines)
+
+
+def initialize_pins(outputs, pins, state):
+    """Настраивает GPIO-пины как выходы с начальным состоянием (один раз перед воспроизведением)."""
     for pin in pins:
-        GPIO.setup(pin, GPIO.OUT, initial=GPIO.HIGH)
-        logging.info(f"Пин {pin} настроен как выход с состоянием HIGH")
-        time.sleep(0.05)  # Короткая задержка для стабильности
-
-def activate_relay(pin, index):
-    """Активирует реле на указанном пине и логирует действие."""
-    GPIO.output(pin, GPIO.LOW)  # Включаем реле (если активный LOW)
-    logging.info(f"{index}: Реле на пине {pin} активировано (LOW)")
-    time.sleep(SleepTimeL)
-    
-def deactivate_relay(pin, index):
-    """Активирует реле на указанном пине и логирует действие."""
-    GPIO.output(pin, GPIO.HIGH)  # Включаем реле (если активный LOW)
-    logging.info(f"{index}: Реле на пине {pin} deактивировано ()")
-    time.sleep(SleepTimeL)
+        outputs.setup(pin, initial=state)
+    logging.info(f"Пины {pins} настроены как выходы с состоянием {state}")
+
+
+def build_sequence(gpio, pins=pinList, step_time=SleepTimeL, loops=None):
+    """
+    Последовательность прежнего main(): реле включаются по одному (LOW),
+    затем по одному выключаются (HIGH), с шагом step_time.
+    """
+    steps = [Step(pin, gpio.LOW, i * step_time) for i, pin in enumerate(pins)]
+    steps += [Step(pin, gpio.HIGH, (len(pins) + i) * step_time) for i, pin in enumerate(pins)]
+    return Sequence(steps, period=2 * len(pins) * step_time, loops=loops)
+
+
+def dry_run(build=build_sequence, loops=1):
+    """
+    Проверка последовательности на FakeGPIO с виртуальным временем - без оборудования и без ожидания.
+
+    :param build: Функция build(gpio, loops=...) -> Sequence
+    :return: Текст отчёта SequenceRunner.report()
+    """
+    gpio = FakeGPIO()
+    gpio.setmode(gpio.BCM)
+    outputs = OutputBank(gpio)
+    sequence = build(gpio, loops=loops)
+    initialize_pins(outputs, sequence.pins, gpio.HIGH)
+    runner = SequenceRunner(outputs, sequence, VirtualClock())
+    runner.run()
+    return f"Длительность: {sequence.duration()} с\n" + runner.report()
+
 
 def main():
     """Основная функция для управления реле."""
-    try:
-        while True:
+    setup_logging("relay_control.log")
+    if '--dry-run' in sys.argv[1:]:
+        # Одним сообщением: ограничитель частоты логов отбрасывает серии одинаковых записей
+        logging.info("Пробный прогон:\n" + dry_run())
+        stop_logging()
+        return
 
-            initialize_pins(pinList)
-            logging.info("Все пины инициализированы. Начинаем последовательную активацию реле.")
-
-            for index, pin in enumerate(pinList, start=1):
-                activate_relay(pin, index)
+    GPIO = get_gpio('rpi')
+    # Настройка режима нумерации GPIO
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setwarnings(False)
+    # Реле управляются через теневой регистр: запись только при изменении состояния, со счётчиком переключений
+    outputs = OutputBank(GPIO)
+    try:
+        sequence = build_sequence(GPIO)
+        # Пины настраиваются один раз, а не в каждом цикле
+        initialize_pins(outputs, sequence.pins, GPIO.HIGH)
+        logging.info("Все пины инициализированы. Начинаем последовательную активацию реле.")
+        SequenceRunner(outputs, sequence).run()
 
-            logging.info("Все реле активированы. Завершаем программу.")
-        
-            for index, pin in enumerate(pinList, start=1):
-                deactivate_relay(pin, index)
-        
-    
     except KeyboardInterrupt:
         logging.warning("Программа прервана пользователем (KeyboardInterrupt).")
-    
+
     except Exception as e:
         logging.error(f"Возникла ошибка: {e}")
-    
+
     finally:
+        logging.info(f"Количество переключений реле: {outputs.stats()['toggles']}")
         GPIO.cleanup()
         logging.info("GPIO очищены. Программа завершена.")
+        stop_logging()
 
 if __name__ == "__main__":
     main()
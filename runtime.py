@@ -0,0 +1,115 @@
+import asyncio
+import signal
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from metrics import get_registry
+
+
+class AsyncRuntime:
+    def __init__(self, controller, sampler, hub=None, publisher=None, telemetry_interval=1.0,
+                 metrics_topic=None, metrics_interval=60.0):
+        """
+        Один цикл asyncio для всього процесу замість окремих потоків.
+
+        Такт ПІД-регулятора, опитування датчиків, публікація телеметрії та
+        обробка MQTT-команд - задачі одного циклу подій. Блокуюче читання
+        sysfs 1-Wire виконується в одному потоці-виконавці, тож цикл ніколи
+        не чекає на конвертацію датчиків. Опитувач отримує цей виконавець і
+        читає датчики по черзі в ньому, тож пул потоків w1 не створюється.
+
+        :param controller: pid.PIDController (використовуються loop_pid() та scheduler) або None
+        :param sampler: sampler.TemperatureSampler (потік не запускається, лише sample_once())
+        :param hub: mqtt_hub.MQTTHub або None - без MQTT
+        :param publisher: ds18b20.TelemetryPublisher або None - без телеметрії
+        :param telemetry_interval: Інтервал перевірки телеметрії у секундах
+        :param metrics_topic: Тема MQTT для періодичної публікації метрик або None
+        :param metrics_interval: Інтервал публікації метрик у секундах
+        """
+        self.controller = controller
+        self.sampler = sampler
+        self.hub = hub
+        self.publisher = publisher
+        self.telemetry_interval = telemetry_interval
+        self.metrics_topic = metrics_topic
+        self.metrics_interval = metrics_interval
+        # Один потік на шину 1-Wire: опитувач читає всі датчики в ньому по черзі,
+        # без пулу w1, тож на шину припадає рівно один додатковий потік
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='w1')
+        sampler.executor = self.executor
+        self._stopped = None
+
+    async def pid_task(self):
+        controller = self.controller
+        scheduler = controller.scheduler
+        while True:
+            delay = scheduler.delay()
+            # Навіть без очікування віддаємо керування іншим задачам
+            await asyncio.sleep(max(0.0, delay))
+            controller.TICK_LATENESS = scheduler.tick()
+            controller.loop_pid()
+
+    async def sampler_task(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # sample_once повертає час до наступного датчика за розкладом
+                delay = await loop.run_in_executor(self.executor, self.sampler.sample_once)
+            except Exception as e:
+                logging.error(f"Помилка опитування датчиків: {e}")
+                delay = self.sampler.interval
+            await asyncio.sleep(delay)
+
+    async def telemetry_task(self):
+        while True:
+            readings = self.sampler.readings()
+            if readings:
+                try:
+                    self.publisher.publish(readings)
+                except Exception as e:
+                    logging.error(f"Не вдалося опублікувати у MQTT брокер: {e}")
+            await asyncio.sleep(self.telemetry_interval)
+
+    async def metrics_task(self):
+        registry = get_registry()
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            registry.publish(self.hub, self.metrics_topic)
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def run(self):
+        """
+        Запуск усіх задач до stop(), SIGTERM/SIGINT або помилки в одній із задач.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        coroutines = [self.sampler_task()]
+        if self.controller is not None:
+            coroutines.append(self.pid_task())
+        if self.hub is not None:
+            coroutines.append(self.hub.run_async())
+        if self.publisher is not None:
+            coroutines.append(self.telemetry_task())
+        if self.hub is not None and self.metrics_topic is not None:
+            coroutines.append(self.metrics_task())
+        tasks = [asyncio.create_task(c) for c in coroutines]
+        stopped = asyncio.create_task(self._stopped.wait())
+        try:
+            done, _ = await asyncio.wait(tasks + [stopped], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not stopped and not task.cancelled() and task.exception() is not None:
+                    logging.error(f"Задача завершилась з помилкою: {task.exception()}")
+        finally:
+            for task in tasks + [stopped]:
+                task.cancel()
+            await asyncio.gather(*tasks, stopped, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+            logging.info("Вимикається...")
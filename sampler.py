@@ -0,0 +1,230 @@
+import threading
+import time
+import logging
+import w1
+
+# Як часто перечитувати роздільну здатність датчиків для розкладу опитування
+SCHEDULE_REFRESH = 60.0
+
+
+class TemperatureSampler(threading.Thread):
+    def __init__(self, sensor_ids=None, interval=1.0, base_dir='/sys/bus/w1/devices/', history=None,
+                 pipeline=None, executor=None):
+        """
+        Фоновий опитувач датчиків DS18B20.
+
+        Єдиний власник шини 1-Wire: зчитує всі датчики у власному потоці і
+        зберігає останнє значення кожного з міткою часу. Споживачі (ПІД-цикл,
+        телеметрія) читають кеш за O(1) і ніколи не чекають на конвертацію.
+
+        Період опитування кожного датчика пропорційний його часу конвертації:
+        interval відповідає 12 бітам, 10-бітний датчик опитується вчетверо
+        частіше. Якщо періоди всіх датчиків однакові, вони читаються разом
+        за одну групову конвертацію; інакше кожен читається окремо, коли
+        настав його час: у виконавці executor або, якщо його немає,
+        паралельно у пулі потоків w1.
+
+        У виконавці, коли настав час повільного датчика, запускається групова
+        конвертація без очікування (therm_bulk_read). Поки повільні датчики
+        конвертують, швидкі читаються між ними окремими конвертаціями, а
+        результат повільного забирається, щойно готовий, - тож швидкий
+        датчик не чекає на 750 мс 12-бітної конвертації.
+
+        :param sensor_ids: Список ID датчиків; None - всі датчики 28-* на шині
+        :param interval: Період опитування 12-бітного датчика у секундах
+        :param base_dir: Каталог пристроїв 1-Wire
+        :param history: history.History з полями - ID датчиків, або None
+        :param pipeline: filters.FilterPipeline; у кеш (а отже в ПІД-цикл і телеметрію)
+                         потрапляють відфільтровані значення. None - сирі значення
+        :param executor: Виконавець, у якому викликається sample_once() (потік шини
+                         runtime.AsyncRuntime). Якщо задано, всі зчитування йдуть по черзі
+                         в ньому, без пулу потоків w1. None - пул w1 для паралельних зчитувань
+        """
+        super().__init__(daemon=True)
+        self.base_dir = base_dir
+        self.interval = interval
+        self.registry = w1.get_registry(base_dir)
+        self.history = history
+        self.pipeline = pipeline
+        self.executor = executor
+        # None - список береться з реєстру на кожному циклі, тож нові датчики підхоплюються автоматично
+        self._fixed_ids = list(sensor_ids) if sensor_ids is not None else None
+        # Список останнього проходу: latest() і readings() не звертаються до реєстру (і до sysfs)
+        self._current_ids = self._fixed_ids or []
+        self._primary_id = self._current_ids[0] if self._current_ids else None
+
+        # Кеш: sensor_id -> (температура, time.monotonic() моменту зчитування).
+        # Кортеж замінюється цілком, тому читачам не потрібне блокування.
+        self._cache = {}
+        self._stop_event = threading.Event()
+
+        # Розклад: sensor_id -> період і час наступного зчитування (time.monotonic())
+        self._periods = {}
+        self._conversions = {}
+        self._next_due = {}
+        # Групова конвертація: sensor_id -> time.monotonic(), коли її результат готовий.
+        # Поки тут є датчики, нова групова конвертація не запускається - вона перезапустила б їхню
+        self._bulk_ready = {}
+        self._pending = set()
+        self._schedule_ids = None
+        self._schedule_refresh = None
+
+    @property
+    def sensor_ids(self):
+        if self._fixed_ids is not None:
+            return self._fixed_ids
+        return self.registry.sensor_ids()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._stop_event.wait(self.sample_once())
+
+    def stop(self):
+        self._stop_event.set()
+
+    def period(self, sensor_id):
+        """
+        :return: Період опитування датчика у секундах
+        """
+        return self._periods.get(sensor_id, self.interval)
+
+    def _refresh_schedule(self, sensor_ids, now):
+        if sensor_ids == self._schedule_ids and now < self._schedule_refresh:
+            return
+        periods = {}
+        conversions = {}
+        for sensor_id in sensor_ids:
+            bits = w1.read_resolution(sensor_id, self.base_dir) or 12
+            conversion = conversions[sensor_id] = w1.conversion_time(bits)
+            periods[sensor_id] = max(conversion, self.interval * conversion / w1.CONVERSION_TIME)
+        if periods != self._periods:
+            logging.info("Розклад опитування: " + ", ".join(f"{k} - {v:.3g} с" for k, v in periods.items()))
+        self._periods = periods
+        self._conversions = conversions
+        self._schedule_ids = list(sensor_ids)
+        self._schedule_refresh = now + SCHEDULE_REFRESH
+
+    def sample_once(self):
+        """
+        Один прохід розкладу: зчитування датчиків, для яких настав час.
+
+        :return: Час у секундах до наступного зчитування
+        """
+        now = time.monotonic()
+        sensor_ids = self.sensor_ids
+        self._current_ids = sensor_ids
+        self._primary_id = sensor_ids[0] if sensor_ids else None
+        self._refresh_schedule(sensor_ids, now)
+        uniform = len(set(self._periods.values())) <= 1
+        if not uniform and self.executor is not None:
+            self._start_bulk(sensor_ids, now)
+        due = [sensor_id for sensor_id in sensor_ids
+               if self._due_at(sensor_id, now) <= now and sensor_id not in self._pending]
+        for sensor_id in due:
+            # Період відраховується від запланованого моменту, а не від кінця зчитування
+            self._next_due[sensor_id] = max(self._next_due.get(sensor_id, now) + self.period(sensor_id), now)
+
+        if due and uniform:
+            # Однакові періоди - всі датчики за одну групову конвертацію
+            temperatures = w1.read_temperatures(due, self.base_dir, parallel=self.executor is None)
+            timestamp = time.monotonic()
+            filtered = self._filter(temperatures)
+            for sensor_id, temperature in temperatures.items():
+                self._store(sensor_id, temperature, filtered[sensor_id], timestamp)
+            self._record(timestamp)
+        elif self.executor is not None:
+            # Різні періоди, але один потік шини: датчики, чий час настав, читаються по черзі тут же,
+            # тож кеш і конвеєр фільтрів оновлюються лише з цього потоку. Результат групової
+            # конвертації читається без очікування; решта - окремою конвертацією, швидкі першими
+            for sensor_id in sorted(due, key=self.period):
+                self._bulk_ready.pop(sensor_id, None)
+                temperature = w1.read_sensor(sensor_id, self.base_dir)
+                timestamp = time.monotonic()
+                filtered = self._filter({sensor_id: temperature})
+                self._store(sensor_id, temperature, filtered[sensor_id], timestamp)
+                self._record(timestamp)
+        else:
+            # Без виконавця runtime (окремий потік опитувача) - паралельно у пулі w1
+            for sensor_id in due:
+                self._pending.add(sensor_id)
+                w1.submit_read(sensor_id, self.base_dir).add_done_callback(
+                    lambda future, sensor_id=sensor_id: self._on_read(sensor_id, future))
+
+        if not sensor_ids:
+            return self.interval
+        next_due = min(self._due_at(sensor_id, now) for sensor_id in sensor_ids)
+        return max(0.0, next_due - time.monotonic())
+
+    def _due_at(self, sensor_id, now):
+        # Датчик з незавершеною груповою конвертацією читається не раніше, ніж вона закінчиться
+        due = self._next_due.get(sensor_id, now)
+        ready = self._bulk_ready.get(sensor_id)
+        return due if ready is None else max(due, ready)
+
+    def _start_bulk(self, sensor_ids, now):
+        # Групова конвертація лише тоді, коли настав час повільнішого за найшвидший датчика:
+        # швидкі між повільними конвертаціями читаються окремо
+        for sensor_id in self._bulk_ready.keys() - set(sensor_ids):
+            del self._bulk_ready[sensor_id]
+        if self._bulk_ready or not self._conversions:
+            return
+        fastest = min(self._conversions.values())
+        if any(self._next_due.get(sensor_id, now) <= now and self._conversions.get(sensor_id, fastest) > fastest
+               for sensor_id in sensor_ids):
+            if w1.start_bulk_conversion(self.base_dir):
+                self._bulk_ready = {sensor_id: now + self._conversions.get(sensor_id, w1.CONVERSION_TIME)
+                                    for sensor_id in sensor_ids}
+
+    def _on_read(self, sensor_id, future):
+        self._pending.discard(sensor_id)
+        try:
+            temperature = future.result()
+        except Exception as e:
+            logging.error(f"Помилка зчитування датчика {sensor_id}: {e}")
+            temperature = None
+        timestamp = time.monotonic()
+        filtered = self._filter({sensor_id: temperature})
+        self._store(sensor_id, temperature, filtered[sensor_id], timestamp)
+        self._record(timestamp)
+
+    def _filter(self, temperatures):
+        if self.pipeline is None:
+            return temperatures
+        return self.pipeline.filter(temperatures)
+
+    def _store(self, sensor_id, raw, temperature, timestamp):
+        if temperature is not None:
+            self._cache[sensor_id] = (temperature, timestamp)
+            logging.debug(f"Датчик {sensor_id}: {raw}°C (після фільтра {temperature}°C)")
+        elif raw is None:
+            logging.warning(f"Не вдалося зчитати температуру датчика {sensor_id}.")
+
+    def _record(self, timestamp):
+        if self.history is not None:
+            cache = self._cache
+            self.history.record(timestamp, [cache[sensor_id][0] if sensor_id in cache else None
+                                            for sensor_id in self.history.fields])
+
+    def latest(self, sensor_id=None):
+        """
+        Останнє зчитане значення температури та його вік.
+
+        :param sensor_id: ID датчика; None - перший датчик зі списку останнього проходу опитувача
+        :return: Кортеж (температура, вік у секундах) або (None, None), якщо значень ще немає
+        """
+        if sensor_id is None:
+            sensor_id = self._primary_id
+        entry = self._cache.get(sensor_id)
+        if entry is None:
+            return None, None
+        temperature, timestamp = entry
+        return temperature, time.monotonic() - timestamp
+
+    def readings(self):
+        """
+        Останні значення всіх датчиків зі списку (для телеметрії).
+
+        :return: Словник sensor_id -> температура; датчики без значень пропускаються
+        """
+        cache = self._cache
+        return {sensor_id: cache[sensor_id][0] for sensor_id in self._current_ids if sensor_id in cache}
@@ -0,0 +1,88 @@
+import time
+
+
+class TickScheduler:
+    def __init__(self, period, max_catchup=5, clock=time.monotonic, sleep=time.sleep):
+        """
+        Планувальник періодичних тактів за дедлайнами на монотонному годиннику.
+
+        Дедлайни йдуть строго через period від першого такту, тому затримки
+        не накопичуються. Після перевантаження пропущені такти виконуються
+        одразу один за одним (не більше max_catchup); якщо відставання більше,
+        планувальник перескакує на найближчий дедлайн сітки.
+
+        :param period: Період такту у секундах
+        :param max_catchup: Максимальна кількість тактів, що наздоганяються підряд
+        :param clock: Монотонний годинник (функція без аргументів)
+        :param sleep: Функція очікування
+        """
+        self.period = period
+        self.max_catchup = max_catchup
+        self.clock = clock
+        self.sleep = sleep
+        self.next_deadline = None
+
+        # Статистика запізнень
+        self.ticks = 0
+        self.skipped = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+
+    def wait(self):
+        """
+        Очікування наступного такту.
+
+        :return: Запізнення такту відносно його дедлайну у секундах
+        """
+        delay = self.delay()
+        if delay > 0:
+            self.sleep(delay)
+        return self.tick()
+
+    def delay(self):
+        """
+        Час до дедлайну наступного такту (для зовнішнього очікування, наприклад asyncio.sleep).
+
+        :return: Секунди до дедлайну; 0 або менше - такт уже настав
+        """
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        return self.next_deadline - now
+
+    def tick(self):
+        """
+        Облік такту, що настав, та перехід до наступного дедлайну.
+
+        :return: Запізнення такту відносно його дедлайну у секундах
+        """
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        lateness = max(0.0, now - self.next_deadline)
+        self.ticks += 1
+        self.last_lateness = lateness
+        self.total_lateness += lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+        self.next_deadline += self.period
+        behind = int((now - self.next_deadline) // self.period)
+        if behind > self.max_catchup:
+            # Відставання завелике - пропускаємо такти, зберігаючи фазу сітки
+            self.skipped += behind
+            self.next_deadline += behind * self.period
+        return lateness
+
+    def stats(self):
+        """
+        :return: Словник зі статистикою тактів та запізнень
+        """
+        return {
+            'ticks': self.ticks,
+            'skipped': self.skipped,
+            'last_lateness': self.last_lateness,
+            'max_lateness': self.max_lateness,
+            'mean_lateness': self.total_lateness / self.ticks if self.ticks else 0.0,
+        }
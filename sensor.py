@@ -1,46 +1,95 @@
 import os
+import w1
+
+# Ключ у конфігурації: словник sensor_id -> роздільна здатність у бітах
+RESOLUTION_KEY = 'w1_resolution'
+
 
 class TemperatureSensor:
-    def __init__(self, sensor_id):
-        self.base_dir = '/sys/bus/w1/devices/'
+    def __init__(self, sensor_id, base_dir='/sys/bus/w1/devices/', config=None):
+        """
+        :param sensor_id: ID датчика або його префікс
+        :param base_dir: Каталог пристроїв 1-Wire
+        :param config: Словник налаштувань (наприклад, settings.SettingsStore), де
+                       зберігається роздільна здатність; збережене значення застосовується одразу
+        """
+        self.base_dir = base_dir
         self.sensor_id = sensor_id
-        self.device_file = self._get_device_file()
-
-    def _get_device_file(self):
-        try:
-            device_folder = [f for f in os.listdir(self.base_dir) if f.startswith(self.sensor_id)][0]
-            return f'{self.base_dir}{device_folder}/w1_slave'
-        except IndexError:
+        self.registry = w1.get_registry(base_dir)
+        self.config = config
+        if self.device_file is None:
             print(f"Sensor {self.sensor_id} not found.")
-            return None
+        elif config is not None:
+            # Роздільна здатність живе у scratchpad і скидається до 12 біт після вимкнення живлення
+            bits = config.get(RESOLUTION_KEY, {}).get(sensor_id)
+            if bits is not None and bits != self.resolution:
+                w1.write_resolution(sensor_id, bits, base_dir)
+
+    @property
+    def resolution(self):
+        """
+        Роздільна здатність у бітах (12, якщо ядро не надає атрибут resolution).
+        """
+        bits = w1.read_resolution(self.sensor_id, self.base_dir)
+        return bits if bits is not None else 12
+
+    @property
+    def conversion_time(self):
+        return w1.conversion_time(self.resolution)
+
+    def set_resolution(self, bits):
+        """
+        Встановлення роздільної здатності 9-12 біт зі збереженням у конфігурації.
+
+        :return: True, якщо значення застосовано до датчика
+        :raises ValueError: Недопустима роздільна здатність
+        """
+        applied = w1.write_resolution(self.sensor_id, bits, self.base_dir)
+        if self.config is not None:
+            # Новий словник, щоб сховище помітило зміну і записало файл
+            resolutions = dict(self.config.get(RESOLUTION_KEY, {}))
+            resolutions[self.sensor_id] = bits
+            self.config[RESOLUTION_KEY] = resolutions
+        return applied
+
+    @property
+    def device_file(self):
+        # Шлях береться з реєстру при кожному зверненні, тому перепідключений датчик підхоплюється сам
+        device_dir = self.registry.device_dir(self.sensor_id)
+        return os.path.join(device_dir, 'w1_slave') if device_dir is not None else None
 
     def read_temperature(self):
         if self.device_file is None:
             return None
+        # Спільний зчитувач w1: постійний дескриптор, повтор при помилці CRC
+        return w1.read_sensor(self.sensor_id, self.base_dir)
+
+
+def apply_resolutions(config, base_dir='/sys/bus/w1/devices/'):
+    """
+    Застосування збережених у конфігурації роздільних здатностей до всіх датчиків.
+
+    :return: Список TemperatureSensor для датчиків із конфігурації
+    """
+    return [TemperatureSensor(sensor_id, base_dir, config) for sensor_id in config.get(RESOLUTION_KEY, {})]
+
 
-        try:
-            with open(self.device_file, 'r') as f:
-                lines = f.readlines()
-
-            # Перевірка на коректність зчитування (YES)
-            if lines[0].strip()[-3:] == 'YES':
-                # Зчитуємо температуру
-                equals_pos = lines[1].find('t=')
-                if equals_pos != -1:
-                    temp_string = lines[1][equals_pos + 2:]
-                    temperature = float(temp_string) / 1000.0
-                    return temperature
-        except Exception as e:
-            print(f"Error reading temperature from sensor {self.sensor_id}: {e}")
-        return None
+def read_all_temperatures(sensors):
+    """Зчитує всі сенсори за одну одночасну конвертацію. Повертає список температур."""
+    found = [s for s in sensors if s.device_file is not None]
+    base_dir = sensors[0].base_dir if sensors else w1.BASE_DIR
+    folders = {s.sensor_id: os.path.basename(os.path.dirname(s.device_file)) for s in found}
+    results = w1.read_temperatures(folders.values(), base_dir)
+    return [results.get(folders.get(s.sensor_id)) for s in sensors]
 """
 # Унікальні ID ваших датчиків
 sensor_1 = TemperatureSensor('28-0921c00ab497')
 sensor_2 = TemperatureSensor('28-0921c00ef1b1')
 sensor_3 = TemperatureSensor('28-0921c0107bb4')
 
-# Зчитування температури з кожного сенсора
-print(f"Temperature from sensor 1: {sensor_1.read_temperature()} °C")
-print(f"Temperature from sensor 2: {sensor_2.read_temperature()} °C")
-print(f"Temperature from sensor 3: {sensor_3.read_temperature()} °C")
+# Зчитування температури з усіх сенсорів за одну конвертацію
+temp_1, temp_2, temp_3 = read_all_temperatures([sensor_1, sensor_2, sensor_3])
+print(f"Temperature from sensor 1: {temp_1} °C")
+print(f"Temperature from sensor 2: {temp_2} °C")
+print(f"Temperature from sensor 3: {temp_3} °C")
 """
\ No newline at end of file
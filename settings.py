@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections.abc import MutableMapping
+
+
+class SettingsStore(MutableMapping):
+    def __init__(self, path, defaults=None, flush_delay=2.0, max_delay=30.0):
+        """
+        Постійне сховище налаштувань з відкладеним атомарним записом.
+
+        Поводиться як словник. Зміна значення лише позначає сховище "брудним";
+        фоновий потік записує файл, коли зміни вщухли на flush_delay секунд,
+        але не пізніше ніж через max_delay після першої незбереженої зміни.
+        Запис іде у тимчасовий файл з fsync і атомарним перейменуванням, тому
+        збій живлення не залишає обрізаний JSON.
+
+        :param path: Шлях до JSON файлу
+        :param defaults: Початкові значення, якщо файл не існує
+        :param flush_delay: Затримка запису після останньої зміни у секундах
+        :param max_delay: Максимальний час утримання незбережених змін у секундах
+        """
+        self.path = path
+        self.flush_delay = flush_delay
+        self.max_delay = max_delay
+        self._data = self._load(defaults)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._dirty_since = None
+        self._last_change = None
+        self._running = True
+
+        # Лічильники для контролю навантаження на SD-карту
+        self.write_count = 0
+        self.change_count = 0
+        self.save_requests = 0
+
+        self._writer = threading.Thread(target=self._writer_loop, name='settings-writer', daemon=True)
+        self._writer.start()
+
+    def _load(self, defaults):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict(defaults or {})
+        except ValueError as e:
+            logging.error(f"Пошкоджений файл налаштувань {self.path}: {e}")
+            return dict(defaults or {})
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key in self._data and self._data[key] == value and type(self._data[key]) is type(value):
+                return
+            self._data[key] = value
+            self._mark_dirty()
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+            self._mark_dirty()
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"SettingsStore({self.path!r}, {self._data!r})"
+
+    def _mark_dirty(self):
+        # Викликається під self._lock
+        now = time.monotonic()
+        self.change_count += 1
+        self._last_change = now
+        if self._dirty_since is None:
+            self._dirty_since = now
+        self._cond.notify()
+
+    @property
+    def dirty(self):
+        return self._dirty_since is not None
+
+    def save(self):
+        """
+        Запит на збереження. Запис відбудеться у фоні, лише якщо є зміни.
+        """
+        self.save_requests += 1
+
+    def flush(self):
+        """
+        Негайний запис незбережених змін.
+        """
+        with self._lock:
+            if self._dirty_since is None:
+                return
+            snapshot = dict(self._data)
+            self._dirty_since = None
+        self._write(snapshot)
+
+    def _write(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._fsync_dir()
+            self.write_count += 1
+        except OSError as e:
+            logging.error(f"Не вдалося зберегти налаштування у {self.path}: {e}")
+            with self._lock:
+                # Залишаємо зміни незбереженими, щоб повторити спробу пізніше
+                now = time.monotonic()
+                self._last_change = now
+                if self._dirty_since is None:
+                    self._dirty_since = now
+
+    def _fsync_dir(self):
+        # Фіксуємо перейменування у каталозі (не всі ФС це підтримують)
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _writer_loop(self):
+        while True:
+            with self._lock:
+                while self._running:
+                    if self._dirty_since is None:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    due = min(self._last_change + self.flush_delay, self._dirty_since + self.max_delay)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                if not self._running:
+                    return
+            self.flush()
+
+    def stats(self):
+        """
+        :return: Словник з лічильниками змін, запитів та фактичних записів
+        """
+        return {
+            'changes': self.change_count,
+            'save_requests': self.save_requests,
+            'writes': self.write_count,
+            'dirty': self.dirty,
+        }
+
+    def close(self):
+        """
+        Зупинка фонового запису зі збереженням незаписаних змін.
+        """
+        with self._lock:
+            self._running = False
+            self._cond.notify()
+        self._writer.join()
+        self.flush()
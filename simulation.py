@@ -0,0 +1,146 @@
+import math
+import time
+import logging
+from collections import deque
+import hal
+import pid
+from logger import setup_logging, stop_logging
+
+
+class ThermalPlant:
+    def __init__(self, boiler_temp=70.0, tau=900.0, valve_travel=120.0, position=0.3, t_bat=30.0, dead_time=0.0):
+        """
+        Спрощена модель контуру опалення: змішувальний клапан з приводом та
+        теплоносій у батареях як ланка першого порядку із запізненням.
+
+        :param boiler_temp: Температура подачі від котла у °C
+        :param tau: Стала часу нагріву/охолодження батарей у секундах
+        :param valve_travel: Час повного ходу клапана у секундах
+        :param position: Початкове положення клапана (0 - закритий, 1 - відкритий)
+        :param t_bat: Початкова температура батарей у °C
+        :param dead_time: Транспортне запізнення у секундах
+        """
+        self.boiler_temp = boiler_temp
+        self.tau = tau
+        self.valve_travel = valve_travel
+        self.position = position
+        self.t_bat = t_bat
+        self.dead_time = dead_time
+        self._delay = deque()
+        self.valve_travel_total = 0.0  # Сумарний хід приводу у секундах
+
+    def target(self, position, pump, t_out):
+        # Температура, до якої прямують батареї при даному положенні клапана
+        if not pump:
+            return t_out
+        return t_out + position * (self.boiler_temp - t_out)
+
+    def step(self, dt, up, down, pump, t_out):
+        """
+        Крок моделі.
+
+        :param dt: Крок часу у секундах
+        :param up: Реле відкриття клапана увімкнено
+        :param down: Реле закриття клапана увімкнено
+        :param pump: Насос увімкнено
+        :param t_out: Температура на вулиці у °C
+        :return: Нова температура батарей у °C
+        """
+        if up != down:
+            self.valve_travel_total += dt
+            delta = dt / self.valve_travel
+            self.position = min(1.0, max(0.0, self.position + (delta if up else -delta)))
+
+        target = self.target(self.position, pump, t_out)
+        if self.dead_time > 0:
+            self._delay.append(target)
+            if len(self._delay) * dt <= self.dead_time:
+                target = self._delay[0]
+            else:
+                target = self._delay.popleft()
+
+        self.t_bat += (target - self.t_bat) * (1.0 - math.exp(-dt / self.tau))
+        return self.t_bat
+
+
+def winter_day(t):
+    """
+    Добовий профіль температури на вулиці: від -13 °C о 3-й ночі до -3 °C о 15-й.
+    """
+    return -8.0 - 5.0 * math.cos(2 * math.pi * (t / 86400.0 - 0.125))
+
+
+class SimulatedSensors:
+    """
+    Бекенд датчиків для симуляції з інтерфейсом TemperatureSampler.latest().
+    """
+
+    def __init__(self, clock, outdoor=winter_day):
+        self.clock = clock
+        self.outdoor = outdoor
+
+    def latest(self, sensor_id=None):
+        return self.outdoor(self.clock.now()), 0.0
+
+
+def run_simulation(duration=86400.0, eeprom=None, plant=None, outdoor=winter_day, record_every=60.0):
+    """
+    Прогін PIDController.loop_pid у віртуальному часі з моделлю контуру.
+
+    :param duration: Тривалість симуляції у секундах віртуального часу
+    :param eeprom: Налаштування, що перекривають pid.DEFAULT_EEPROM
+    :param plant: Модель контуру (ThermalPlant або сумісна)
+    :param outdoor: Функція температури на вулиці від часу у секундах
+    :param record_every: Інтервал запису історії у секундах
+    :return: Список записів історії (словники)
+    """
+    clock = hal.VirtualClock()
+    gpio = hal.FakeGPIO()
+    pid.setup_gpio(gpio)
+    settings = dict(pid.DEFAULT_EEPROM, heat_otop=True, valve_mode=True)
+    settings.update(eeprom or {})
+    plant = plant if plant is not None else ThermalPlant()
+    settings['T_bat'] = plant.t_bat
+    sensors = SimulatedSensors(clock, outdoor)
+    controller = pid.PIDController(settings, sensors.latest, gpio, clock)
+
+    tick = pid.TICK_PERIOD
+    steps = int(duration / tick)
+    record_steps = max(1, int(record_every / tick))
+    history = []
+
+    # Логи симульованого контролера тут лише заважають
+    logging.disable(logging.INFO)
+    try:
+        for i in range(steps):
+            controller.loop_pid()
+            # Реле клапанів активні низьким рівнем, насос - високим
+            up = gpio.pins[pid.PIN_HIGH] == gpio.LOW
+            down = gpio.pins[pid.PIN_LOW] == gpio.LOW
+            pump = gpio.pins[pid.NASOS_OTOP] == gpio.HIGH
+            t_out = outdoor(clock.now())
+            clock.advance(tick)
+            settings['T_bat'] = plant.step(tick, up, down, pump, t_out)
+            if i % record_steps == 0:
+                history.append({
+                    't': clock.now(),
+                    'T_OUT': controller.T_OUT,
+                    'T_SET': controller.T_SET,
+                    'T_bat': settings['T_bat'],
+                    'position': plant.position,
+                    'SUM_D_T': controller.SUM_D_T,
+                })
+    finally:
+        logging.disable(logging.NOTSET)
+    return history
+
+
+if __name__ == "__main__":
+    setup_logging()
+    started = time.monotonic()
+    history = run_simulation()
+    elapsed = time.monotonic() - started
+    errors = [abs(h['T_SET'] - h['T_bat']) for h in history[len(history) // 4:]]
+    logging.info(f"Симульовано 24 год за {elapsed:.1f} с")
+    logging.info(f"Середня похибка: {sum(errors) / len(errors):.2f}°C, максимальна: {max(errors):.2f}°C")
+    stop_logging()
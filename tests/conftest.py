@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# Модулі проєкту лежать у корені репозиторію, без пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+W1_SLAVE = '72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t=23125\n'
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    """
+    Фабрика фейкового каталогу /sys/bus/w1/devices у tmp_path.
+
+    sysfs(resolutions, bulk=True) створює по датчику DS18B20 на кожну
+    роздільну здатність (w1_slave і resolution) і майстер шини, з
+    therm_bulk_read, якщо bulk. Повертає список ID датчиків.
+    """
+    def build(resolutions, bulk=True):
+        master = tmp_path / 'w1_bus_master1'
+        master.mkdir()
+        if bulk:
+            (master / 'therm_bulk_read').write_text('1\n')
+        ids = []
+        for i, bits in enumerate(resolutions):
+            sensor_id = f"28-{i:012x}"
+            device = tmp_path / sensor_id
+            device.mkdir()
+            (device / 'w1_slave').write_text(W1_SLAVE)
+            (device / 'resolution').write_text(f"{bits}\n")
+            ids.append(sensor_id)
+        return ids
+    return build
@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+import filters
+
+
+def make(kind, vector_min):
+    if kind == 'kalman':
+        stages = [filters.SpikeFilter(), filters.MedianFilter(5), filters.KalmanFilter()]
+        return filters.FilterPipeline(stages, vector_min=vector_min)
+    pipeline = filters.default_pipeline()
+    pipeline.vector_min = vector_min
+    return pipeline
+
+
+@pytest.mark.parametrize('kind', ['default', 'kalman'])
+def test_scalar_and_vector_paths_agree(kind):
+    scalar = make(kind, vector_min=10 ** 9)
+    vector = make(kind, vector_min=1)
+    rng = random.Random(1)
+    sensors = ['a', 'b', 'c']
+    for k in range(500):
+        readings = {}
+        for sensor_id in sensors[:1 + k // 100]:
+            r = rng.random()
+            if r < 0.05:
+                readings[sensor_id] = None
+            elif r < 0.08:
+                readings[sensor_id] = rng.choice([85.0, -127.0, 200.0])
+            else:
+                readings[sensor_id] = 20.0 + 10.0 * (k > 250) + rng.gauss(0.0, 0.2)
+        expected = vector.filter(readings)
+        result = scalar.filter(readings)
+        assert result.keys() == expected.keys()
+        for sensor_id, value in expected.items():
+            assert (result[sensor_id] is None) == (value is None)
+            if value is not None:
+                assert result[sensor_id] == pytest.approx(value, abs=1e-12)
+
+
+def test_power_on_glitch_is_rejected():
+    pipeline = filters.default_pipeline()
+    assert pipeline.filter({'a': 21.0}) == {'a': 21.0}
+    assert pipeline.filter({'a': 85.0}) == {'a': None}
+    assert pipeline.filter({'a': 21.0})['a'] == pytest.approx(21.0)
@@ -0,0 +1,44 @@
+import numpy as np
+
+import identify
+from history import PID_FIELDS
+from simulation import ThermalPlant
+from tsdb import TimeSeriesStore
+
+
+def test_counter_deltas_handle_restart_and_missing_values():
+    deltas = identify.counter_deltas([0.0, 0.5, 1.5, 0.2, float('nan'), 0.4])
+    assert deltas.tolist() == [0.0, 0.5, 1.0, 0.2, 0.0, 0.4]
+
+
+def test_resample_history_sums_on_time_and_fills_gaps():
+    times = [0.0, 1.0, 2.0, 3.0, 12.0]
+    series = identify.resample_history(times, [1, 2, 3, 4, 5], [10, 20, 30, 40, 50],
+                                       [0.0, 0.1, 0.3, 0.3, 0.9], [0.0, 0.0, 0.0, 0.05, 0.05], dt=2.0)
+    assert series['t'].tolist() == [0.0, 2.0, 4.0, 6.0, 8.0, 10.0, 12.0]
+    assert np.allclose(series['up'], [0.1, 0.2, 0, 0, 0, 0, 0.6])
+    assert np.allclose(series['down'], [0, 0.05, 0, 0, 0, 0, 0])
+    assert series['T_bat'].tolist() == [20, 40, 40, 40, 40, 40, 50]
+
+
+def test_fit_from_controller_store(tmp_path):
+    # Записи у форматі регулятора: PRESENT_VALUE і накопичені UP_TIME/DOWN_TIME раз на секунду
+    plant = ThermalPlant(tau=600.0, valve_travel=120.0, position=0.3)
+    store = TimeSeriesStore(str(tmp_path), PID_FIELDS, maintenance_interval=1e9)
+    up_time = down_time = 0.0
+    for k in range(4 * 3600):
+        phase = (k // 1200) % 2
+        up = phase == 0 and k % 10 == 5
+        down = phase == 1 and k % 10 == 5
+        t_out = -5.0 + 3.0 * np.sin(k / 3600.0)
+        t_bat = plant.step(1.0, up, down, True, t_out)
+        up_time += 1.0 * up
+        down_time += 1.0 * down
+        store.append(1_700_000_000.0 + k, [t_out, 0.0, t_bat, 0.0, 0.0, up_time, down_time, 1.0])
+    store.close()
+
+    history = identify.load_store(str(tmp_path), 10.0)
+    assert history['up'].sum() == up_time and history['down'].sum() == down_time
+    model = identify.fit_fopdt(history['T_OUT'], history['T_bat'], history['up'], history['down'],
+                               10.0, 120.0, initial_position=0.3)
+    assert abs(model.tau - 600.0) < 60.0
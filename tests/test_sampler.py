@@ -0,0 +1,77 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import w1
+from sampler import TemperatureSampler
+
+
+class FakeBus:
+    """
+    Час конвертацій як у драйвері w1_therm: окреме читання w1_slave чекає
+    повну конвертацію свого датчика, а після therm_bulk_read - лише її залишок.
+    """
+
+    def __init__(self, monkeypatch, resolutions):
+        self.resolutions = resolutions
+        self.ready = {}
+        self.reads = {sensor_id: 0 for sensor_id in resolutions}
+        self.lock = threading.Lock()
+        read_sensor = w1.read_sensor
+        start_bulk_conversion = w1.start_bulk_conversion
+
+        def fake_read(sensor_id, base_dir=w1.BASE_DIR):
+            with self.lock:
+                ready = self.ready.pop(sensor_id, None)
+            if ready is None:
+                time.sleep(w1.conversion_time(self.resolutions[sensor_id]))
+            else:
+                time.sleep(max(0.0, ready - time.monotonic()))
+            self.reads[sensor_id] += 1
+            return read_sensor(sensor_id, base_dir)
+
+        def fake_bulk(base_dir=w1.BASE_DIR):
+            triggered = start_bulk_conversion(base_dir)
+            if triggered:
+                now = time.monotonic()
+                with self.lock:
+                    self.ready = {sensor_id: now + w1.conversion_time(bits)
+                                  for sensor_id, bits in self.resolutions.items()}
+            return triggered
+
+        monkeypatch.setattr(w1, 'read_sensor', fake_read)
+        monkeypatch.setattr(w1, 'start_bulk_conversion', fake_bulk)
+
+
+def run_sampler(sampler, executor, duration):
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        time.sleep(executor.submit(sampler.sample_once).result())
+
+
+def test_fast_sensor_polled_between_slow_conversions(tmp_path, monkeypatch, sysfs):
+    # Масштаб часу 1:5: 12 біт - 150 мс конвертації і період 0.2 с, 10 біт - 37.5 мс і 0.05 с
+    monkeypatch.setattr(w1, 'CONVERSION_TIME', 0.15)
+    fast, slow_1, slow_2 = sysfs([10, 12, 12])
+    bus = FakeBus(monkeypatch, {fast: 10, slow_1: 12, slow_2: 12})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sampler = TemperatureSampler(interval=0.2, base_dir=str(tmp_path), executor=executor)
+        run_sampler(sampler, executor, 1.6)
+
+    # За 1.6 с: 12-бітні - близько 8 зчитувань, 10-бітний - близько 32
+    assert 5 <= bus.reads[slow_1] <= 9
+    assert 5 <= bus.reads[slow_2] <= 9
+    assert bus.reads[fast] >= 3 * bus.reads[slow_1]
+    assert sampler.latest(fast)[0] == 23.125
+
+
+def test_mixed_periods_without_bulk_read_fast_sensor_first(tmp_path, monkeypatch, sysfs):
+    monkeypatch.setattr(w1, 'CONVERSION_TIME', 0.15)
+    fast, slow = sysfs([10, 12], bulk=False)
+    bus = FakeBus(monkeypatch, {fast: 10, slow: 12})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        sampler = TemperatureSampler(interval=0.2, base_dir=str(tmp_path), executor=executor)
+        run_sampler(sampler, executor, 1.0)
+
+    # Без therm_bulk_read конвертації йдуть по черзі, але швидкий датчик усе одно читається частіше
+    assert bus.reads[fast] > bus.reads[slow] >= 3
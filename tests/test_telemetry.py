@@ -0,0 +1,40 @@
+from ds18b20 import TelemetryPublisher
+
+
+class FakeHub:
+    # Як MQTTHub.publish: без підключення повідомлення відкидається і повертається None
+    def __init__(self):
+        self.connected = True
+        self.messages = []
+
+    def publish(self, topic, payload):
+        if not self.connected:
+            return None
+        self.messages.append((topic, payload))
+        return True
+
+
+def test_values_changed_during_outage_are_sent_after_reconnect():
+    hub = FakeHub()
+    publisher = TelemetryPublisher(hub, default_topic='t', deadband=0.5)
+    assert publisher.publish({'a': 20.0}, now=0.0) == 1
+
+    hub.connected = False
+    assert publisher.publish({'a': 25.0}, now=10.0) == 0
+    hub.connected = True
+
+    # Значення не змінилось з моменту розриву, але підписники його ще не отримали
+    assert publisher.publish({'a': 25.0}, now=20.0) == 1
+    assert hub.messages[-1] == ('t', '25.0')
+
+
+def test_batch_not_marked_published_while_disconnected():
+    hub = FakeHub()
+    hub.connected = False
+    publisher = TelemetryPublisher(hub, batch_topic='b')
+    assert publisher.publish({'a': 20.0, 'b': 21.0}, now=0.0) == 0
+    assert publisher.stats() == {'messages': 0, 'published': 0, 'suppressed': 0}
+
+    hub.connected = True
+    assert publisher.publish({'a': 20.0, 'b': 21.0}, now=1.0) == 1
+    assert publisher.stats()['published'] == 2
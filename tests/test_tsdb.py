@@ -0,0 +1,55 @@
+import math
+
+from tsdb import TimeSeriesStore
+
+
+def write_segment(directory, fields, start, count=9, flushes=3):
+    # Кілька коротких flush - сегмент з дрібними блоками, який compact() переписує
+    store = TimeSeriesStore(directory, fields, batch_size=100, maintenance_interval=1e9)
+    t = start
+    for _ in range(flushes):
+        for _ in range(count // flushes):
+            store.append(t, [t + i for i in range(len(fields))])
+            t += 1.0
+        store.flush()
+    store.close()
+    return t
+
+
+def values(store, field):
+    return [value for t, value in store.query(field)]
+
+
+def test_compact_keeps_columns_missing_from_current_fields(tmp_path):
+    directory = str(tmp_path)
+    end = write_segment(directory, ['A', 'B', 'C'], 1000.0)
+    store = TimeSeriesStore(directory, ['A', 'B'], batch_size=100, maintenance_interval=1e9)
+    store.append(end, [1.0, 2.0])
+    store.flush()
+    before = values(store, 'C')[:9]
+
+    store.compact()
+
+    assert store.compactions == 1
+    assert before == [t + 2 for t in range(1000, 1009)]
+    after = values(store, 'C')
+    assert after[:9] == before and math.isnan(after[9])
+    store.close()
+
+
+def test_compact_does_not_merge_segments_with_different_fields(tmp_path):
+    directory = str(tmp_path)
+    t = write_segment(directory, ['A', 'B', 'C'], 1000.0)
+    t = write_segment(directory, ['A', 'B'], t)
+    store = TimeSeriesStore(directory, ['A'], batch_size=100, maintenance_interval=1e9)
+    store.append(t, [1.0])
+    store.flush()
+
+    store.compact()
+
+    # Обидва закриті сегменти переписані окремо, кожен зі своїми полями
+    assert store.compactions == 2
+    assert len(store.segments()) == 3
+    assert [v for v in values(store, 'B') if not math.isnan(v)] == [t0 + 1 for t0 in range(1000, 1018)]
+    assert [v for v in values(store, 'C') if not math.isnan(v)] == [t0 + 2 for t0 in range(1000, 1009)]
+    store.close()
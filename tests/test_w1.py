@@ -0,0 +1,106 @@
+import errno
+import os
+import shutil
+
+import pytest
+
+import w1
+from conftest import W1_SLAVE
+
+NO_CRC = '72 01 4b 46 7f ff 0e 10 57 : crc=00 NO\n72 01 4b 46 7f ff 0e 10 57 t=85000\n'
+
+
+@pytest.fixture
+def sysfs_os(monkeypatch):
+    """
+    Поведінка sysfs, якої немає у звичайних файлах: after_read(path) викликається
+    після кожного os.preadv, а читання видаленого пристрою дає ENODEV.
+    """
+    hooks = {}
+    preadv = os.preadv
+
+    def fake_preadv(fd, buffers, offset):
+        path = os.readlink(f"/proc/self/fd/{fd}")
+        if path.endswith(' (deleted)'):
+            raise OSError(errno.ENODEV, "No such device")
+        n = preadv(fd, buffers, offset)
+        hook = hooks.get(path)
+        if hook is not None:
+            hook(path)
+        return n
+
+    monkeypatch.setattr(w1.os, 'preadv', fake_preadv)
+    return hooks
+
+
+def test_no_crc_is_retried(tmp_path, sysfs, sysfs_os):
+    (sensor_id,) = sysfs([12])
+    path = str(tmp_path / sensor_id / 'w1_slave')
+    with open(path, 'w') as f:
+        f.write(NO_CRC)
+
+    def fix_crc(path):
+        # Наступне читання - вже з правильним CRC
+        with open(path, 'w') as f:
+            f.write(W1_SLAVE)
+
+    sysfs_os[path] = fix_crc
+    errors = w1._crc_errors.get()
+    assert w1.read_sensor(sensor_id, str(tmp_path)) == 23.125
+    assert w1._crc_errors.get() == errors + 1
+
+
+def test_no_crc_on_every_retry_returns_none(tmp_path, sysfs):
+    (sensor_id,) = sysfs([12])
+    with open(tmp_path / sensor_id / 'w1_slave', 'w') as f:
+        f.write(NO_CRC)
+    errors = w1._crc_errors.get()
+    assert w1.read_sensor(sensor_id, str(tmp_path)) is None
+    assert w1._crc_errors.get() == errors + w1.CRC_RETRIES + 1
+
+
+def test_kernel_temperature_attribute(tmp_path, sysfs):
+    (sensor_id,) = sysfs([12])
+    device = tmp_path / sensor_id
+    # Драйвер повертає порожню відповідь, якщо CRC не збігся
+    (device / 'temperature').write_text('')
+    reader = w1.SensorReader(str(device))
+    assert reader.kernel_attr
+    assert reader.read_millidegrees() is None
+
+    (device / 'temperature').write_text('-1250\n')
+    assert reader.read_millidegrees() == -1250
+    reader.close()
+
+
+def test_removed_device_forces_rescan(tmp_path, sysfs, sysfs_os):
+    first, second = sysfs([12, 12])
+    base_dir = str(tmp_path)
+    registry = w1.get_registry(base_dir)
+    assert w1.read_sensor(first, base_dir) == 23.125
+    assert first in registry.sensor_ids()
+
+    shutil.rmtree(tmp_path / first)
+    # Відкритий дескриптор читає видалений пристрій: ENODEV і позачергове перечитування каталогу
+    assert w1.read_sensor(first, base_dir) is None
+    assert first not in registry.sensor_ids()
+    assert second in registry.sensor_ids()
+    assert w1.read_sensor(second, base_dir) == 23.125
+
+
+def test_bulk_conversion_reads_sequentially(tmp_path, sysfs, monkeypatch):
+    ids = sysfs([12, 12, 12])
+    bulk = tmp_path / 'w1_bus_master1' / 'therm_bulk_read'
+
+    def no_pool():
+        raise AssertionError("після групової конвертації пул потоків не потрібен")
+
+    monkeypatch.setattr(w1, '_get_executor', no_pool)
+    assert w1.read_temperatures(ids, str(tmp_path)) == {sensor_id: 23.125 for sensor_id in ids}
+    assert bulk.read_text() == 'trigger\n'
+
+
+def test_without_bulk_support_reads_in_pool(tmp_path, sysfs):
+    ids = sysfs([12, 12], bulk=False)
+    assert not w1.trigger_bulk_conversion(str(tmp_path))
+    assert w1.read_temperatures(ids, str(tmp_path)) == {sensor_id: 23.125 for sensor_id in ids}
@@ -0,0 +1,535 @@
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+import logging
+
+FILE_MAGIC = b'TSD1'
+BLOCK = struct.Struct('<4sIIqq')   # магія, кількість точок, довжина даних, перший і останній час (мс)
+BLOCK_MAGIC = b'BLK1'
+SUFFIX = '.tsd'
+
+
+def _zigzag(n):
+    return (n << 1) if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(n):
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_times(times_ms):
+    """
+    Мітки часу (цілі мілісекунди): перша як є, далі дельта дельт.
+    При сталому періоді запису кожна точка займає один байт.
+    """
+    out = bytearray()
+    prev = 0
+    prev_delta = 0
+    for i, t in enumerate(times_ms):
+        delta = t - prev
+        _put_varint(out, _zigzag(delta if i < 2 else delta - prev_delta))
+        prev_delta = delta
+        prev = t
+    return bytes(out)
+
+
+def decode_times(data, count):
+    times = []
+    pos = 0
+    prev = 0
+    prev_delta = 0
+    for i in range(count):
+        value, pos = _get_varint(data, pos)
+        value = _unzigzag(value)
+        delta = value if i < 2 else prev_delta + value
+        prev += delta
+        prev_delta = delta
+        times.append(prev)
+    return times
+
+
+def encode_values(values):
+    """
+    Значення float64: XOR з попереднім. Однакові значення займають один байт;
+    для близьких значень XOR має багато нулів на кінці, які не зберігаються.
+    """
+    bits = struct.unpack(f'<{len(values)}Q', struct.pack(f'<{len(values)}d', *values))
+    out = bytearray()
+    prev = 0
+    for b in bits:
+        x = b ^ prev
+        prev = b
+        if not x:
+            out.append(0)
+            continue
+        tz = (x & -x).bit_length() - 1
+        _put_varint(out, ((x >> tz) << 6) | tz)
+    return bytes(out)
+
+
+def decode_values(data, count):
+    bits = []
+    pos = 0
+    prev = 0
+    for _ in range(count):
+        value, pos = _get_varint(data, pos)
+        if value:
+            prev ^= (value >> 6) << (value & 0x3F)
+        bits.append(prev)
+    return list(struct.unpack(f'<{count}d', struct.pack(f'<{count}Q', *bits)))
+
+
+def encode_block(times_ms, columns):
+    streams = [encode_times(times_ms)] + [encode_values(column) for column in columns]
+    lengths = struct.pack(f'<{len(streams)}I', *(len(s) for s in streams))
+    payload = lengths + b''.join(streams)
+    return BLOCK.pack(BLOCK_MAGIC, len(times_ms), len(payload), times_ms[0], times_ms[-1]) + payload
+
+
+class Segment:
+    def __init__(self, path):
+        """
+        Файл сегмента: заголовок з назвами полів і блоки, що лише дописуються
+        в кінець. Читання - через mmap, з пропуском блоків поза діапазоном
+        лише за їх заголовками.
+        """
+        self.path = path
+        self.fields = None
+        self.data_start = 0
+
+    @staticmethod
+    def header(fields):
+        names = json.dumps(list(fields)).encode('utf-8')
+        return FILE_MAGIC + struct.pack('<I', len(names)) + names
+
+    def read_fields(self):
+        """
+        :return: Назви полів із заголовка файлу або None, якщо заголовка немає
+        """
+        with open(self.path, 'rb') as f:
+            head = f.read(8)
+            if len(head) < 8 or head[:4] != FILE_MAGIC:
+                return None
+            (names_len,) = struct.unpack_from('<I', head, 4)
+            self.fields = json.loads(f.read(names_len).decode('utf-8'))
+            self.data_start = 8 + names_len
+        return self.fields
+
+    def blocks(self, mm):
+        """
+        Обхід цілих блоків файлу. Обрізаний останній блок (збій живлення під
+        час запису) пропускається.
+
+        :return: Генератор (зміщення даних, кількість, довжина, t_first, t_last)
+        """
+        if mm[:4] != FILE_MAGIC:
+            return
+        (names_len,) = struct.unpack_from('<I', mm, 4)
+        self.data_start = 8 + names_len
+        self.fields = json.loads(bytes(mm[8:self.data_start]).decode('utf-8'))
+        pos = self.data_start
+        size = len(mm)
+        while pos + BLOCK.size <= size:
+            magic, count, length, t_first, t_last = BLOCK.unpack_from(mm, pos)
+            if magic != BLOCK_MAGIC or pos + BLOCK.size + length > size:
+                break
+            yield pos + BLOCK.size, count, length, t_first, t_last
+            pos += BLOCK.size + length
+
+    def valid_size(self):
+        """
+        :return: Розмір файлу без обрізаного останнього блоку
+        """
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = 0
+                for offset, count, length, t_first, t_last in self.blocks(mm):
+                    end = offset + length
+                return end or self.data_start
+
+    def read(self, t0_ms, t1_ms, columns):
+        """
+        Точки у проміжку [t0_ms, t1_ms].
+
+        :param columns: Назви полів або None - усі поля
+        :return: Список (t_ms, [значення]) у порядку columns
+        """
+        result = []
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return result
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for offset, count, length, t_first, t_last in self.blocks(mm):
+                    if t_last < t0_ms or t_first > t1_ms:
+                        continue
+                    n_streams = len(self.fields) + 1
+                    lengths = struct.unpack_from(f'<{n_streams}I', mm, offset)
+                    starts = [offset + 4 * n_streams]
+                    for stream_length in lengths:
+                        starts.append(starts[-1] + stream_length)
+                    times = decode_times(mm[starts[0]:starts[1]], count)
+                    wanted = self.fields if columns is None else columns
+                    decoded = []
+                    for name in wanted:
+                        if name not in self.fields:
+                            # Поле з'явилось пізніше, ніж записано цей сегмент
+                            decoded.append([float('nan')] * count)
+                            continue
+                        i = self.fields.index(name) + 1
+                        decoded.append(decode_values(mm[starts[i]:starts[i + 1]], count))
+                    for k, t in enumerate(times):
+                        if t0_ms <= t <= t1_ms:
+                            result.append((t, [column[k] for column in decoded]))
+        return result
+
+
+def read_rows(directory, fields, t0=None, t1=None):
+    """
+    Читання записаних сегментів без відкриття сховища (без фонового потоку і
+    відновлення файлів), наприклад інструментами аналізу поряд з регулятором.
+
+    :param directory: Каталог сегментів
+    :param fields: Назви полів; поля, яких немає в сегменті, - NaN
+    :param t0: Початок у секундах епохи або None
+    :param t1: Кінець у секундах епохи або None
+    :return: Список (t, [значення]) у порядку fields
+    """
+    t0_ms = -2 ** 62 if t0 is None else int(t0 * 1000)
+    t1_ms = 2 ** 62 if t1 is None else int(t1 * 1000)
+    names = sorted(name for name in os.listdir(directory) if name.endswith(SUFFIX))
+    rows = []
+    for name in names:
+        for t, row in Segment(os.path.join(directory, name)).read(t0_ms, t1_ms, list(fields)):
+            rows.append((t / 1000.0, row))
+    return rows
+
+
+class TimeSeriesStore:
+    def __init__(self, directory, fields, batch_size=600, flush_interval=300.0, segment_bytes=4 * 1024 * 1024,
+                 retention=180 * 86400.0, maintenance_interval=3600.0, monotonic=False):
+        """
+        Сховище часових рядів на SD-карті з файлів-сегментів, що лише дописуються.
+
+        append() лише додає точку у пам'ять. Фоновий потік записує накопичене
+        одним послідовним блоком (batch_size точок або раз на flush_interval
+        секунд), стиснутим дельтою дельт для часу та XOR для значень. Раз на
+        maintenance_interval старі сегменти видаляються (retention), а дрібні
+        ущільнюються в один файл з великими блоками.
+
+        З monotonic=True append() приймає час time.monotonic(), а в час епохи
+        він переводиться під час запису блоку (і запиту) за поточним зсувом
+        годинника. У Raspberry Pi немає RTC: до синхронізації NTP системний
+        час може відставати на години, і зсув, узятий один раз при запуску,
+        псував би мітки всіх точок до кінця роботи процесу.
+
+        :param directory: Каталог сегментів
+        :param fields: Назви полів
+        :param batch_size: Кількість точок в одному блоці
+        :param flush_interval: Максимальний час утримання точок у пам'яті у секундах
+        :param segment_bytes: Розмір сегмента, після якого починається новий файл
+        :param retention: Час зберігання даних у секундах
+        :param maintenance_interval: Період ущільнення та видалення старих даних у секундах
+        :param monotonic: Мітки часу в append() - time.monotonic(), а не time.time()
+        """
+        self.directory = directory
+        self.fields = list(fields)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.retention = retention
+        self.maintenance_interval = maintenance_interval
+        self.monotonic = monotonic
+        os.makedirs(directory, exist_ok=True)
+
+        self._pending = []
+        self._pending_since = None
+        self._active = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._io_lock = threading.Lock()
+        self._running = True
+
+        # Лічильники для контролю навантаження на SD-карту
+        self.points = 0
+        self.blocks_written = 0
+        self.bytes_written = 0
+        self.compactions = 0
+        self.removed = 0
+
+        self._recover()
+        self._thread = threading.Thread(target=self._writer_loop, name='tsdb-writer', daemon=True)
+        self._thread.start()
+
+    def segments(self):
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.endswith(SUFFIX))
+
+    def _recover(self):
+        # Обрізаний блок в кінці останнього сегмента (збій живлення) відкидається
+        segments = self.segments()
+        if not segments:
+            return
+        path = segments[-1]
+        segment = Segment(path)
+        size = segment.valid_size()
+        if size < os.path.getsize(path):
+            logging.warning(f"Сегмент {path}: відкинуто обрізаний блок ({os.path.getsize(path) - size} байт).")
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+        if segment.fields == self.fields:
+            self._active = path
+
+    def append(self, timestamp, values):
+        """
+        Додавання точки. Не звертається до диска.
+
+        :param timestamp: Час у секундах епохи (time.time()) або, з monotonic=True, time.monotonic()
+        :param values: Значення у порядку fields; None - немає значення
+        """
+        row = [float('nan') if v is None else float(v) for v in values]
+        with self._lock:
+            self._pending.append((timestamp, row))
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _to_ms(self, points):
+        # Час епохи в мс; для монотонних міток - за зсувом годинника на цей момент
+        offset = time.time() - time.monotonic() if self.monotonic else 0.0
+        return [(int(round((t + offset) * 1000)), row) for t, row in points]
+
+    def flush(self):
+        """
+        Негайний запис накопичених точок одним блоком.
+        """
+        # Точки забираються під _io_lock, тож query() бачить їх або в пам'яті, або вже на диску
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._pending_since = None
+            if pending:
+                self._write_block(self._to_ms(pending))
+
+    def _write_block(self, points):
+        times = [t for t, row in points]
+        columns = [list(column) for column in zip(*(row for t, row in points))]
+        block = encode_block(times, columns)
+        path = self._active
+        if path is None or os.path.getsize(path) + len(block) > self.segment_bytes:
+            # Назва сегмента - час першої точки в ньому, а не час створення файлу
+            path = os.path.join(self.directory, f"{times[0]:015d}{SUFFIX}")
+            with open(path, 'wb') as f:
+                f.write(Segment.header(self.fields))
+            self._active = path
+        try:
+            with open(path, 'ab') as f:
+                f.write(block)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logging.error(f"Не вдалося записати блок у {path}: {e}")
+            return
+        self.points += len(points)
+        self.blocks_written += 1
+        self.bytes_written += len(block)
+
+    def _writer_loop(self):
+        last_maintenance = time.monotonic()
+        while True:
+            with self._lock:
+                while self._running:
+                    now = time.monotonic()
+                    if len(self._pending) >= self.batch_size:
+                        break
+                    if self._pending_since is not None and now - self._pending_since >= self.flush_interval:
+                        break
+                    if now - last_maintenance >= self.maintenance_interval:
+                        break
+                    deadline = last_maintenance + self.maintenance_interval
+                    if self._pending_since is not None:
+                        deadline = min(deadline, self._pending_since + self.flush_interval)
+                    self._cond.wait(deadline - now)
+                if not self._running:
+                    return
+            self.flush()
+            if time.monotonic() - last_maintenance >= self.maintenance_interval:
+                last_maintenance = time.monotonic()
+                try:
+                    self.apply_retention()
+                    self.compact()
+                except OSError as e:
+                    logging.error(f"Помилка обслуговування сховища {self.directory}: {e}")
+
+    def query(self, field, t0=None, t1=None):
+        """
+        Значення поля за проміжок часу. Читаються лише сегменти та блоки,
+        що перетинаються з проміжком; ще не записані точки беруться з пам'яті
+        без примусового запису на диск.
+
+        :param t0: Початок у секундах епохи або None
+        :param t1: Кінець у секундах епохи або None
+        :return: Список (t, значення)
+        """
+        t0_ms = -2 ** 62 if t0 is None else int(t0 * 1000)
+        t1_ms = 2 ** 62 if t1 is None else int(t1 * 1000)
+        column = self.fields.index(field) if field in self.fields else None
+        result = []
+        with self._io_lock:
+            with self._lock:
+                pending = list(self._pending)
+            segments = self.segments()
+            for i, path in enumerate(segments):
+                # Сегмент починається з часу в назві і закінчується не пізніше за наступний
+                first = int(os.path.basename(path)[:-len(SUFFIX)])
+                if first > t1_ms:
+                    break
+                if i + 1 < len(segments) and int(os.path.basename(segments[i + 1])[:-len(SUFFIX)]) < t0_ms:
+                    continue
+                result.extend((t / 1000.0, row[0]) for t, row in Segment(path).read(t0_ms, t1_ms, [field]))
+        if column is not None:
+            result.extend((t / 1000.0, row[column]) for t, row in self._to_ms(pending) if t0_ms <= t <= t1_ms)
+        return result
+
+    def downsample(self, field, t0, t1, step):
+        """
+        Агрегація поля за інтервалами step секунд.
+
+        :return: Список (початок інтервалу, min, mean, max); інтервали без даних пропускаються
+        """
+        buckets = {}
+        for t, value in self.query(field, t0, t1):
+            if value != value:  # NaN
+                continue
+            key = int((t - t0) // step)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [value, value, value, 1]
+            else:
+                bucket[0] = min(bucket[0], value)
+                bucket[1] += value
+                bucket[2] = max(bucket[2], value)
+                bucket[3] += 1
+        return [(t0 + key * step, low, total / count, high)
+                for key, (low, total, high, count) in sorted(buckets.items())]
+
+    def apply_retention(self, now=None):
+        """
+        Видалення сегментів, усі дані яких старші за retention.
+        """
+        cutoff_ms = int(((time.time() if now is None else now) - self.retention) * 1000)
+        with self._io_lock:
+            segments = self.segments()
+            # Кінець сегмента - початок наступного; активний сегмент не видаляється
+            for path, next_path in zip(segments, segments[1:]):
+                if int(os.path.basename(next_path)[:-len(SUFFIX)]) <= cutoff_ms and path != self._active:
+                    os.remove(path)
+                    self.removed += 1
+
+    def compact(self):
+        """
+        Злиття закритих сегментів з дрібними блоками (часті перезапуски,
+        короткі flush) у файли до segment_bytes з блоками по batch_size точок.
+
+        Зливаються лише сусідні сегменти з однаковим списком полів у заголовку,
+        і кожна група переписується зі своїми полями, а не з поточними
+        self.fields: сховище, відкрите з іншим набором полів (наприклад, датчик
+        не знайдено під час запуску), не втрачає стовпців старих сегментів.
+        """
+        with self._io_lock:
+            closed = [path for path in self.segments() if path != self._active]
+            group, group_size, group_fields, groups = [], 0, None, []
+            for path in closed:
+                fields = Segment(path).read_fields()
+                size = os.path.getsize(path)
+                if group and (fields != group_fields or group_size + size > self.segment_bytes):
+                    groups.append((group, group_fields))
+                    group, group_size = [], 0
+                if fields is None:
+                    # Порожній файл або без заголовка - не зливається
+                    continue
+                group.append(path)
+                group_size += size
+                group_fields = fields
+            if group:
+                groups.append((group, group_fields))
+            for group, fields in groups:
+                if len(group) > 1 or self._small_blocks(group[0]):
+                    self._rewrite(group, fields)
+
+    def _small_blocks(self, path):
+        segment = Segment(path)
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                counts = [count for offset, count, length, t_first, t_last in segment.blocks(mm)]
+        return len(counts) > 1 and sum(counts) / len(counts) < self.batch_size / 2
+
+    def _rewrite(self, group, fields):
+        points = []
+        for path in group:
+            points.extend(Segment(path).read(-2 ** 62, 2 ** 62, fields))
+        target = group[0]
+        tmp_path = f"{target}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(Segment.header(fields))
+            for start in range(0, len(points), self.batch_size):
+                chunk = points[start:start + self.batch_size]
+                times = [t for t, row in chunk]
+                columns = [list(column) for column in zip(*(row for t, row in chunk))]
+                f.write(encode_block(times, columns))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+        for path in group[1:]:
+            os.remove(path)
+        self.compactions += 1
+
+    def stats(self):
+        """
+        :return: Словник з лічильниками записаних точок, блоків та байтів
+        """
+        return {
+            'points': self.points,
+            'blocks': self.blocks_written,
+            'bytes': self.bytes_written,
+            'pending': len(self._pending),
+            'segments': len(self.segments()),
+            'compactions': self.compactions,
+            'removed': self.removed,
+        }
+
+    def close(self):
+        """
+        Зупинка фонового потоку із записом накопичених точок.
+        """
+        with self._lock:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
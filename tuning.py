@@ -0,0 +1,244 @@
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pid
+from simulation import ThermalPlant, winter_day
+from logger import setup_logging, stop_logging
+
+# Частка імпульсу 100 мс, протягом якої реле клапана фактично увімкнене:
+# loop_pid вмикає його лише на такті з імпульсом
+RELAY_DUTY = pid.TICK_PERIOD / pid.PULSE_PERIOD
+
+
+def make_grid(**values):
+    """
+    Декартів добуток значень параметрів.
+
+    :param values: Списки значень, наприклад kof_p=[0.1, 0.5], kof_i=[1, 5]
+    :return: Словник ключ -> масив довжини добутку розмірів
+    """
+    keys = list(values)
+    combos = np.array(list(itertools.product(*(values[k] for k in keys))), dtype=float)
+    return {k: combos[:, i] for i, k in enumerate(keys)}
+
+
+def heating_curve(t_out, x1, y1, x2, y2):
+    """
+    Векторизована крива опалення з loop_pid: T_SET від температури на вулиці.
+    """
+    t_out = np.asarray(t_out, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        middle = (t_out - x1) * (y1 - y2) / (x1 - x2) + y1
+    return np.where(t_out <= x1, y1, np.where(t_out < x2, middle, y2))
+
+
+class BatchThermalPlant:
+    """
+    Векторизована ThermalPlant: один екземпляр моделі на кожен набір параметрів.
+    """
+
+    def __init__(self, boiler_temp=70.0, tau=900.0, valve_travel=120.0, position=0.3, t_bat=30.0, dead_time=0.0,
+                 target=None):
+        self.boiler_temp = boiler_temp
+        self.tau = tau
+        self.valve_travel = valve_travel
+        self.position0 = position
+        self.t_bat0 = t_bat
+        self.dead_time = dead_time
+        self._target = target
+
+    @classmethod
+    def from_plant(cls, plant):
+        # Приймає ThermalPlant або будь-яку її підкласу (наприклад, ідентифіковану модель)
+        return cls(plant.boiler_temp, plant.tau, plant.valve_travel, plant.position, plant.t_bat, plant.dead_time,
+                   target=plant.target)
+
+    def reset(self, n, dt):
+        self.position = np.full(n, self.position0)
+        self.t_bat = np.full(n, self.t_bat0)
+        self.alpha = 1.0 - np.exp(-dt / self.tau)
+        self.delay_steps = int(round(self.dead_time / dt))
+        self._delay = np.empty((self.delay_steps, n)) if self.delay_steps else None
+        self._k = 0
+        return self.t_bat
+
+    def step(self, relay_dt, up, down, t_out):
+        # relay_dt - час роботи реле клапана за крок; стала часу батарей врахована у reset()
+        move = relay_dt / self.valve_travel
+        self.position = np.clip(self.position + move * (up.astype(float) - down.astype(float)), 0.0, 1.0)
+        if self._target is not None:
+            target = self._target(self.position, True, t_out)
+        else:
+            target = t_out + self.position * (self.boiler_temp - t_out)
+        if self.delay_steps:
+            slot = self._k % self.delay_steps
+            delayed = self._delay[slot].copy() if self._k >= self.delay_steps else self.t_bat
+            self._delay[slot] = target
+            target = delayed
+        self._k += 1
+        self.t_bat = self.t_bat + (target - self.t_bat) * self.alpha
+        return self.t_bat
+
+
+def simulate(params, t_out, settings=None, plant=None, dt=pid.PULSE_PERIOD, settle_band=1.0):
+    """
+    Замкнений цикл loop_pid для багатьох наборів параметрів одночасно.
+
+    Крок дорівнює одному імпульсу 100 мс; за dt=PULSE_PERIOD розрахунок
+    повторює логіку loop_pid (крива опалення, інкрементний ПІД, обмеження
+    SUM_D_T, мертва зона, таймери клапана) в автоматичному режимі.
+    Більший dt пришвидшує розрахунок ціною точності.
+
+    :param params: Словник ключ eeprom (kof_p, kof_i, kof_d, dead_zone, per_on, per_off) -> масив значень
+    :param t_out: Запис температури на вулиці з кроком dt
+    :param settings: Решта налаштувань (за замовчуванням pid.DEFAULT_EEPROM)
+    :param plant: Векторизована модель контуру (BatchThermalPlant або сумісна)
+    :param dt: Крок у секундах
+    :param settle_band: Допуск похибки для часу встановлення у °C
+    :return: Словник метрик -> масив по наборах параметрів
+    """
+    base = dict(pid.DEFAULT_EEPROM)
+    base.update(settings or {})
+    n = len(next(iter(params.values())))
+
+    def param(key):
+        value = params.get(key, base[key])
+        return np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+
+    # Захист від ділення на нуль та обмеження - як у loop_pid
+    k_p = param('kof_p')
+    k_i = param('kof_i')
+    k_i[k_i == 0.0] = 9999.0
+    cycle = param('per_on')
+    cycle[cycle == 0.0] = 1.0
+    k_p = np.clip(k_p, -99.0, 99.0)
+    k_i = np.clip(k_i, 1.0, 9999.0)
+    k_d = np.clip(param('kof_d'), 0.0, 9999.0)
+    cycle = np.clip(cycle, 1.0, 25.0)
+    valve = np.clip(param('per_off'), 15.0, 250.0)
+    dead_zone = param('dead_zone')
+
+    t_out = np.asarray(t_out, dtype=float)
+    t_set = heating_curve(t_out, base['temp_min_out'], base['temp_max_heat'],
+                          base['temp_max_out'], base['temp_off_otop'])
+
+    plant = plant if plant is not None else BatchThermalPlant.from_plant(ThermalPlant())
+    pv = plant.reset(n, dt)
+
+    e_2 = np.zeros(n)
+    e_3 = np.zeros(n)
+    d_t = np.zeros(n)
+    sum_d_t = np.zeros(n)
+    timer = np.zeros(n)
+    timer_up = np.zeros(n)
+    timer_down = np.zeros(n)
+    pid_pulse = np.zeros(n, dtype=bool)
+
+    overshoot = np.zeros(n)
+    travel = np.zeros(n)
+    abs_error = np.zeros(n)
+    last_unsettled = np.full(n, -1)
+
+    for k in range(len(t_out)):
+        e_1 = t_set[k] - pv
+
+        fire = (timer == 0.0) & ~pid_pulse
+        new_d_t = k_p * (e_1 - e_2 + cycle * e_2 / k_i + k_d * (e_1 - 2 * e_2 + e_3) / cycle) * valve / 100.0
+        d_t = np.where(fire, new_d_t, d_t)
+        e_3 = np.where(fire, e_2, e_3)
+        e_2 = np.where(fire, e_1, e_2)
+        sum_d_t = np.where(fire, np.clip(sum_d_t + new_d_t, -valve, valve), sum_d_t)
+        in_zone = fire & (np.abs(e_1) < dead_zone)
+        d_t[in_zone] = 0.0
+        sum_d_t[in_zone] = 0.0
+        pid_pulse |= fire
+
+        timer += dt
+        done = timer >= cycle
+        pid_pulse[done] = False
+        timer[done] = 0.0
+        sum_d_t[done] = 0.0
+
+        up = ((sum_d_t >= timer) & (sum_d_t >= 0.5)) | (d_t >= cycle - 0.5) | (timer_up >= valve)
+        timer_up = np.where(up, np.minimum(timer_up + dt, valve), timer_up)
+        down = (((sum_d_t <= -timer) & (sum_d_t <= -0.5)) | (d_t <= -cycle + 0.5) | (timer_down >= valve)) & ~up
+        timer_down = np.where(down, np.minimum(timer_down + dt, valve), timer_down)
+
+        pv = plant.step(dt * RELAY_DUTY, up, down, t_out[k])
+
+        error = pv - t_set[k]
+        np.maximum(overshoot, error, out=overshoot)
+        travel += (up | down) * (dt * RELAY_DUTY)
+        abs_error += np.abs(error) * dt
+        last_unsettled[np.abs(error) > settle_band] = k
+
+    return {
+        'overshoot': overshoot,
+        'valve_travel': travel,
+        'settling_time': (last_unsettled + 1) * dt,
+        'iae': abs_error,
+    }
+
+
+def rank(params, metrics, weights=None, top=10):
+    """
+    Ранжування наборів параметрів за зваженою сумою нормованих метрик.
+
+    :param params: Словник параметрів (як для simulate)
+    :param metrics: Результат simulate
+    :param weights: Ваги метрик; за замовчуванням перерегулювання, хід клапана та час встановлення
+    :param top: Скільки найкращих наборів повернути
+    :return: Список словників параметрів і метрик, від найкращого
+    """
+    weights = weights or {'overshoot': 1.0, 'valve_travel': 1.0, 'settling_time': 1.0}
+    score = np.zeros(len(next(iter(metrics.values()))))
+    for name, weight in weights.items():
+        values = metrics[name]
+        spread = values.max() - values.min()
+        if spread > 0:
+            score += weight * (values - values.min()) / spread
+    order = np.argsort(score, kind='stable')[:top]
+    return [
+        dict({k: float(v[i]) for k, v in params.items()},
+             **{k: float(v[i]) for k, v in metrics.items()}, score=float(score[i]))
+        for i in order
+    ]
+
+
+def _simulate_chunk(args):
+    params, t_out, settings, plant, dt = args
+    return simulate(params, t_out, settings, plant, dt)
+
+
+def evaluate_grid(params, t_out, settings=None, plant=None, dt=pid.PULSE_PERIOD, chunk_size=1024, processes=None):
+    """
+    Розрахунок великої сітки параметрів частинами у пулі процесів.
+
+    :param chunk_size: Кількість наборів параметрів на один процес за раз
+    :param processes: Кількість процесів (None - за кількістю ядер, 1 - без пулу)
+    :return: Словник метрик для всієї сітки (як у simulate)
+    """
+    n = len(next(iter(params.values())))
+    plant = plant if plant is not None else BatchThermalPlant.from_plant(ThermalPlant())
+    chunks = [({k: v[i:i + chunk_size] for k, v in params.items()}, t_out, settings, plant, dt)
+              for i in range(0, n, chunk_size)]
+    if processes == 1 or len(chunks) == 1:
+        results = [_simulate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_simulate_chunk, chunks))
+    return {name: np.concatenate([r[name] for r in results]) for name in results[0]}
+
+
+if __name__ == "__main__":
+    setup_logging()
+    # Приклад: 6 годин зимової ночі з кроком 1 с по сітці з 625 наборів
+    dt = 1.0
+    t_out = np.array([winter_day(t) for t in np.arange(0, 6 * 3600, dt)])
+    grid = make_grid(kof_p=[0.05, 0.1, 0.5, 1.0, 2.0], kof_i=[0.5, 1.5, 5.0, 20.0, 100.0],
+                     kof_d=[0.0, 0.5, 1.5, 5.0, 10.0], dead_zone=[0.5, 1.0, 2.0, 3.0, 5.0])
+    metrics = evaluate_grid(grid, t_out, settings={'temp_min_out': -10.0, 'temp_max_out': 10.0}, dt=dt)
+    for row in rank(grid, metrics):
+        logging.info(row)
+    stop_logging()
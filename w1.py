@@ -0,0 +1,434 @@
+import os
+import time
+import errno
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from metrics import get_registry
+
+# Каталог пристроїв 1-Wire у sysfs
+BASE_DIR = '/sys/bus/w1/devices/'
+
+# Максимальний час конвертації DS18B20 при 12-бітній роздільній здатності
+CONVERSION_TIME = 0.75
+
+# Допустимі роздільні здатності DS18B20 у бітах; кожен біт менше вдвічі скорочує конвертацію
+RESOLUTIONS = (9, 10, 11, 12)
+
+# Кількість потоків для паралельного зчитування без групової конвертації
+MAX_WORKERS = 16
+
+# Як часто перечитувати каталог пристроїв, щоб помітити перепідключені датчики
+RESCAN_INTERVAL = 10.0
+
+# Скільки разів одразу повторити зчитування, якщо CRC не збігся
+CRC_RETRIES = 2
+
+# Розмір буфера читання: w1_slave займає ~75 байт
+READ_BUFFER_SIZE = 256
+
+_executor = None
+_registries = {}
+_readers = {}
+_readers_lock = threading.Lock()
+
+# Метрики шини
+_read_seconds = get_registry().histogram('w1_read_seconds', "Час зчитування w1_slave")
+_crc_errors = get_registry().counter('w1_crc_errors', "Зчитування з NO CRC або пошкодженими даними (кожна спроба)")
+_read_errors = get_registry().counter('w1_read_errors', "Помилки відкриття або читання w1_slave")
+_conversion_seconds = get_registry().histogram('w1_bulk_conversion_seconds', "Тривалість групової конвертації")
+
+
+def conversion_time(bits):
+    """
+    Максимальний час конвертації для роздільної здатності bits (9 біт - 94 мс, 12 біт - 750 мс).
+    """
+    return CONVERSION_TIME / (1 << (12 - bits))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='w1')
+    return _executor
+
+
+def _parse_int(buf, start, end):
+    # int() приймає ASCII-байти напряму (з пробілами та \n), без декодування у str
+    try:
+        return int(buf[start:end])
+    except ValueError:
+        return None
+
+
+def parse_w1_slave_bytes(buf, n):
+    """
+    Розбір вмісту w1_slave безпосередньо з буфера байтів.
+
+    :param buf: bytes або bytearray з вмістом файлу
+    :param n: Кількість прочитаних байтів
+    :return: Температура у мілліградусах (int) або None, якщо CRC не збігся чи дані пошкоджені
+    """
+    newline = buf.find(b'\n', 0, n)
+    if newline < 3 or buf.find(b'YES', newline - 3, newline) == -1:
+        return None
+    equals_pos = buf.find(b't=', newline, n)
+    if equals_pos == -1:
+        return None
+    return _parse_int(buf, equals_pos + 2, n)
+
+
+class SensorReader:
+    def __init__(self, device_dir, retries=CRC_RETRIES):
+        """
+        Зчитувач одного датчика з постійно відкритим дескриптором.
+
+        Кожне os.preadv з нульового зміщення змушує sysfs заново сформувати
+        вміст атрибута, тож файл не потрібно щоразу відкривати й закривати.
+        Дані читаються у той самий bytearray і розбираються як ціле число
+        мілліградусів без декодування у рядки.
+
+        Якщо ядро надає атрибут temperature (Linux 5.10+), читається він:
+        там лише число, а CRC перевіряє драйвер (при помилці - порожня відповідь).
+
+        :param device_dir: Каталог пристрою
+        :param retries: Скільки разів одразу повторити читання при помилці CRC
+        """
+        self.device_dir = device_dir
+        self.retries = retries
+        temperature = os.path.join(device_dir, 'temperature')
+        self.kernel_attr = os.path.exists(temperature)
+        self.path = temperature if self.kernel_attr else os.path.join(device_dir, 'w1_slave')
+        self._buffer = bytearray(READ_BUFFER_SIZE)
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _parse(self, n):
+        if self.kernel_attr:
+            return _parse_int(self._buffer, 0, n) if n else None
+        return parse_w1_slave_bytes(self._buffer, n)
+
+    def read_millidegrees(self):
+        """
+        :return: Температура у мілліградусах або None, якщо CRC не збігся після всіх повторів
+        :raises OSError: Файл недоступний (датчик від'єднали)
+        """
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            buffers = [self._buffer]
+            for _ in range(self.retries + 1):
+                value = self._parse(os.preadv(self._fd, buffers, 0))
+                if value is not None:
+                    return value
+                _crc_errors.inc()
+            return None
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+def get_reader(device_dir):
+    """
+    Спільний зчитувач для каталогу пристрою (один на процес).
+    """
+    reader = _readers.get(device_dir)
+    if reader is None:
+        with _readers_lock:
+            reader = _readers.get(device_dir)
+            if reader is None:
+                reader = _readers[device_dir] = SensorReader(device_dir)
+    return reader
+
+
+def _drop_reader(device_dir):
+    with _readers_lock:
+        reader = _readers.pop(device_dir, None)
+    if reader is not None:
+        reader.close()
+
+
+class DeviceRegistry:
+    def __init__(self, base_dir=BASE_DIR, family='28', rescan_interval=RESCAN_INTERVAL):
+        """
+        Реєстр датчиків шини: ID датчика -> каталог пристрою.
+
+        Каталог перечитується не частіше ніж раз на rescan_interval секунд, а
+        також позачергово, коли запитаного датчика немає або його файл зник.
+        sysfs не надсилає подій inotify про появу пристроїв, тому дешевий
+        періодичний os.listdir тут надійніший.
+
+        :param base_dir: Каталог пристроїв 1-Wire
+        :param family: Префікс сімейства пристроїв (28 - DS18B20)
+        :param rescan_interval: Інтервал планового перечитування у секундах
+        """
+        self.base_dir = base_dir
+        self.family = family
+        self.rescan_interval = rescan_interval
+        self._paths = {}
+        self._last_scan = None
+        self._lock = threading.Lock()
+
+    def rescan(self):
+        """
+        Перечитування каталогу пристроїв з оновленням індексу.
+        """
+        with self._lock:
+            try:
+                names = [f for f in os.listdir(self.base_dir) if f.startswith(self.family)]
+            except OSError as e:
+                logging.error(f"Не вдалося отримати список датчиків: {e}")
+                names = []
+            paths = {name: os.path.join(self.base_dir, name) for name in names}
+            for name in paths.keys() - self._paths.keys():
+                logging.info(f"Знайдено датчик {name}.")
+            for name in self._paths.keys() - paths.keys():
+                logging.warning(f"Датчик {name} зник з шини.")
+            self._paths = paths
+            self._last_scan = time.monotonic()
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if self._last_scan is None:
+            self.rescan()
+        elif now - self._last_scan >= (1.0 if force else self.rescan_interval):
+            # Позачергове перечитування теж обмежене - не частіше раз на секунду
+            self.rescan()
+
+    def sensor_ids(self):
+        """
+        :return: Список ID всіх відомих датчиків у порядку каталогу
+        """
+        self._refresh()
+        return list(self._paths)
+
+    def resolve(self, prefix):
+        """
+        Пошук повного ID датчика за ID або його префіксом.
+
+        :param prefix: ID датчика або його початок
+        :return: Повний ID датчика або None, якщо його немає
+        """
+        self._refresh()
+        name = self._lookup(prefix)
+        if name is None:
+            # Можливо, датчик щойно підключили
+            self._refresh(force=True)
+            name = self._lookup(prefix)
+        return name
+
+    def _lookup(self, prefix):
+        if prefix in self._paths:
+            return prefix
+        for name in self._paths:
+            if name.startswith(prefix):
+                return name
+        return None
+
+    def device_dir(self, sensor_id):
+        """
+        :param sensor_id: ID датчика або його префікс
+        :return: Каталог пристрою або None, якщо датчика немає на шині
+        """
+        name = self.resolve(sensor_id)
+        return self._paths.get(name) if name is not None else None
+
+    def invalidate(self):
+        """
+        Позначка, що індекс застарів (наприклад, файл датчика зник).
+        """
+        self._last_scan = float('-inf')
+
+
+def get_registry(base_dir=BASE_DIR):
+    """
+    Спільний реєстр датчиків для каталогу base_dir (один на процес).
+    """
+    registry = _registries.get(base_dir)
+    if registry is None:
+        registry = _registries.setdefault(base_dir, DeviceRegistry(base_dir))
+    return registry
+
+
+def read_sensor(sensor_id, base_dir=BASE_DIR):
+    """
+    Зчитування температури одного датчика.
+
+    :param sensor_id: ID датчика (наприклад, 28-0921c00ab497) або його префікс
+    :param base_dir: Каталог пристроїв 1-Wire
+    :return: Температура у °C або None у випадку помилки
+    """
+    registry = get_registry(base_dir)
+    device_dir = registry.device_dir(sensor_id)
+    if device_dir is None:
+        logging.error(f"Датчик {sensor_id} не знайдено.")
+        return None
+    started = time.perf_counter()
+    try:
+        millidegrees = get_reader(device_dir).read_millidegrees()
+        _read_seconds.observe(time.perf_counter() - started)
+        return millidegrees / 1000.0 if millidegrees is not None else None
+    except FileNotFoundError:
+        # Датчик від'єднали - при наступному зверненні каталог буде перечитано
+        _drop_reader(device_dir)
+        registry.invalidate()
+        logging.error(f"Датчик {sensor_id} недоступний.")
+    except OSError as e:
+        # Дескриптор видаленого пристрою повертає ENODEV - відкриваємо заново наступного разу
+        _drop_reader(device_dir)
+        if e.errno == errno.ENODEV:
+            registry.invalidate()
+        logging.error(f"Помилка зчитування температури з датчика {sensor_id}: {e}")
+    _read_errors.inc()
+    return None
+
+
+def submit_read(sensor_id, base_dir=BASE_DIR):
+    """
+    Зчитування одного датчика у пулі потоків шини без очікування.
+
+    :return: concurrent.futures.Future з температурою або None
+    """
+    return _get_executor().submit(read_sensor, sensor_id, base_dir)
+
+
+def read_resolution(sensor_id, base_dir=BASE_DIR):
+    """
+    Поточна роздільна здатність датчика з атрибута sysfs resolution.
+
+    :return: Кількість біт або None, якщо датчика немає чи ядро не надає атрибут
+    """
+    device_dir = get_registry(base_dir).device_dir(sensor_id)
+    if device_dir is None:
+        return None
+    try:
+        with open(os.path.join(device_dir, 'resolution'), 'rb') as f:
+            bits = int(f.read())
+    except (OSError, ValueError):
+        return None
+    return bits if bits in RESOLUTIONS else None
+
+
+def write_resolution(sensor_id, bits, base_dir=BASE_DIR):
+    """
+    Встановлення роздільної здатності датчика через атрибут sysfs resolution.
+
+    Значення пишеться у scratchpad і втрачається при вимкненні живлення,
+    тому його слід застосовувати заново при кожному запуску.
+
+    :param bits: 9, 10, 11 або 12
+    :return: True, якщо значення записано
+    :raises ValueError: Недопустима роздільна здатність
+    """
+    if bits not in RESOLUTIONS:
+        raise ValueError(f"Недопустима роздільна здатність {bits}; можливі: {RESOLUTIONS}")
+    device_dir = get_registry(base_dir).device_dir(sensor_id)
+    if device_dir is None:
+        logging.error(f"Датчик {sensor_id} не знайдено.")
+        return False
+    try:
+        with open(os.path.join(device_dir, 'resolution'), 'w') as f:
+            f.write(f"{bits}\n")
+    except OSError as e:
+        logging.error(f"Не вдалося встановити роздільну здатність датчика {sensor_id}: {e}")
+        return False
+    logging.info(f"Датчик {sensor_id}: роздільна здатність {bits} біт.")
+    return True
+
+
+def _bus_masters(base_dir):
+    try:
+        return [os.path.join(base_dir, f) for f in os.listdir(base_dir) if f.startswith('w1_bus_master')]
+    except OSError:
+        return []
+
+
+def start_bulk_conversion(base_dir=BASE_DIR):
+    """
+    Запуск одночасної конвертації на всіх датчиках шини через therm_bulk_read без очікування.
+
+    Кожен датчик конвертує зі своєю роздільною здатністю; читання його w1_slave
+    чекає лише на решту його власної конвертації і не запускає нову.
+
+    :param base_dir: Каталог пристроїв 1-Wire
+    :return: Шляхи therm_bulk_read, у які записано запуск (порожній список - не підтримується)
+    """
+    triggered = []
+    for master in _bus_masters(base_dir):
+        path = os.path.join(master, 'therm_bulk_read')
+        try:
+            # Без O_CREAT: атрибута немає - групова конвертація не підтримується
+            fd = os.open(path, os.O_WRONLY)
+            try:
+                os.write(fd, b'trigger\n')
+            finally:
+                os.close(fd)
+            triggered.append(path)
+        except OSError:
+            # Старе ядро або майстер без датчиків температури
+            continue
+    return triggered
+
+
+def trigger_bulk_conversion(base_dir=BASE_DIR, timeout=CONVERSION_TIME * 2):
+    """
+    Запуск одночасної конвертації на всіх датчиках шини з очікуванням її завершення.
+
+    Після завершення конвертації читання w1_slave повертає вже готовий
+    результат без запуску нової конвертації.
+
+    :param base_dir: Каталог пристроїв 1-Wire
+    :param timeout: Максимальний час очікування завершення конвертації у секундах
+    :return: True, якщо хоча б один майстер шини підтримує therm_bulk_read
+    """
+    triggered = start_bulk_conversion(base_dir)
+    if not triggered:
+        return False
+
+    # therm_bulk_read повертає -1, поки хоча б один датчик ще конвертує
+    started = time.monotonic()
+    deadline = started + timeout
+    pending = triggered
+    while pending and time.monotonic() < deadline:
+        still_pending = []
+        for path in pending:
+            try:
+                with open(path, 'r') as f:
+                    if f.read().strip() == '-1':
+                        still_pending.append(path)
+            except OSError:
+                pass
+        pending = still_pending
+        if pending:
+            time.sleep(0.01)
+    _conversion_seconds.observe(time.monotonic() - started)
+    if pending:
+        logging.warning("Групова конвертація не завершилась вчасно.")
+    return True
+
+
+def read_temperatures(sensor_ids, base_dir=BASE_DIR, bulk=True, parallel=True):
+    """
+    Зчитування всіх датчиків за час однієї конвертації.
+
+    Спочатку пробує групову конвертацію майстра шини (therm_bulk_read), після
+    якої читання кожного датчика миттєве. Якщо ядро її не підтримує,
+    датчики читаються паралельно через пул потоків (або по черзі у
+    поточному потоці, якщо parallel=False).
+
+    :param sensor_ids: Список ID датчиків
+    :param base_dir: Каталог пристроїв 1-Wire
+    :param bulk: Чи використовувати групову конвертацію
+    :param parallel: Чи використовувати пул потоків w1; False - без додаткових потоків
+    :return: Словник sensor_id -> температура (None для датчиків з помилкою)
+    """
+    sensor_ids = list(sensor_ids)
+    if not sensor_ids:
+        return {}
+    if (bulk and trigger_bulk_conversion(base_dir)) or not parallel:
+        return {sensor_id: read_sensor(sensor_id, base_dir) for sensor_id in sensor_ids}
+    results = _get_executor().map(lambda sensor_id: read_sensor(sensor_id, base_dir), sensor_ids)
+    return dict(zip(sensor_ids, results))